@@ -2,44 +2,1722 @@
 # -*- coding: utf-8 -*-
 
 import os
+import posixpath
 import subprocess
 import sys
 import re
+import shlex
+import threading
+import collections
+import struct
+import zlib
+import codecs
+import datetime
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import shutil
+import signal
+import tempfile
+import time
+import types
+import unicodedata
+
+
+class GitInstallation:
+    """Git 可执行文件的路径、版本和功能信息
+
+    探测结果按可执行文件的路径、mtime 和大小缓存到磁盘，
+    Git 升级后缓存自动失效；同一进程内的多个 GitManager 共享同一份结果。
+    """
+
+    CACHE_VERSION = 1
+    _detected = None
+
+    def __init__(self, path, version, features):
+        self.path = path
+        self.version = tuple(version)
+        self.features = set(features)
+
+    @staticmethod
+    def cache_path():
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base, 'git_manager', 'git_info.json')
+
+    @classmethod
+    def detect(cls, use_cache=True):
+        """解析 git 可执行文件并读取（或探测）版本信息，找不到 git 时返回None"""
+        if use_cache and cls._detected is not None:
+            return cls._detected
+        path = shutil.which('git')
+        if not path:
+            return None
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        key = f"{cls.CACHE_VERSION}:{real_path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+        cache_file = cls.cache_path()
+        if use_cache:
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get('key') == key:
+                    cls._detected = cls(real_path, cached['version'], cached['features'])
+                    return cls._detected
+            except (OSError, ValueError, KeyError):
+                pass
+
+        installation = cls.probe(real_path)
+        if installation is None:
+            return None
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            temp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'version': list(installation.version),
+                           'features': sorted(installation.features)}, f)
+            os.replace(temp_file, cache_file)
+        except OSError:
+            pass
+        cls._detected = installation
+        return installation
+
+    @classmethod
+    def probe(cls, path):
+        """运行 git version --build-options 获取版本和编译特性"""
+        try:
+            result = subprocess.run([path, 'version', '--build-options'], check=True,
+                                    capture_output=True, text=True, encoding='utf-8', errors='replace')
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        match = re.search(r'git version (\d+)\.(\d+)(?:\.(\d+))?', result.stdout)
+        if not match:
+            return None
+        version = [int(part or 0) for part in match.groups()]
+        features = re.findall(r'^feature: (\S+)', result.stdout, re.M)
+        return cls(path, version, features)
+
+    def at_least(self, *version):
+        """判断 git 版本是否不低于给定版本"""
+        return self.version >= tuple(version)
+
+
+class GitObjectReader:
+    """常驻的 git cat-file --batch / --batch-check 对象读取器
+
+    每个仓库只保留一个 cat-file 子进程，通过 stdin/stdout 管道复用，
+    子进程异常退出时会自动重启一次。
+    """
+
+    CHECK_FORMAT = '%(objectname) %(objecttype) %(objectsize) %(objectsize:disk)'
+
+    def __init__(self, env=None, cwd=None, tracer=None):
+        self.env = env
+        self.cwd = cwd
+        self.tracer = tracer
+        self._io = (0, 0)
+        self._procs = {}
+        self._lock = threading.Lock()
+
+    def _start(self, mode):
+        """启动指定模式的 cat-file 子进程"""
+        option = '--batch' if mode == 'batch' else f'--batch-check={self.CHECK_FORMAT}'
+        proc = subprocess.Popen(
+            ['git', 'cat-file', option],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.cwd,
+            env=self.env
+        )
+        self._procs[mode] = proc
+        return proc
+
+    def _stop(self, mode):
+        """关闭指定模式的子进程"""
+        proc = self._procs.pop(mode, None)
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    def _request(self, mode, specs):
+        """向子进程发送一组对象名并按顺序读取结果，子进程崩溃时重启重试一次"""
+        for spec in specs:
+            if '\n' in spec:
+                raise ValueError(f"对象名中不能包含换行: {spec!r}")
+
+        with self._lock:
+            for attempt in range(2):
+                proc = self._procs.get(mode)
+                if proc is None or proc.poll() is not None:
+                    self._stop(mode)
+                    proc = self._start(mode)
+                context = None
+                if self.tracer is not None:
+                    context = self.tracer.begin(proc.args, self.env, spawn=False)
+                try:
+                    results = self._exchange(mode, proc, specs)
+                    if context is not None:
+                        self.tracer.end(context, 0, *self._io)
+                    return results
+                except (OSError, ValueError, EOFError):
+                    # 子进程已退出或输出错乱，重启后再试
+                    self._stop(mode)
+                    if attempt:
+                        raise
+        return None
+
+    def _exchange(self, mode, proc, specs):
+        """写入请求并读取响应；写入放在单独线程中，避免管道缓冲区填满时互相等待"""
+        payload = ''.join(f'{spec}\n' for spec in specs).encode('utf-8')
+        errors = []
+
+        def feed():
+            try:
+                proc.stdin.write(payload)
+                proc.stdin.flush()
+            except OSError as e:
+                errors.append(e)
+
+        writer = None
+        if len(payload) > 4096:
+            writer = threading.Thread(target=feed, daemon=True)
+            writer.start()
+        else:
+            feed()
+
+        results = []
+        received = 0
+        for _ in specs:
+            header = proc.stdout.readline()
+            received += len(header)
+            if not header:
+                raise EOFError("cat-file 子进程意外退出")
+            fields = header.decode('utf-8', errors='replace').rstrip('\n').split(' ')
+            if fields[-1] in ('missing', 'ambiguous'):
+                results.append(None)
+                continue
+            if mode == 'batch':
+                oid, obj_type, size = fields[0], fields[1], int(fields[2])
+                data = proc.stdout.read(size)
+                if len(data) != size or proc.stdout.read(1) != b'\n':
+                    raise EOFError("cat-file 输出不完整")
+                results.append((oid, obj_type, data))
+                received += size + 1
+            else:
+                results.append((fields[0], fields[1], int(fields[2]), int(fields[3])))
+
+        if writer is not None:
+            writer.join()
+        if errors:
+            raise errors[0]
+        self._io = (len(payload), received)
+        return results
+
+    def check(self, spec):
+        """查询对象信息，返回 (对象ID, 类型, 大小, 磁盘占用) 或 None"""
+        return self._request('check', [spec])[0]
+
+    def check_many(self, specs):
+        """批量查询对象信息，结果顺序与输入一致"""
+        specs = list(specs)
+        if not specs:
+            return []
+        return self._request('check', specs)
+
+    def read(self, spec):
+        """读取对象内容，返回 (对象ID, 类型, 内容字节) 或 None"""
+        return self._request('batch', [spec])[0]
+
+    def read_many(self, specs):
+        """批量读取对象内容，结果顺序与输入一致"""
+        specs = list(specs)
+        if not specs:
+            return []
+        return self._request('batch', specs)
+
+    def close(self):
+        """关闭所有 cat-file 子进程"""
+        with self._lock:
+            for mode in list(self._procs):
+                self._stop(mode)
+
+
+class CommitRecord:
+    """一条提交记录，使用 __slots__ 以便大量历史也只占用很小的内存"""
+
+    __slots__ = ('hash', 'short_hash', 'parents', 'author', 'email',
+                 'author_time', 'author_tz', 'commit_time', 'subject', 'body', 'files')
+
+    DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+    MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+    def __init__(self, hash, short_hash, parents, author, email,
+                 author_time, commit_time, subject, body=None, files=None, author_tz='+0000'):
+        self.hash = hash
+        self.short_hash = short_hash
+        self.parents = parents
+        self.author = author
+        self.email = email
+        self.author_time = author_time
+        # 作者所在时区的偏移（如 +0800），git 按它而不是读者的时区显示日期
+        self.author_tz = author_tz
+        self.commit_time = commit_time
+        self.subject = subject
+        self.body = body
+        # files 为 (新增行数, 删除行数, 路径, 原路径) 元组，二进制文件的行数为 None
+        self.files = files
+
+    def oneline(self):
+        """与 git log --oneline 相同的单行格式"""
+        return f"{self.short_hash} {self.subject}"
+
+    def author_date(self):
+        """与 git log 默认日期格式相同的作者日期"""
+        return self.format_date(self.author_time, self.author_tz)
+
+    @classmethod
+    def format_date(cls, timestamp, tz):
+        """按 git 的默认格式（英文星期和月份，日期不补零，附时区偏移）格式化时间戳"""
+        sign = -1 if tz.startswith('-') else 1
+        minutes = sign * (int(tz[1:3]) * 60 + int(tz[3:5]))
+        moment = datetime.datetime.fromtimestamp(
+            timestamp, datetime.timezone(datetime.timedelta(minutes=minutes)))
+        return (f"{cls.DAYS[moment.weekday()]} {cls.MONTHS[moment.month - 1]} {moment.day} "
+                f"{moment:%H:%M:%S} {moment.year} {tz}")
+
+    def as_dict(self):
+        """转换为批量推送等流程使用的字典格式"""
+        return {'hash': self.short_hash, 'message': self.subject, 'oid': self.hash}
+
+
+class OperationResult(str):
+    """带成功标志的结果说明：可以像字符串一样打印，命令行模式按 ok 决定退出码"""
+
+    def __new__(cls, text, ok=True):
+        result = super().__new__(cls, text)
+        result.ok = ok
+        return result
+
+
+class StatusEntry:
+    """git status --porcelain=v2 中的一条记录"""
+
+    __slots__ = ('kind', 'index_status', 'worktree_status', 'path', 'orig_path')
+
+    def __init__(self, kind, index_status, worktree_status, path, orig_path=None):
+        # kind: changed / renamed / unmerged / untracked / ignored
+        self.kind = kind
+        self.index_status = index_status
+        self.worktree_status = worktree_status
+        self.path = path
+        self.orig_path = orig_path
+
+    @property
+    def staged(self):
+        return self.kind in ('changed', 'renamed') and self.index_status != '.'
+
+    @property
+    def unstaged(self):
+        return self.kind in ('changed', 'renamed') and self.worktree_status != '.'
+
+    def short(self):
+        """类似 git status --short 的单行格式"""
+        if self.kind == 'untracked':
+            code = '??'
+        elif self.kind == 'ignored':
+            code = '!!'
+        else:
+            code = (self.index_status + self.worktree_status).replace('.', ' ')
+        path = f"{self.orig_path} -> {self.path}" if self.orig_path else self.path
+        return f"{code} {path}"
+
+
+class ResultCache:
+    """按对象ID缓存 git 查询结果：内存中为按字节数限制的 LRU，磁盘上为按总大小限制的文件目录
+
+    键由查询种类、完整对象ID和格式选项组成，对象内容不会变化，所以这些结果永远有效。
+    依赖引用的结果（如 HEAD 的最近提交）在写入时登记引用名，引用指向变化后旧结果会被删除。
+    """
+
+    def __init__(self, directory=None, memory_bytes=16 * 1024 * 1024, disk_bytes=64 * 1024 * 1024,
+                 max_entry_bytes=8 * 1024 * 1024, namespace=''):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.namespace = namespace
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+        self._refs = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _digest(self, key):
+        """把键转换为文件名"""
+        return hashlib.sha1(repr((self.namespace,) + tuple(key)).encode('utf-8')).hexdigest()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def get(self, key):
+        """读取缓存结果（字节），没有时返回None"""
+        digest = self._digest(key)
+        with self._lock:
+            value = self._memory.get(digest)
+            if value is not None:
+                self._memory.move_to_end(digest)
+                self.hits += 1
+                return value
+        if self.directory:
+            path = self._path(digest)
+            try:
+                with open(path, 'rb') as f:
+                    value = zlib.decompress(f.read())
+                # 更新修改时间，磁盘淘汰时按最近使用排序
+                os.utime(path)
+            except (OSError, zlib.error):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self._remember(digest, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value, ref=None):
+        """写入缓存；ref 为结果所依赖的 (引用名, 当时的对象ID)"""
+        if len(value) > self.max_entry_bytes:
+            return
+        digest = self._digest(key)
+        with self._lock:
+            if ref is not None:
+                self._track_ref(ref, digest)
+            self._remember(digest, value)
+        if self.directory:
+            self._write_disk(digest, value)
+
+    def _remember(self, digest, value):
+        """放入内存 LRU，超过容量时淘汰最久未使用的结果"""
+        old = self._memory.pop(digest, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[digest] = value
+        self._memory_size += len(value)
+        while self._memory_size > self.memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _track_ref(self, ref, digest):
+        """登记依赖引用的结果；引用指向变化时删除之前登记的结果"""
+        name, oid = ref
+        current = self._refs.get(name)
+        if current is None or current[0] != oid:
+            if current is not None:
+                for stale in current[1]:
+                    self._forget(stale)
+            current = self._refs[name] = (oid, set())
+        current[1].add(digest)
+
+    def observe_ref(self, name, oid):
+        """报告引用的当前指向，指向变化时使依赖旧指向的结果失效"""
+        with self._lock:
+            current = self._refs.get(name)
+            if current is not None and current[0] != oid:
+                for stale in current[1]:
+                    self._forget(stale)
+                del self._refs[name]
+
+    def _forget(self, digest):
+        """从内存和磁盘中删除一条结果"""
+        value = self._memory.pop(digest, None)
+        if value is not None:
+            self._memory_size -= len(value)
+        if self.directory:
+            try:
+                size = os.path.getsize(self._path(digest))
+                os.remove(self._path(digest))
+                if self._disk_size is not None:
+                    self._disk_size -= size
+            except OSError:
+                pass
+
+    def _write_disk(self, digest, value):
+        """原子地写入磁盘，总大小超过限制时按最近使用时间淘汰"""
+        path = self._path(digest)
+        data = zlib.compress(value, 1)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # 覆盖已有的结果时，总大小只增加两者之差
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_size += len(data) - replaced
+            if self._disk_size > self.disk_bytes:
+                # 淘汰到容量的 80%，避免每次写入都扫描目录
+                for mtime, size, old_path in sorted(self._disk_entries()):
+                    if self._disk_size <= self.disk_bytes * 0.8:
+                        break
+                    try:
+                        os.remove(old_path)
+                        self._disk_size -= size
+                    except OSError:
+                        pass
+
+    def _disk_entries(self):
+        """列出磁盘上的结果文件 (修改时间, 大小, 路径)"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def clear(self):
+        """清空内存和磁盘上的所有结果"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._refs.clear()
+            self._disk_size = 0
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ImageOptimizer:
+    """无损的图片优化，只依赖标准库：PNG 重新压缩图像数据并去掉不影响显示的附加块，
+    JPEG 去掉 EXIF/XMP/注释等元数据段。安装了 Pillow 时还可以把过大的图片缩小。
+
+    方法都是静态方法，可以直接交给进程池执行。
+    """
+
+    PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    # 影响显示效果（或动画）的 PNG 附加块，其余如 tEXt/tIME/pHYs/eXIf 会被去掉
+    PNG_KEEP = {b'IHDR', b'PLTE', b'IDAT', b'IEND', b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP',
+                b'sBIT', b'acTL', b'fcTL', b'fdAT'}
+    EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+    @staticmethod
+    def is_candidate(path):
+        """按扩展名判断是否是需要处理的图片"""
+        return os.path.splitext(path)[1].lower() in ImageOptimizer.EXTENSIONS
+
+    @staticmethod
+    def sniff(data):
+        """按文件内容判断图片类型（扩展名可能与实际格式不符），不支持时返回None"""
+        if data.startswith(ImageOptimizer.PNG_SIGNATURE):
+            return 'png'
+        if data.startswith(b'\xff\xd8\xff'):
+            return 'jpeg'
+        return None
+
+    @staticmethod
+    def optimize(data, max_size=None):
+        """优化一张图片，返回 (优化后的字节或None, 说明)；没有变小时返回None"""
+        kind = ImageOptimizer.sniff(data)
+        if kind is None:
+            return None, "不支持的格式"
+        notes = []
+        try:
+            if max_size:
+                resized = ImageOptimizer.resize(data, kind, max_size)
+                if resized is not None:
+                    data, note = resized
+                    notes.append(note)
+            if kind == 'png':
+                optimized = ImageOptimizer.optimize_png(data)
+            else:
+                optimized = ImageOptimizer.optimize_jpeg(data)
+        except (ValueError, IndexError, struct.error, zlib.error) as e:
+            return None, f"无法解析: {e}"
+        if optimized is not None:
+            data = optimized
+        elif not notes:
+            return None, "已是最优"
+        return data, '，'.join(notes) or "无损压缩"
+
+    @staticmethod
+    def optimize_png(data):
+        """重新压缩 IDAT 并去掉附加块，没有变小时返回None"""
+        if not data.startswith(ImageOptimizer.PNG_SIGNATURE):
+            raise ValueError("不是 PNG 文件")
+        chunks = []
+        idat = []
+        pos = len(ImageOptimizer.PNG_SIGNATURE)
+        while pos < len(data):
+            length, chunk_type = struct.unpack_from('>I4s', data, pos)
+            body = data[pos + 8:pos + 8 + length]
+            if len(body) != length:
+                raise ValueError("PNG 数据不完整")
+            pos += 12 + length
+            if chunk_type == b'IDAT':
+                if not idat:
+                    chunks.append((b'IDAT', None))
+                idat.append(body)
+            elif chunk_type in ImageOptimizer.PNG_KEEP:
+                chunks.append((chunk_type, body))
+            if chunk_type == b'IEND':
+                break
+
+        original = b''.join(idat)
+        # 每行的过滤方式保持不变，只用最高压缩级别和最大内存重新压缩
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9)
+        best = compressor.compress(zlib.decompress(original)) + compressor.flush()
+        if len(best) >= len(original):
+            best = original
+
+        out = [ImageOptimizer.PNG_SIGNATURE]
+        for chunk_type, body in chunks:
+            if body is None:
+                body = best
+            out.append(struct.pack('>I4s', len(body), chunk_type) + body
+                       + struct.pack('>I', zlib.crc32(chunk_type + body) & 0xffffffff))
+        result = b''.join(out)
+        return result if len(result) < len(data) else None
+
+    @staticmethod
+    def jpeg_orientation(payload):
+        """读取 EXIF 中的方向标记，读不到时返回1"""
+        if not payload.startswith(b'Exif\0\0'):
+            return 1
+        tiff = payload[6:]
+        endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+        if endian is None:
+            return 1
+        offset = struct.unpack_from(endian + 'I', tiff, 4)[0]
+        count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+        for i in range(count):
+            tag, _, _, value = struct.unpack_from(endian + 'HHI4s', tiff, offset + 2 + i * 12)
+            if tag == 0x0112:
+                return struct.unpack_from(endian + 'H', value)[0]
+        return 1
+
+    @staticmethod
+    def optimize_jpeg(data):
+        """去掉 JPEG 中的元数据段（保留 JFIF、ICC 颜色配置、Adobe 段和非默认的 EXIF 方向），
+        扫描数据原样保留，没有变小时返回None"""
+        if not data.startswith(b'\xff\xd8'):
+            raise ValueError("不是 JPEG 文件")
+        out = [b'\xff\xd8']
+        pos = 2
+        while pos < len(data):
+            if data[pos] != 0xff:
+                raise ValueError("JPEG 段标记错误")
+            marker = data[pos + 1]
+            if marker == 0xff:
+                pos += 1
+                continue
+            if marker == 0xda or marker == 0xd9:
+                # 从扫描数据开始，剩余部分原样保留
+                out.append(data[pos:])
+                break
+            length = struct.unpack_from('>H', data, pos + 2)[0]
+            segment = data[pos:pos + 2 + length]
+            pos += 2 + length
+            payload = segment[4:]
+            if marker == 0xfe or 0xe3 <= marker <= 0xed or marker == 0xef:
+                continue
+            if marker == 0xe1 and ImageOptimizer.jpeg_orientation(payload) == 1:
+                continue
+            if marker == 0xe2 and not payload.startswith(b'ICC_PROFILE\0'):
+                continue
+            out.append(segment)
+        result = b''.join(out)
+        return result if len(result) < len(data) else None
+
+    @staticmethod
+    def resize(data, kind, max_size):
+        """用 Pillow 把最长边缩小到 max_size 像素，未安装 Pillow 或不需要缩小时返回None"""
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            return None
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_size:
+                return None
+            original = image.size
+            icc = image.info.get('icc_profile')
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            if kind == 'jpeg':
+                image.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True, icc_profile=icc)
+            else:
+                image.save(buffer, 'PNG', optimize=True, icc_profile=icc)
+        return buffer.getvalue(), f"尺寸 {original[0]}x{original[1]} → {image.size[0]}x{image.size[1]}"
+
+
+class AdaptiveBatchScheduler:
+    """根据提交的预估 pack 大小和实测吞吐量动态决定每批推送多少个提交
+
+    每批的字节预算 = 平滑后的吞吐量 × 目标耗时，临时性故障导致推送失败时预算减半；
+    预算已是下限时仍然失败，之后每批只推送一个提交，直到有一批成功。
+    与批次大小无关的失败（非快进、认证失败、钩子拒绝）不调整预算。
+    """
+
+    def __init__(self, sizes, target_seconds=20.0, initial_budget=4 * 1024 * 1024,
+                 min_budget=256 * 1024, max_budget=512 * 1024 * 1024):
+        self.sizes = sizes
+        self.target_seconds = target_seconds
+        self.budget = initial_budget
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.throughput = None
+        self.history = []
+        self.single = False
+
+    def next_end(self, start):
+        """从 start 开始，返回不超过字节预算的批次结束位置（至少包含一个提交）"""
+        end = start + 1
+        if self.single:
+            return end
+        total = self.sizes[start]
+        while end < len(self.sizes) and total + self.sizes[end] <= self.budget:
+            total += self.sizes[end]
+            end += 1
+        return end
+
+    def batch_bytes(self, start, end):
+        return sum(self.sizes[start:end])
+
+    def record(self, size, elapsed, ok, transient=True):
+        """记录一批推送的结果并调整下一批的预算
+
+        transient=False 表示失败与批次大小无关，缩小批次重试也不会成功，预算保持不变。
+        """
+        self.history.append({'bytes': size, 'elapsed': elapsed, 'ok': ok, 'budget': self.budget})
+        if not ok:
+            if transient:
+                # 预算已是下限时仍然失败，之后改为逐个提交推送
+                self.single = self.budget <= self.min_budget
+                self.budget = max(self.min_budget, self.budget // 2)
+            return
+        self.single = False
+        if elapsed > 0 and size > 0:
+            measured = size / elapsed
+            # 指数平滑，避免单次波动导致批次大小剧烈变化
+            self.throughput = measured if self.throughput is None else 0.5 * self.throughput + 0.5 * measured
+            self.budget = int(self.throughput * self.target_seconds)
+        else:
+            self.budget *= 2
+        self.budget = max(self.min_budget, min(self.max_budget, self.budget))
+
+
+class NativeUnsupported(Exception):
+    """原生读取引擎无法处理的情况，调用方应回退到 git 命令"""
+
+
+class NativeObjectStore:
+    """纯 Python 的只读对象库，直接解析 .git/objects 中的松散对象和 pack 文件
+
+    pack 文件和 .idx（v2）索引通过 mmap 映射，对象查找是在 fanout 表上的二分查找；
+    支持 OFS/REF delta 解析，并用有大小上限的缓存保存 delta 基对象。
+    遇到无法处理的情况抛出 NativeUnsupported，由调用方回退到 git 命令。
+    """
+
+    TYPE_NAMES = {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}
+    OFS_DELTA = 6
+    REF_DELTA = 7
+
+    def __init__(self, git_dir, common_dir=None, worktree=None, delta_cache_bytes=32 * 1024 * 1024):
+        self.git_dir = git_dir
+        self.common_dir = common_dir or git_dir
+        self.worktree = worktree
+        self.objects_dir = os.path.join(self.common_dir, 'objects')
+        self.delta_cache_bytes = delta_cache_bytes
+        self._delta_cache = collections.OrderedDict()
+        self._delta_cache_size = 0
+        self._packs = []
+        self._pack_names = set()
+        self._lock = threading.Lock()
+        self._load_packs()
+
+    @classmethod
+    def discover(cls, start=None):
+        """从当前目录向上查找本地仓库，找不到或仓库不适合原生读取时返回None"""
+        if os.environ.get('GIT_DIR') or os.environ.get('GIT_OBJECT_DIRECTORY'):
+            return None
+        path = os.path.abspath(start or os.getcwd())
+        while True:
+            dot_git = os.path.join(path, '.git')
+            if os.path.isdir(dot_git):
+                git_dir = dot_git
+                break
+            if os.path.isfile(dot_git):
+                with open(dot_git, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                if not content.startswith('gitdir:'):
+                    return None
+                git_dir = os.path.normpath(os.path.join(path, content[len('gitdir:'):].strip()))
+                break
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+        common_dir = git_dir
+        commondir_file = os.path.join(git_dir, 'commondir')
+        if os.path.isfile(commondir_file):
+            with open(commondir_file, 'r', encoding='utf-8') as f:
+                common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+
+        if not cls._config_supported(common_dir):
+            return None
+        # 替换对象、grafts 和备用对象库会改变历史视图，交给 git 处理
+        for relative in (os.path.join('objects', 'info', 'alternates'),
+                         os.path.join('info', 'grafts'),
+                         os.path.join('refs', 'replace')):
+            if os.path.exists(os.path.join(common_dir, relative)):
+                return None
+        return cls(git_dir, common_dir, worktree=path)
+
+    @staticmethod
+    def _config_supported(common_dir):
+        """检查配置中是否有会影响输出格式、原生引擎又无法复现的选项"""
+        candidates = [os.path.join(common_dir, 'config'), os.path.expanduser('~/.gitconfig')]
+        xdg = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+        candidates.append(os.path.join(xdg, 'git', 'config'))
+        pattern = re.compile(r'^\s*(abbrev|quotepath|objectformat|showsignature|path)\s*=|^\s*\[\s*include', re.I | re.M)
+        for candidate in candidates:
+            try:
+                with open(candidate, 'r', encoding='utf-8', errors='replace') as f:
+                    if pattern.search(f.read()):
+                        return False
+            except OSError:
+                continue
+        return True
+
+    # ---------- pack 文件 ----------
+
+    def _load_packs(self):
+        """映射新出现的 pack 索引（v2）"""
+        pack_dir = os.path.join(self.objects_dir, 'pack')
+        try:
+            names = sorted(os.listdir(pack_dir))
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.idx') or name in self._pack_names:
+                continue
+            idx_path = os.path.join(pack_dir, name)
+            pack_path = idx_path[:-4] + '.pack'
+            if not os.path.exists(pack_path):
+                continue
+            with open(idx_path, 'rb') as f:
+                idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if idx[:4] != b'\xfftOc' or struct.unpack('>I', idx[4:8])[0] != 2:
+                idx.close()
+                raise NativeUnsupported(f"不支持的 pack 索引格式: {name}")
+            with open(pack_path, 'rb') as f:
+                pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            fanout = struct.unpack('>256I', idx[8:8 + 1024])
+            self._packs.append({'path': pack_path, 'idx': idx, 'pack': pack,
+                                'fanout': fanout, 'count': fanout[255]})
+            self._pack_names.add(name)
+
+    def approximate_object_count(self):
+        """pack 中的对象总数，与 git 计算缩写长度时使用的近似值一致"""
+        return sum(p['count'] for p in self._packs)
+
+    def _pack_find(self, pack, raw_oid):
+        """在 pack 索引的 fanout 区间内二分查找对象，返回偏移量或None"""
+        idx = pack['idx']
+        first = raw_oid[0]
+        lo = pack['fanout'][first - 1] if first else 0
+        hi = pack['fanout'][first]
+        names_start = 8 + 1024
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = names_start + mid * 20
+            name = idx[pos:pos + 20]
+            if name < raw_oid:
+                lo = mid + 1
+            elif name > raw_oid:
+                hi = mid
+            else:
+                return self._pack_offset(pack, mid)
+        return None
+
+    def _pack_offset(self, pack, index):
+        idx = pack['idx']
+        count = pack['count']
+        offsets_start = 8 + 1024 + count * 24
+        offset = struct.unpack('>I', idx[offsets_start + index * 4:offsets_start + index * 4 + 4])[0]
+        if offset & 0x80000000:
+            large_start = offsets_start + count * 4 + (offset & 0x7fffffff) * 8
+            offset = struct.unpack('>Q', idx[large_start:large_start + 8])[0]
+        return offset
+
+    def _pack_prefix_matches(self, pack, prefix):
+        """返回 pack 中以给定十六进制前缀开头的对象ID"""
+        idx = pack['idx']
+        first = int(prefix[:2], 16)
+        lo = pack['fanout'][first - 1] if first else 0
+        hi = pack['fanout'][first]
+        names_start = 8 + 1024
+        matches = []
+        for i in range(lo, hi):
+            hex_oid = idx[names_start + i * 20:names_start + i * 20 + 20].hex()
+            if hex_oid.startswith(prefix):
+                matches.append(hex_oid)
+            elif hex_oid > prefix:
+                break
+        return matches
+
+    def _inflate(self, data, offset, size):
+        """从 mmap 的指定位置解压 zlib 数据"""
+        decompressor = zlib.decompressobj()
+        chunk = max(size + 64, 4096)
+        result = b''
+        pos = offset
+        while not decompressor.eof:
+            block = data[pos:pos + chunk]
+            if not block:
+                raise NativeUnsupported("pack 数据不完整")
+            result += decompressor.decompress(block)
+            pos += len(block)
+        return result
+
+    def _read_pack_object(self, pack, offset):
+        """读取 pack 中指定偏移处的对象，必要时解析 delta 链"""
+        key = (pack['path'], offset)
+        cached = self._delta_cache.get(key)
+        if cached is not None:
+            self._delta_cache.move_to_end(key)
+            return cached
+
+        data = pack['pack']
+        pos = offset
+        byte = data[pos]
+        pos += 1
+        obj_type = (byte >> 4) & 7
+        size = byte & 0x0f
+        shift = 4
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+
+        if obj_type in self.TYPE_NAMES:
+            result = (self.TYPE_NAMES[obj_type], self._inflate(data, pos, size))
+        elif obj_type == self.OFS_DELTA:
+            byte = data[pos]
+            pos += 1
+            distance = byte & 0x7f
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                distance = ((distance + 1) << 7) | (byte & 0x7f)
+            base_type, base = self._read_pack_object(pack, offset - distance)
+            result = (base_type, self._apply_delta(base, self._inflate(data, pos, size)))
+        elif obj_type == self.REF_DELTA:
+            base_oid = bytes(data[pos:pos + 20]).hex()
+            # 调用方已持有 self._lock（不可重入），这里直接读取基对象
+            base_type, base = self._read(base_oid)
+            result = (base_type, self._apply_delta(base, self._inflate(data, pos + 20, size)))
+        else:
+            raise NativeUnsupported(f"未知的 pack 对象类型: {obj_type}")
+
+        self._cache_object(key, result)
+        return result
+
+    def _cache_object(self, key, value):
+        """把对象放入有大小上限的 LRU 缓存（作为后续 delta 的基对象）"""
+        size = len(value[1])
+        if size > self.delta_cache_bytes // 4:
+            return
+        self._delta_cache[key] = value
+        self._delta_cache_size += size
+        while self._delta_cache_size > self.delta_cache_bytes:
+            _, old = self._delta_cache.popitem(last=False)
+            self._delta_cache_size -= len(old[1])
+
+    @staticmethod
+    def _apply_delta(base, delta):
+        """按 git delta 格式把 delta 应用到基对象上"""
+        pos = 0
+
+        def read_varint():
+            nonlocal pos
+            value = 0
+            shift = 0
+            while True:
+                byte = delta[pos]
+                pos += 1
+                value |= (byte & 0x7f) << shift
+                shift += 7
+                if not byte & 0x80:
+                    return value
+
+        base_size = read_varint()
+        result_size = read_varint()
+        if base_size != len(base):
+            raise NativeUnsupported("delta 基对象大小不匹配")
+        out = bytearray()
+        length = len(delta)
+        while pos < length:
+            op = delta[pos]
+            pos += 1
+            if op & 0x80:
+                copy_offset = 0
+                copy_size = 0
+                for i in range(4):
+                    if op & (1 << i):
+                        copy_offset |= delta[pos] << (8 * i)
+                        pos += 1
+                for i in range(3):
+                    if op & (1 << (4 + i)):
+                        copy_size |= delta[pos] << (8 * i)
+                        pos += 1
+                out += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+            elif op:
+                out += delta[pos:pos + op]
+                pos += op
+            else:
+                raise NativeUnsupported("无效的 delta 指令")
+        if len(out) != result_size:
+            raise NativeUnsupported("delta 结果大小不匹配")
+        return bytes(out)
+
+    # ---------- 对象读取 ----------
+
+    def read(self, oid):
+        """读取对象，返回 (类型, 内容字节)"""
+        with self._lock:
+            return self._read(oid)
+
+    def _read(self, oid):
+        loose_path = os.path.join(self.objects_dir, oid[:2], oid[2:])
+        if os.path.exists(loose_path):
+            with open(loose_path, 'rb') as f:
+                raw = zlib.decompress(f.read())
+            header, _, body = raw.partition(b'\0')
+            obj_type = header.split(b' ', 1)[0].decode('ascii')
+            return obj_type, body
+
+        raw_oid = bytes.fromhex(oid)
+        for attempt in range(2):
+            for pack in self._packs:
+                offset = self._pack_find(pack, raw_oid)
+                if offset is not None:
+                    return self._read_pack_object(pack, offset)
+            if attempt == 0:
+                # 可能刚刚执行过 gc/repack，重新扫描 pack 目录
+                self._load_packs()
+        raise NativeUnsupported(f"找不到对象: {oid}")
+
+    def prefix_matches(self, prefix):
+        """查找以指定前缀开头的所有对象ID"""
+        prefix = prefix.lower()
+        matches = set()
+        loose_dir = os.path.join(self.objects_dir, prefix[:2])
+        try:
+            for name in os.listdir(loose_dir):
+                if (prefix[:2] + name).startswith(prefix):
+                    matches.add(prefix[:2] + name)
+        except OSError:
+            pass
+        for pack in self._packs:
+            matches.update(self._pack_prefix_matches(pack, prefix))
+        return matches
+
+    def abbreviate(self, oid, min_length=None):
+        """生成与 git 默认规则一致的唯一缩写"""
+        if min_length is None:
+            bits = self.approximate_object_count().bit_length()
+            min_length = max(7, (bits + 1) // 2)
+        length = min_length
+        while length < len(oid) and len(self.prefix_matches(oid[:length])) > 1:
+            length += 1
+        return oid[:length]
+
+    # ---------- 引用解析 ----------
+
+    def _read_ref(self, ref, depth=0):
+        if depth > 5:
+            raise NativeUnsupported(f"引用嵌套过深: {ref}")
+        base = self.git_dir if ref == 'HEAD' else self.common_dir
+        ref_path = os.path.join(base, *ref.split('/'))
+        if os.path.isfile(ref_path):
+            with open(ref_path, 'r', encoding='utf-8') as f:
+                value = f.read().strip()
+            if value.startswith('ref:'):
+                return self._read_ref(value[4:].strip(), depth + 1)
+            return value
+        packed = os.path.join(self.common_dir, 'packed-refs')
+        if os.path.isfile(packed):
+            with open(packed, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith(('#', '^')):
+                        continue
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+        if os.path.isdir(os.path.join(self.common_dir, 'reftable')):
+            raise NativeUnsupported("不支持 reftable 引用存储")
+        return None
+
+    def resolve(self, name='HEAD'):
+        """把 HEAD、分支/标签名或（缩写）哈希解析为完整对象ID"""
+        if re.fullmatch(r'[0-9a-fA-F]{40}', name):
+            return name.lower()
+        candidates = [name] if name == 'HEAD' or name.startswith('refs/') else [
+            f'refs/{name}', f'refs/tags/{name}', f'refs/heads/{name}', f'refs/remotes/{name}',
+            f'refs/remotes/{name}/HEAD']
+        for ref in candidates:
+            oid = self._read_ref(ref)
+            if oid:
+                return oid
+        if name == 'HEAD':
+            raise NativeUnsupported("当前分支还没有任何提交")
+        if re.fullmatch(r'[0-9a-fA-F]{4,39}', name):
+            matches = self.prefix_matches(name)
+            if len(matches) == 1:
+                return matches.pop()
+        raise NativeUnsupported(f"无法解析版本: {name}")
+
+    # ---------- 提交与历史 ----------
+
+    def read_commit(self, oid):
+        """解析提交对象，返回包含 tree/parents/author/committer/message 的字典"""
+        obj_type, body = self.read(oid)
+        while obj_type == 'tag':
+            target = body.split(b'\n', 1)[0].split(b' ', 1)[1].decode('ascii')
+            oid = target
+            obj_type, body = self.read(oid)
+        if obj_type != 'commit':
+            raise NativeUnsupported(f"{oid} 不是提交对象")
+        headers, _, message = body.partition(b'\n\n')
+        commit = {'oid': oid, 'tree': None, 'parents': [], 'author': '', 'committer': '', 'encoding': None}
+        for line in headers.split(b'\n'):
+            key, _, value = line.partition(b' ')
+            if key == b'tree':
+                commit['tree'] = value.decode('ascii')
+            elif key == b'parent':
+                commit['parents'].append(value.decode('ascii'))
+            elif key in (b'author', b'committer', b'encoding'):
+                commit[key.decode('ascii')] = value.decode('utf-8', errors='replace')
+        if commit['encoding'] and commit['encoding'].lower() not in ('utf-8', 'utf8'):
+            raise NativeUnsupported(f"不支持的提交编码: {commit['encoding']}")
+        commit['message'] = message.decode('utf-8', errors='replace')
+        commit['commit_time'] = self._signature_time(commit['committer'])
+        return commit
+
+    @staticmethod
+    def _signature_time(signature):
+        match = re.search(r'> (\d+) [+-]\d{4}$', signature)
+        return int(match.group(1)) if match else 0
+
+    @staticmethod
+    def subject(message):
+        """提取提交说明的标题（第一段，多行合并为一行），与 git 的 %s 一致"""
+        paragraph = message.lstrip('\n').split('\n\n', 1)[0]
+        return ' '.join(line.strip() for line in paragraph.strip().split('\n'))
+
+    def walk(self, start='HEAD', limit=None):
+        """按提交时间从新到旧遍历历史（与 git log 的默认顺序一致）"""
+        seen = set()
+        heap = []
+        counter = 0
+        start_oid = self.read_commit(self.resolve(start))['oid']
+        commit = self.read_commit(start_oid)
+        heapq.heappush(heap, (-commit['commit_time'], counter, commit))
+        seen.add(commit['oid'])
+        emitted = 0
+        while heap and (limit is None or emitted < limit):
+            _, _, commit = heapq.heappop(heap)
+            yield commit
+            emitted += 1
+            for parent in commit['parents']:
+                if parent in seen:
+                    continue
+                seen.add(parent)
+                counter += 1
+                parent_commit = self.read_commit(parent)
+                heapq.heappush(heap, (-parent_commit['commit_time'], counter, parent_commit))
+
+    @staticmethod
+    def expand_tabs(line, width=8):
+        """按显示宽度（全角字符占两列）把制表符展开为空格，与 git log 默认的 --expand-tabs 一致"""
+        if '\t' not in line:
+            return line
+        parts, column = [], 0
+        for char in line:
+            if char == '\t':
+                spaces = width - column % width
+                parts.append(' ' * spaces)
+                column += spaces
+                continue
+            parts.append(char)
+            if not unicodedata.combining(char):
+                column += 2 if unicodedata.east_asian_width(char) in 'WF' else 1
+        return ''.join(parts)
+
+    def show_header(self, oid):
+        """生成与 git show 默认（medium）格式相同的提交头部和说明，返回 (文本, 是否为合并提交)"""
+        commit = self.read_commit(oid)
+        if commit['oid'] != oid or commit['encoding']:
+            raise NativeUnsupported("标签或带编码声明的提交交给 git show 处理")
+        match = re.match(r'(.*) <(.*)> (\d+) ([+-]\d{4})$', commit['author'])
+        if not match:
+            raise NativeUnsupported(f"无法解析作者信息: {commit['author']}")
+        name, email, author_time, author_tz = match.groups()
+        lines = [f"commit {oid}"]
+        merge = len(commit['parents']) > 1
+        if merge:
+            lines.append('Merge: ' + ' '.join(self.abbreviate(parent) for parent in commit['parents']))
+        lines += [f"Author: {name} <{email}>", f"Date:   {CommitRecord.format_date(int(author_time), author_tz)}"]
+        message = commit['message'].rstrip('\n').split('\n')
+        # git 会跳过说明开头的空行，说明为空时也不输出分隔的空行
+        while message and not message[0].strip():
+            message.pop(0)
+        if message:
+            lines += [''] + ['    ' + self.expand_tabs(line) for line in message]
+        return '\n'.join(lines) + '\n', merge
+
+    def records(self, start='HEAD', limit=None):
+        """把历史遍历结果转换为 CommitRecord 列表"""
+        records = []
+        for commit in self.walk(start, limit):
+            match = re.match(r'(.*) <(.*)> (\d+) ([+-]\d{4})$', commit['author'])
+            name, email, author_time, author_tz = match.groups() if match else (commit['author'], '', 0, '+0000')
+            message = commit['message'].lstrip('\n')
+            body = message.partition('\n\n')[2].strip('\n')
+            records.append(CommitRecord(
+                commit['oid'], self.abbreviate(commit['oid']), tuple(commit['parents']),
+                name, email, int(author_time), commit['commit_time'], self.subject(message),
+                body=body, author_tz=author_tz))
+        return records
+
+    # ---------- 索引 ----------
+
+    def index_paths(self):
+        """读取 .git/index（v2/v3）中的路径列表"""
+        index_path = os.path.join(self.git_dir, 'index')
+        if not os.path.exists(index_path):
+            return []
+        with open(index_path, 'rb') as f:
+            data = f.read()
+        if data[:4] != b'DIRC':
+            raise NativeUnsupported("无效的索引文件")
+        version, count = struct.unpack('>II', data[4:12])
+        if version not in (2, 3):
+            raise NativeUnsupported(f"不支持的索引版本: {version}")
+        paths = []
+        pos = 12
+        for _ in range(count):
+            flags = struct.unpack('>H', data[pos + 60:pos + 62])[0]
+            header_len = 62
+            if version == 3 and flags & 0x4000:
+                header_len += 2
+            name_end = data.index(b'\0', pos + header_len)
+            name = data[pos + header_len:name_end]
+            if flags & 0x3000 or name.endswith(b'/'):
+                # 冲突条目和稀疏索引目录条目交给 git 处理
+                raise NativeUnsupported("索引中存在冲突或稀疏目录条目")
+            paths.append(name)
+            pos += ((header_len + len(name) + 8) // 8) * 8
+        return paths
+
+    @staticmethod
+    def quote_path(name):
+        """按 git 默认的 core.quotePath 规则对路径加引号转义"""
+        escapes = {7: 'a', 8: 'b', 9: 't', 10: 'n', 11: 'v', 12: 'f', 13: 'r', 34: '"', 92: '\\'}
+        if not any(b < 0x20 or b >= 0x7f or b in (34, 92) for b in name):
+            return name.decode('ascii')
+        out = []
+        for b in name:
+            if b in escapes:
+                out.append('\\' + escapes[b])
+            elif b < 0x20 or b >= 0x7f:
+                out.append(f'\\{b:03o}')
+            else:
+                out.append(chr(b))
+        return '"' + ''.join(out) + '"'
+
+    def list_files(self, cwd=None):
+        """生成与 git ls-files 相同的文本（相对当前目录）"""
+        prefix = ''
+        if self.worktree:
+            relative = os.path.relpath(os.path.abspath(cwd or os.getcwd()), self.worktree)
+            if relative.startswith('..'):
+                raise NativeUnsupported("当前目录不在工作区内")
+            if relative != '.':
+                prefix = relative.replace(os.sep, '/') + '/'
+        prefix_bytes = prefix.encode('utf-8')
+        lines = []
+        for name in self.index_paths():
+            if prefix_bytes:
+                if not name.startswith(prefix_bytes):
+                    continue
+                name = name[len(prefix_bytes):]
+            lines.append(self.quote_path(name))
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def close(self):
+        """解除所有 mmap 映射"""
+        with self._lock:
+            for pack in self._packs:
+                pack['idx'].close()
+                pack['pack'].close()
+            self._packs = []
+            self._pack_names = set()
+            self._delta_cache.clear()
+            self._delta_cache_size = 0
+
+
+class GitTracer:
+    """记录每次 git 调用的耗时、子进程 CPU 时间、输入输出字节数和触发它的菜单操作
+
+    记录保存在内存中，设置了 jsonl_path 时每条记录追加一行 JSON；
+    trace2=True 时通过 GIT_TRACE2_EVENT 让 git 写出自己的事件，并把其中的
+    区域耗时合并进记录。hooks 中的回调会在每条记录完成后被调用。
+    """
+
+    def __init__(self, jsonl_path=None, trace2=False, max_records=10000):
+        self.jsonl_path = jsonl_path
+        self.trace2 = trace2
+        self.records = collections.deque(maxlen=max_records)
+        self.hooks = []
+        self.action = None
+        # 后台线程用自己的操作名称，不覆盖主线程的 action
+        self._thread_action = threading.local()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """按环境变量 GIT_MANAGER_TRACE（JSON lines 文件）和 GIT_MANAGER_TRACE2 创建"""
+        trace2 = os.environ.get('GIT_MANAGER_TRACE2', '').lower() in ('1', 'true', 'yes')
+        return cls(os.environ.get('GIT_MANAGER_TRACE') or None, trace2)
+
+    def add_hook(self, hook):
+        """注册回调，参数为完成的记录字典"""
+        self.hooks.append(hook)
+
+    def set_thread_action(self, action):
+        """为当前线程之后的调用设置操作名称，None 表示沿用 action"""
+        self._thread_action.value = action
+
+    @staticmethod
+    def _child_cpu():
+        """已回收子进程累计的 CPU 时间（秒），平台不支持时返回None"""
+        try:
+            import resource
+        except ImportError:
+            return None
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def begin(self, command, env, spawn=True):
+        """开始记录一次调用，返回记录上下文；上下文中的 env 应作为子进程环境
+
+        spawn=False 表示复用常驻子进程的请求，不统计 CPU 时间也不启用 trace2。
+        """
+        action = getattr(self._thread_action, 'value', None) or self.action
+        context = {'command': list(command), 'action': action, 'env': env, 'spawn': spawn,
+                   'start': time.perf_counter(), 'cpu': self._child_cpu() if spawn else None,
+                   'trace2_file': None}
+        if self.trace2 and spawn:
+            fd, path = tempfile.mkstemp(prefix='git_trace2_', suffix='.json')
+            os.close(fd)
+            context['trace2_file'] = path
+            self._pending.add(path)
+            context['env'] = dict(env, GIT_TRACE2_EVENT=path)
+        return context
+
+    def end(self, context, returncode, bytes_in=0, bytes_out=0):
+        """结束记录，返回完成的记录字典"""
+        wall = time.perf_counter() - context['start']
+        cpu = self._child_cpu()
+        # RUSAGE_CHILDREN 是进程级累计值，并发调用时只能作为近似值
+        child_cpu = cpu - context['cpu'] if cpu is not None and context['cpu'] is not None else None
+        record = {
+            'time': time.time(),
+            'command': ' '.join(context['command']),
+            'action': context['action'],
+            'returncode': returncode,
+            'spawned': context['spawn'],
+            'wall_ms': round(wall * 1000, 3),
+            'child_cpu_ms': round(child_cpu * 1000, 3) if child_cpu is not None else None,
+            'bytes_in': bytes_in,
+            'bytes_out': bytes_out,
+        }
+        if context['trace2_file']:
+            record['trace2'] = self.read_trace2(context['trace2_file'])
+            self._pending.discard(context['trace2_file'])
+            try:
+                os.remove(context['trace2_file'])
+            except OSError:
+                pass
+
+        with self._lock:
+            self.records.append(record)
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                except OSError as e:
+                    print(f"错误: 无法写入跟踪文件 {self.jsonl_path}: {e}")
+                    self.jsonl_path = None
+        for hook in self.hooks:
+            hook(record)
+        return record
+
+    @staticmethod
+    def read_trace2(path):
+        """读取 GIT_TRACE2_EVENT 文件，返回 git 自报的总耗时和各区域耗时"""
+        summary = {'git_ms': None, 'regions': []}
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    kind = event.get('event')
+                    if kind == 'region_leave' and 't_rel' in event:
+                        summary['regions'].append({
+                            'category': event.get('category'),
+                            'label': event.get('label'),
+                            'ms': round(event['t_rel'] * 1000, 3),
+                        })
+                    elif kind in ('exit', 'atexit') and 't_abs' in event:
+                        summary['git_ms'] = round(event['t_abs'] * 1000, 3)
+        except OSError:
+            pass
+        return summary
+
+    def close(self):
+        """删除还没有读取的 trace2 临时文件（例如后台线程尚未结束的调用）"""
+        for path in list(self._pending):
+            self._pending.discard(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def export(self, path):
+        """把内存中的记录写成 JSON lines 文件，返回写入的条数"""
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return len(records)
+
+    def summary(self, limit=10):
+        """汇总最慢的调用和按操作分组的耗时"""
+        with self._lock:
+            records = list(self.records)
+        if not records:
+            return "还没有记录到 git 调用"
+
+        total = sum(r['wall_ms'] for r in records)
+        lines = [f"共 {len(records)} 次 git 调用，总耗时 {total:.1f} ms", "", "最慢的调用:"]
+        for r in sorted(records, key=lambda r: r['wall_ms'], reverse=True)[:limit]:
+            cpu = f"{r['child_cpu_ms']:.1f}" if r['child_cpu_ms'] is not None else '-'
+            command = r['command'] if len(r['command']) <= 60 else r['command'][:57] + '...'
+            lines.append(f"  {r['wall_ms']:9.1f} ms  cpu {cpu:>8} ms  "
+                         f"in {r['bytes_in']:>9}  out {r['bytes_out']:>10}  "
+                         f"[{r['action'] or '-'}] {command}")
+            regions = sorted((r.get('trace2') or {}).get('regions', []), key=lambda g: g['ms'], reverse=True)
+            for region in regions[:3]:
+                lines.append(f"              trace2 {region['category']}/{region['label']}: {region['ms']:.1f} ms")
+
+        by_action = {}
+        for r in records:
+            entry = by_action.setdefault(r['action'] or '-', [0, 0.0])
+            entry[0] += 1
+            entry[1] += r['wall_ms']
+        lines += ["", "按操作汇总:"]
+        for action, (count, wall) in sorted(by_action.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f"  {action:<20} {count:>5} 次  {wall:10.1f} ms")
+        return '\n'.join(lines)
+
 
 class GitManager:
-    def __init__(self):
+    def __init__(self, use_native=True, repo_path=None, tracer=None):
+        # repo_path 为 None 时使用进程的当前目录
+        self.repo_path = os.path.abspath(repo_path) if repo_path else None
+        # 每次 git 调用都会经过 tracer 记录耗时，默认按环境变量决定是否导出
+        self.tracer = tracer if tracer is not None else GitTracer.from_env()
+        self.git = None
+        self._env = None
+        self._object_reader = None
+        self.use_native = use_native
+        self._native_store = None
+        self._native_checked = False
+        self._native_refresh = False
+        self._result_cache = None
+        self._worktree_pool = None
+        self.maintenance = None
         self.check_git_installed()
         
     def check_git_installed(self):
-        """检查是否安装了Git"""
-        try:
-            subprocess.run(['git', '--version'], check=True, capture_output=True)
-        except subprocess.CalledProcessError:
+        """检查是否安装了Git（版本信息按可执行文件缓存，不必每次启动都运行 git）"""
+        self.git = GitInstallation.detect()
+        if self.git is None:
             print("错误: 未安装Git或Git不在系统PATH中")
             sys.exit(1)
             
-    def run_git_command(self, command):
-        """执行Git命令并返回结果"""
-        try:
-            # 设置环境变量，确保Git使用UTF-8编码
+    def git_env(self):
+        """Git子进程的环境变量，确保Git使用UTF-8编码
+
+        只在第一次调用时构造，之后复用同一份只读映射；需要修改时请先复制。
+        """
+        if self._env is None:
             env = os.environ.copy()
             env['LANG'] = 'en_US.UTF-8'
             env['PYTHONIOENCODING'] = 'utf-8'
-            
+            self._env = types.MappingProxyType(env)
+        return self._env
+
+    def run_git_process(self, command, timeout=None, cwd=None):
+        """执行Git命令并返回完整结果（returncode/stdout/stderr），失败时不打印错误
+
+        cwd 默认为当前仓库目录；后台线程应传入自己开始时记下的目录。
+        """
+        context = self.tracer.begin(command, self.git_env())
+        try:
             # 添加 encoding='utf-8' 参数
             result = subprocess.run(
                 command,
-                check=True,
                 capture_output=True,
                 text=True,
                 encoding='utf-8',
                 errors='replace',
-                env=env
+                env=context['env'],
+                cwd=cwd or self.repo_path,
+                timeout=timeout
             )
-            return result.stdout
-        except subprocess.CalledProcessError as e:
-            print(f"错误: {e.stderr}")
+        except subprocess.TimeoutExpired:
+            self.tracer.end(context, None)
+            raise
+        # 文本模式下按字符数统计输出大小
+        self.tracer.end(context, result.returncode, 0, len(result.stdout or '') + len(result.stderr or ''))
+        return result
+
+    def run_git_command(self, command):
+        """执行Git命令并返回结果"""
+        result = self.run_git_process(command)
+        if result.returncode != 0:
+            print(f"错误: {result.stderr}")
+            return None
+        return result.stdout
+
+    def stream_git_command(self, command, chunk_size=65536, lines=True):
+        """以流的方式执行Git命令，边读取边产出解码后的文本
+
+        lines=True 时按行产出，否则按块产出。只有调用方取走数据后才继续读取管道，
+        git 写满管道缓冲区后会自动等待（背压）。生成器正常结束时返回是否执行成功。
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        context = self.tracer.begin(command, self.git_env())
+        received = 0
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=context['env'],
+            cwd=self.repo_path
+        )
+        # 在后台线程中读取错误输出，避免 stderr 管道写满导致子进程阻塞
+        stderr_chunks = []
+        stderr_reader = threading.Thread(
+            target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_reader.start()
+
+        finished = False
+        try:
+            pending = ''
+            while True:
+                block = process.stdout.read1(chunk_size)
+                if not block:
+                    break
+                received += len(block)
+                text = decoder.decode(block)
+                if not lines:
+                    if text:
+                        yield text
+                    continue
+                pending += text
+                if '\n' in pending:
+                    *complete, pending = pending.split('\n')
+                    for line in complete:
+                        yield line + '\n'
+            tail = pending + decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            finished = True
+        finally:
+            if not finished:
+                # 调用方提前停止读取，结束子进程
+                process.kill()
+            process.stdout.close()
+            process.wait()
+            stderr_reader.join()
+            process.stderr.close()
+            self.tracer.end(context, process.returncode, 0,
+                            received + sum(len(chunk) for chunk in stderr_chunks if chunk))
+
+        if process.returncode != 0:
+            error = b''.join(chunk for chunk in stderr_chunks if chunk)
+            print(f"错误: {error.decode('utf-8', errors='replace')}")
+            return False
+        return True
+
+    def print_listing(self, stream):
+        """逐行打印列表输出，返回是否打印了内容"""
+        printed = False
+        for line in stream:
+            print(line, end='', flush=True)
+            printed = True
+        return printed
+
+    def print_stream(self, stream):
+        """逐行打印流式输出，返回命令是否执行成功
+
+        git 命令的生成器结束时返回是否成功；普通迭代器（原生引擎、缓存的输出）
+        没有返回值，视为成功。
+        """
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                return stop.value is None or bool(stop.value)
+            print(chunk, end='', flush=True)
+
+    def object_reader(self):
+        """获取常驻的对象读取器（首次使用时才启动 cat-file 子进程）"""
+        if self._object_reader is None:
+            self._object_reader = GitObjectReader(env=self.git_env(), cwd=self.repo_path,
+                                                  tracer=self.tracer)
+        return self._object_reader
+
+    def native_store(self):
+        """获取原生只读引擎，仓库不在本地或不适合原生读取时返回None"""
+        if not self.use_native:
             return None
+        if self._native_refresh:
+            # 后台维护改变了 pack 文件，在调用方线程中重新加载
+            self._native_refresh = False
+            if self._native_store is not None:
+                self._native_store.close()
+                self._native_store = None
+            self._native_checked = False
+        if not self._native_checked:
+            self._native_checked = True
+            try:
+                self._native_store = NativeObjectStore.discover(self.repo_path)
+            except (NativeUnsupported, OSError, ValueError):
+                self._native_store = None
+        return self._native_store
+
+    def refresh_native_store(self):
+        """标记原生引擎需要在下次使用前重新加载（可以在其他线程中调用）"""
+        self._native_refresh = True
+
+    def run_native(self, operation, *args):
+        """尝试用原生引擎执行只读操作，无法处理时返回None以便回退到git命令"""
+        store = self.native_store()
+        if store is None:
+            return None
+        try:
+            return getattr(store, operation)(*args)
+        except (NativeUnsupported, OSError, ValueError, KeyError, IndexError, zlib.error, struct.error):
+            return None
+
+    def close(self):
+        """释放常驻的子进程和映射的 pack 文件"""
+        if self._object_reader is not None:
+            self._object_reader.close()
+            self._object_reader = None
+        if self._native_store is not None:
+            self._native_store.close()
+            self._native_store = None
+            self._native_checked = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def state_dir(self):
+        """获取存放本工具状态文件的目录（位于 .git/git_manager 下）"""
+        if getattr(self, '_state_dir', None) is None:
+            # 原生引擎已经找到了公共 .git 目录时不必再启动 git rev-parse
+            store = self.native_store()
+            if store is not None:
+                git_dir = store.common_dir
+            else:
+                output = self.run_git_command(['git', 'rev-parse', '--git-common-dir'])
+                if not output:
+                    return None
+                git_dir = os.path.join(self.repo_path or os.getcwd(), output.strip())
+            self._state_dir = os.path.join(os.path.abspath(git_dir), 'git_manager')
+        os.makedirs(self._state_dir, exist_ok=True)
+        return self._state_dir
+
+    def read_state(self, name, default=None):
+        """读取 JSON 状态文件，不存在或已损坏时返回默认值"""
+        state_dir = self.state_dir()
+        if state_dir is None:
+            return default
+        try:
+            with open(os.path.join(state_dir, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def write_state(self, name, data):
+        """原子地写入 JSON 状态文件：先写临时文件并落盘，再重命名覆盖"""
+        state_dir = self.state_dir()
+        if state_dir is None:
+            return False
+        fd, temp_path = tempfile.mkstemp(prefix=f'.{name}.', dir=state_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, os.path.join(state_dir, name))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
 
     def validate_number(self, value, default=5):
         """验证输入是否为有效的数字"""
@@ -66,12 +1744,15 @@ class GitManager:
             print("URL不能为空")
             return None
         
-        # 简单的URL格式验证
-        url_pattern = r'^(https?://|git@)[\w\d\-\.]+[:/][\w\d\-\./]+$'
-        if not re.match(url_pattern, url.strip()):
-            print("无效的Git仓库URL格式")
-            return None
-        return url.strip()
+        # 简单的URL格式验证，也接受 file:// 地址和本地仓库路径
+        url = url.strip()
+        url_pattern = r'^((https?|ssh|git)://|[\w.\-]+@)[\w\d\-\.]+(:\d+)?[:/][\w\d\-\./~]+$'
+        if re.match(url_pattern, url) or re.match(r'^file://', url):
+            return url
+        if os.path.isdir(os.path.expanduser(url)):
+            return os.path.expanduser(url)
+        print("无效的Git仓库URL格式")
+        return None
 
     def add_remote(self, name, url):
         """添加远程仓库"""
@@ -85,12 +1766,94 @@ class GitManager:
         """删除远程仓库"""
         return self.run_git_command(['git', 'remote', 'remove', name])
 
-    def clone_repository(self, url, directory=None):
-        """克隆远程仓库"""
-        command = ['git', 'clone', url]
-        if directory:
-            command.append(directory)
-        return self.run_git_command(command)
+    # 克隆方式：完整、部分（blob:none，文件内容按需获取）、浅克隆、稀疏检出（部分克隆 + 只检出指定目录）
+    CLONE_PROFILES = {
+        'full': "完整克隆",
+        'partial': "部分克隆（先不下载文件内容，用到时再按需获取）",
+        'shallow': "浅克隆（只下载最近的历史）",
+        'sparse': "稀疏检出（部分克隆 + 只检出指定目录）",
+    }
+
+    @staticmethod
+    def clone_directory_name(url):
+        """与 git 相同的规则从地址推断默认的目标目录名"""
+        name = url.rstrip('/')
+        if name.endswith('/.git'):
+            name = name[:-5]
+        name = re.split(r'[/:\\\\]', name)[-1]
+        return name[:-4] if name.endswith('.git') else name
+
+    @staticmethod
+    def disk_usage(path):
+        """统计目录占用的字节数，返回 (.git 目录, 工作区文件)"""
+        git_bytes = work_bytes = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            inside_git = os.path.relpath(dirpath, path).split(os.sep)[0] == '.git'
+            for name in filenames:
+                try:
+                    size = os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    continue
+                if inside_git:
+                    git_bytes += size
+                else:
+                    work_bytes += size
+        return git_bytes, work_bytes
+
+    def clone_repository(self, url, directory=None, profile='full', depth=None, shallow_since=None,
+                         sparse_dirs=None, branch=None):
+        """按指定方式克隆远程仓库，返回包含耗时和磁盘占用的说明，失败时返回None
+
+        profile 为 CLONE_PROFILES 中的一种；depth/shallow_since 用于浅克隆，
+        sparse_dirs 为稀疏检出保留的目录（cone 模式）。部分克隆和稀疏检出之后，
+        缺少的文件内容会在检出、查看历史等需要时自动从远程获取。
+        """
+        if profile not in self.CLONE_PROFILES:
+            print(f"错误: 未知的克隆方式 {profile}")
+            return None
+        if profile in ('partial', 'sparse') and not self.git.at_least(2, 27):
+            print("错误: 部分克隆和稀疏检出需要 Git 2.27 或更高版本")
+            return None
+        # 本地路径克隆时 git 会忽略 --filter/--depth，改用 file:// 协议
+        if profile != 'full' and '://' not in url and os.path.isdir(url):
+            url = 'file://' + os.path.abspath(url).replace(os.sep, '/')
+        directory = directory or self.clone_directory_name(url)
+        target = os.path.join(self.repo_path or os.getcwd(), directory)
+
+        command = ['git', 'clone']
+        if branch:
+            command += ['--branch', branch]
+        if profile in ('partial', 'sparse'):
+            command.append('--filter=blob:none')
+        if profile == 'shallow':
+            if shallow_since:
+                command.append(f'--shallow-since={shallow_since}')
+            else:
+                command += ['--depth', str(depth or 1)]
+        if profile == 'sparse':
+            command.append('--no-checkout')
+        command += [url, directory]
+
+        start = time.perf_counter()
+        if self.run_git_command(command) is None:
+            return None
+        if profile == 'sparse':
+            dirs = [d.replace(os.sep, '/').strip('/') for d in (sparse_dirs or ['web']) if d.strip('/')]
+            for step in (['sparse-checkout', 'init', '--cone'], ['sparse-checkout', 'set', *dirs],
+                         ['checkout']):
+                if self.run_git_command(['git', '-C', target, *step]) is None:
+                    return None
+        elapsed = time.perf_counter() - start
+
+        git_bytes, work_bytes = self.disk_usage(target)
+        lines = [f"已克隆到 {target}（{self.CLONE_PROFILES[profile]}）",
+                 f"耗时 {elapsed:.2f} 秒，.git 占用 {self.format_size(git_bytes)}，"
+                 f"工作区文件 {self.format_size(work_bytes)}，合计 {self.format_size(git_bytes + work_bytes)}"]
+        if profile == 'sparse':
+            lines.append(f"只检出了: {', '.join(dirs)}（可用 git sparse-checkout add <目录> 增加）")
+        if profile == 'shallow':
+            lines.append("需要完整历史时可执行 git fetch --unshallow")
+        return '\n'.join(lines)
 
     def config_user(self, name, email):
         """配置用户信息"""
@@ -108,72 +1871,835 @@ class GitManager:
 
     def init_repository(self):
         """初始化Git仓库"""
-        if os.path.exists('.git'):
+        if os.path.exists(os.path.join(self.repo_path or '.', '.git')):
             return "当前目录已经是一个Git仓库"
         
         # 初始化仓库
+        if self.repo_path:
+            os.makedirs(self.repo_path, exist_ok=True)
         init_result = self.run_git_command(['git', 'init'])
         if not init_result:
             return "仓库初始化失败"
 
-        # 配置用户信息
-        print("\n请配置用户信息:")
-        name = input("请输入用户名: ").strip()
-        email = input("请输入邮箱: ").strip()
-        
-        if name or email:
-            config_result = self.config_user(name, email)
-            return f"{init_result}\n{config_result}"
-        return init_result
+        # 配置用户信息
+        print("\n请配置用户信息:")
+        name = input("请输入用户名: ").strip()
+        email = input("请输入邮箱: ").strip()
+        
+        if name or email:
+            config_result = self.config_user(name, email)
+            return f"{init_result}\n{config_result}"
+        return init_result
+
+    def status(self, worktree=None):
+        """查看仓库状态，worktree 为分支名或目录时查看对应工作树的状态"""
+        if worktree:
+            info = self.resolve_worktree(worktree)
+            return self.run_git_command(['git', '-C', info['path'], 'status']) if info else None
+        self.ensure_status_acceleration()
+        return self.run_git_command(['git', 'status'])
+
+    STATUS_ACCEL_STATE = 'status_acceleration.json'
+    # 状态加速会修改仓库配置并启动 fsmonitor 守护进程，需要用户通过这个配置明确开启
+    STATUS_ACCEL_CONFIG = 'gitmanager.statusAcceleration'
+
+    def enable_status_acceleration(self):
+        """开启并验证 core.untrackedCache 和内置 fsmonitor，返回各项是否生效"""
+        report = {'untracked_cache': False, 'fsmonitor': False}
+        self.run_git_process(['git', 'config', 'core.untrackedCache', 'true'])
+        check = self.run_git_process(['git', 'update-index', '--test-untracked-cache'])
+        if check.returncode == 0:
+            enabled = self.run_git_process(['git', 'update-index', '--untracked-cache'])
+            report['untracked_cache'] = enabled.returncode == 0
+        if not report['untracked_cache']:
+            # 文件系统不支持目录 mtime 语义（或无法写入索引），关闭以免得到错误的结果
+            self.run_git_process(['git', 'config', '--unset', 'core.untrackedCache'])
+
+        if 'fsmonitor--daemon' in self.git.features:
+            self.run_git_process(['git', 'config', 'core.fsmonitor', 'true'])
+            started = self.run_git_process(['git', 'fsmonitor--daemon', 'start'])
+            running = self.run_git_process(['git', 'fsmonitor--daemon', 'status'])
+            if started.returncode == 0 or running.returncode == 0:
+                report['fsmonitor'] = True
+            else:
+                self.run_git_process(['git', 'config', '--unset', 'core.fsmonitor'])
+        return report
+
+    def ensure_status_acceleration(self):
+        """配置了 gitmanager.statusAcceleration=true 时开启状态加速，未开启时不修改任何配置
+
+        开启和验证在第一次查看状态时同步进行（验证 untracked cache 要等待几秒的目录 mtime 测试），
+        结果记录在状态目录中，每个仓库只做一次。
+        """
+        if getattr(self, '_status_accel', None) is not None:
+            return self._status_accel
+        if not self.config_flag(self.STATUS_ACCEL_CONFIG):
+            self._status_accel = {}
+            return self._status_accel
+        state = self.read_state(self.STATUS_ACCEL_STATE)
+        if state is None or state.get('pending'):
+            state = self.enable_status_acceleration()
+            self.write_state(self.STATUS_ACCEL_STATE, state)
+        self._status_accel = state
+        return state
+
+    def ask_status_acceleration(self):
+        """交互模式下询问一次是否开启状态加速，回答记录在 gitmanager.statusAcceleration 中"""
+        if self.run_git_process(['git', 'rev-parse', '--git-dir']).returncode != 0:
+            return
+        if self.config_flag(self.STATUS_ACCEL_CONFIG) is not None:
+            return
+        answer = input("是否开启状态加速？将在本仓库配置中启用 core.untrackedCache 和 core.fsmonitor (y/N): ")
+        value = 'true' if answer.strip().lower() == 'y' else 'false'
+        self.run_git_process(['git', 'config', self.STATUS_ACCEL_CONFIG, value])
+
+    def status_entries(self, ignored=False):
+        """解析 git status --porcelain=v2 -z，返回 (分支信息字典, StatusEntry 列表)"""
+        self.ensure_status_acceleration()
+        command = ['git', 'status', '--porcelain=v2', '-z', '--branch']
+        if ignored:
+            command.append('--ignored')
+        output = self.run_git_command(command)
+        if output is None:
+            return None, []
+
+        branch = {}
+        entries = []
+        tokens = output.split('\0')
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            i += 1
+            if not token:
+                continue
+            kind = token[0]
+            if kind == '#':
+                key, _, value = token[2:].partition(' ')
+                branch[key] = value
+            elif kind == '1':
+                fields = token.split(' ', 8)
+                entries.append(StatusEntry('changed', fields[1][0], fields[1][1], fields[8]))
+            elif kind == '2':
+                # 重命名/复制：-z 模式下原路径是下一个 NUL 分隔的字段
+                fields = token.split(' ', 9)
+                entries.append(StatusEntry('renamed', fields[1][0], fields[1][1], fields[9], tokens[i]))
+                i += 1
+            elif kind == 'u':
+                fields = token.split(' ', 10)
+                entries.append(StatusEntry('unmerged', fields[1][0], fields[1][1], fields[10]))
+            elif kind == '?':
+                entries.append(StatusEntry('untracked', '?', '?', token[2:]))
+            elif kind == '!':
+                entries.append(StatusEntry('ignored', '!', '!', token[2:]))
+        return branch, entries
+
+    def status_counts(self, entries=None):
+        """按状态统计文件数量，不渲染任何文本"""
+        if entries is None:
+            _, entries = self.status_entries()
+        counts = {'staged': 0, 'unstaged': 0, 'untracked': 0, 'unmerged': 0, 'renamed': 0, 'ignored': 0}
+        for entry in entries:
+            if entry.staged:
+                counts['staged'] += 1
+            if entry.unstaged:
+                counts['unstaged'] += 1
+            if entry.kind == 'renamed':
+                counts['renamed'] += 1
+            elif entry.kind in ('untracked', 'unmerged', 'ignored'):
+                counts[entry.kind] += 1
+        return counts
+
+    def format_status(self):
+        """紧凑的状态视图：分支信息、各状态数量和每个文件一行"""
+        branch, entries = self.status_entries()
+        if branch is None:
+            return None
+        counts = self.status_counts(entries)
+        lines = [f"分支: {branch.get('branch.head', '未知')}"]
+        if 'branch.upstream' in branch:
+            ahead_behind = branch.get('branch.ab', '').split()
+            lines[0] += f"  上游: {branch['branch.upstream']} {' '.join(ahead_behind)}"
+        lines.append(f"已暂存: {counts['staged']}  未暂存: {counts['unstaged']}  "
+                     f"未跟踪: {counts['untracked']}  冲突: {counts['unmerged']}")
+        lines += [entry.short() for entry in entries]
+        if not entries:
+            lines.append("工作区是干净的")
+        return '\n'.join(lines)
+
+    def run_pathspec_command(self, base_command, paths):
+        """对大量路径执行一次 git 命令，返回逐路径的结果报告
+
+        git 2.26+ 通过 stdin 以 NUL 分隔传入路径（--pathspec-from-file=- --pathspec-file-nul），
+        不受命令行长度限制；旧版本按系统 ARG_MAX 自动分块作为参数传入。
+        某个路径匹配不到文件时 git 会整体失败，此时记录该路径并去掉后重试。
+        """
+        pending = list(dict.fromkeys(paths))
+        report = {'ok': [], 'failed': {}, 'processes': 0}
+        use_stdin = self.git.at_least(2, 26)
+        try:
+            arg_max = os.sysconf('SC_ARG_MAX')
+        except (AttributeError, ValueError, OSError):
+            arg_max = 32768
+        # 给环境变量和命令本身留出余量
+        chunk_limit = max(4096, min(arg_max // 2, 128 * 1024))
+
+        while pending:
+            if use_stdin:
+                chunks = [pending]
+            else:
+                chunks, current, size = [], [], 0
+                for path in pending:
+                    if current and size + len(path.encode('utf-8')) + 1 > chunk_limit:
+                        chunks.append(current)
+                        current, size = [], 0
+                    current.append(path)
+                    size += len(path.encode('utf-8')) + 1
+                chunks.append(current)
+
+            retry = []
+            for chunk in chunks:
+                if use_stdin:
+                    command = base_command + ['--pathspec-from-file=-', '--pathspec-file-nul']
+                    payload = '\0'.join(chunk).encode('utf-8')
+                else:
+                    command, payload = base_command + ['--'] + chunk, None
+                context = self.tracer.begin(
+                    command if payload is not None else base_command + ['--', f'<{len(chunk)} 个路径>'],
+                    self.git_env())
+                result = subprocess.run(command, input=payload, capture_output=True,
+                                        env=context['env'], cwd=self.repo_path)
+                self.tracer.end(context, result.returncode, len(payload or b''),
+                                len(result.stdout) + len(result.stderr))
+                report['processes'] += 1
+                if result.returncode == 0:
+                    report['ok'].extend(chunk)
+                    continue
+                stderr = result.stderr.decode('utf-8', errors='replace').strip()
+                bad = self._failed_paths(stderr, chunk)
+                if not bad:
+                    if len(chunk) == 1:
+                        report['failed'][chunk[0]] = stderr
+                    else:
+                        # 输出里认不出具体路径时二分重试，把失败定位到单个路径
+                        middle = len(chunk) // 2
+                        chunks.extend([chunk[:middle], chunk[middle:]])
+                    continue
+                report['failed'].update(bad)
+                retry.extend(path for path in chunk if path not in bad)
+            pending = retry
+        return report
+
+    @staticmethod
+    def _failed_paths(stderr, chunk):
+        """从 git 的错误输出中找出失败的路径，返回 {路径: 原因}
+
+        git 在 fatal/error 行里用引号给出出错的路径，被 .gitignore 忽略的路径则逐行列在提示之后。
+        """
+        wanted = set(chunk)
+        failed = {}
+        ignored = False
+        for line in stderr.splitlines():
+            if line.startswith('The following paths are ignored'):
+                ignored = True
+                continue
+            if ignored and line and not line.startswith(('hint:', 'fatal:', 'error:')):
+                if line.strip() in wanted:
+                    failed[line.strip()] = "被 .gitignore 忽略"
+                continue
+            ignored = False
+            for path in re.findall(r"""['"](.+?)['"]""", line):
+                if path in wanted:
+                    if 'did not match' in line:
+                        failed[path] = "没有匹配的文件"
+                    else:
+                        failed[path] = line.split(': ', 1)[-1]
+        return failed
+
+    def format_pathspec_report(self, report, action):
+        """把逐路径的结果汇总为文本"""
+        lines = [f"{action}: 成功 {len(report['ok'])} 个路径，失败 {len(report['failed'])} 个"
+                 f"（共启动 {report['processes']} 个 git 进程）"]
+        for path, reason in report['failed'].items():
+            lines.append(f"  ❌ {path}: {reason}")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _split_paths(files):
+        """把用户输入或路径列表统一转换为列表
+
+        字符串按 shell 规则拆分，带空格的文件名可以用引号括起来；引号不配对时整体作为一个路径。
+        """
+        if not isinstance(files, str):
+            return list(files)
+        try:
+            return shlex.split(files)
+        except ValueError:
+            return [files.strip()] if files.strip() else []
+
+    def bulk_add(self, paths):
+        """一次性把大量路径添加到暂存区"""
+        return self.run_pathspec_command(['git', 'add'], paths)
+
+    def bulk_unstage(self, paths):
+        """一次性撤销大量路径的暂存"""
+        return self.run_pathspec_command(['git', 'restore', '--staged'], paths)
+
+    def bulk_remove(self, paths, cached=False):
+        """一次性删除大量路径（cached=True 时只从暂存区删除）"""
+        command = ['git', 'rm', '-r', '-q'] + (['--cached'] if cached else [])
+        return self.run_pathspec_command(command, paths)
+
+    def add_files(self, files='.', optimize_images=None):
+        """添加文件到暂存区
+
+        optimize_images 为 None 时按 git config gitmanager.optimizeImages 决定是否优化暂存的图片。
+        """
+        report = self.bulk_add(self._split_paths(files) or ['.'])
+        text = self.format_pathspec_report(report, "添加到暂存区")
+        if optimize_images is None:
+            optimize_images = self.config_flag('gitmanager.optimizeImages')
+        if optimize_images:
+            text += '\n' + self.optimize_staged_images()
+        return text
+
+    def unstage_files(self, files='.'):
+        """撤销添加到暂存区的文件"""
+        # 所有文件通过一次 git restore 调用处理，不再每个文件启动一个进程
+        report = self.bulk_unstage(self._split_paths(files) or ['.'])
+        if not report['failed']:
+            return "已撤销暂存"
+        return self.format_pathspec_report(report, "撤销暂存")
+
+    def commit(self, message, optimize_images=None):
+        """提交更改，提交前按需优化暂存的图片（已优化过的图片直接命中缓存）"""
+        if optimize_images is None:
+            optimize_images = self.config_flag('gitmanager.optimizeImages')
+        if optimize_images:
+            print(self.optimize_staged_images())
+        return self.run_git_command(['git', 'commit', '-m', message])
+
+    # 图片优化缓存：{输入blob ID:最大尺寸: {'output': 输出blob ID, 'saved': 节省字节数}}
+    IMAGE_CACHE = 'image_cache.json'
+
+    def config_flag(self, key):
+        """读取布尔型的 git 配置，未设置时返回None"""
+        result = self.run_git_process(['git', 'config', '--type=bool', '--get', key])
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() == 'true'
+
+    def config_int(self, key):
+        """读取整数型的 git 配置（支持 k/m/g 后缀），未设置时返回None"""
+        result = self.run_git_process(['git', 'config', '--type=int', '--get', key])
+        if result.returncode != 0:
+            return None
+        try:
+            return int(result.stdout.strip())
+        except ValueError:
+            return None
+
+    def image_max_size(self):
+        """图片最长边的上限（像素），可通过 git config gitmanager.imageMaxSize 配置，需要 Pillow"""
+        return self.config_int('gitmanager.imageMaxSize') or None
+
+    def staged_images(self):
+        """暂存区中新增或修改的图片，返回 [(路径, blob ID, 文件模式)]"""
+        result = self.run_git_process(['git', 'diff', '--cached', '--raw', '--no-abbrev', '-z', '--no-renames',
+                                       '--diff-filter=AM'])
+        if result.returncode != 0:
+            return []
+        fields = result.stdout.split('\0')
+        images = []
+        for i in range(0, len(fields) - 1, 2):
+            _, mode, _, oid, _ = fields[i].lstrip(':').split(' ')
+            path = fields[i + 1]
+            if mode in ('100644', '100755') and ImageOptimizer.is_candidate(path):
+                images.append((path, oid, mode))
+        return images
+
+    def optimize_staged_images(self, jobs=None):
+        """优化暂存区中的图片：在进程池中无损压缩（可选缩小尺寸），写回工作区并重新暂存
+
+        结果按输入 blob ID 缓存，没有变化的图片不会被重新处理；
+        工作区中还有未暂存修改的图片会被跳过，以免覆盖这些修改。
+        """
+        images = self.staged_images()
+        if not images:
+            return "暂存区中没有需要优化的图片"
+        max_size = self.image_max_size()
+        cache = self.read_state(self.IMAGE_CACHE, {})
+        dirty = self.run_git_process(['git', 'diff', '--name-only', '-z', '--',
+                                      *[f':(top){path}' for path, _, _ in images]])
+        dirty = set((dirty.stdout or '').split('\0'))
+        root = self.worktree_root()
+        reader = self.object_reader()
+
+        rows = []
+        todo = []
+        for path, oid, mode in images:
+            entry = cache.get(f'{oid}:{max_size or 0}')
+            if path in dirty:
+                rows.append((path, None, None, "工作区有未暂存的修改，已跳过"))
+            elif entry is None:
+                todo.append((path, oid, mode))
+            elif entry['output'] == oid:
+                rows.append((path, None, None, "已是最优，命中缓存"))
+            else:
+                output = reader.read(entry['output'])
+                if output is None:
+                    todo.append((path, oid, mode))
+                else:
+                    rows.append((path, output[2], entry['saved'], "使用缓存结果"))
+
+        inputs = {}
+        for start in range(0, len(todo), 16):
+            chunk = todo[start:start + 16]
+            for (path, oid, mode), obj in zip(chunk, reader.read_many(oid for _, oid, _ in chunk)):
+                if obj is not None:
+                    inputs[path] = (oid, obj[2])
+        if inputs:
+            if len(inputs) > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                with ProcessPoolExecutor(max_workers=jobs or min(len(inputs), os.cpu_count() or 1)) as pool:
+                    futures = {path: pool.submit(ImageOptimizer.optimize, data, max_size)
+                               for path, (_, data) in inputs.items()}
+                    results = {path: future.result() for path, future in futures.items()}
+            else:
+                results = {path: ImageOptimizer.optimize(data, max_size) for path, (_, data) in inputs.items()}
+            for path, (optimized, note) in results.items():
+                oid, data = inputs[path]
+                key = f'{oid}:{max_size or 0}'
+                if optimized is None:
+                    cache[key] = {'output': oid, 'saved': 0}
+                    rows.append((path, None, None, note))
+                    continue
+                algorithm = 'sha1' if len(oid) == 40 else 'sha256'
+                output_oid = hashlib.new(algorithm, b'blob %d\0' % len(optimized) + optimized).hexdigest()
+                saved = len(data) - len(optimized)
+                cache[key] = {'output': output_oid, 'saved': saved}
+                # 优化后的图片再次暂存时直接识别为已优化
+                cache[f'{output_oid}:{max_size or 0}'] = {'output': output_oid, 'saved': 0}
+                rows.append((path, optimized, saved, note))
+
+        changed = []
+        for path, data, saved, note in rows:
+            if data is None:
+                continue
+            full_path = os.path.join(root, path)
+            temp_path = full_path + '.optimize-tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.chmod(temp_path, os.stat(full_path).st_mode)
+            os.replace(temp_path, full_path)
+            changed.append(path)
+        if changed:
+            # 路径相对于工作区根目录，用 :(top) 前缀避免受当前目录影响
+            report = self.bulk_add([f':(top){path}' for path in changed])
+            if report['failed']:
+                return self.format_pathspec_report(report, "重新暂存优化后的图片")
+        try:
+            self.write_state(self.IMAGE_CACHE, cache)
+        except OSError as e:
+            print(f"错误: 无法保存图片优化缓存: {e}")
+
+        total = sum(saved for _, data, saved, _ in rows if data is not None)
+        lines = [f"图片优化: 处理 {len(images)} 张，重新压缩 {len(inputs)} 张，更新 {len(changed)} 张，"
+                 f"共节省 {self.format_size(total)}"]
+        for path, data, saved, note in sorted(rows):
+            detail = f"节省 {self.format_size(saved)}" if data is not None else "未修改"
+            lines.append(f"  {path}: {detail}（{note}）")
+        if max_size and not self.pillow_available():
+            lines.append(f"提示: 设置了 gitmanager.imageMaxSize={max_size}，但未安装 Pillow，未缩小图片尺寸")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def pillow_available():
+        """是否安装了可选的 Pillow 库"""
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def create_branch(self, branch_name, use_worktree=None):
+        """创建新分支
+
+        use_worktree=True（或未指定且配置了 gitmanager.useWorktrees）时在工作树池中检出新分支，
+        当前目录的文件保持不变，返回说明；否则在当前目录中 git checkout -b。
+        """
+        if self.use_worktrees(use_worktree):
+            return self.open_worktree(branch_name, create=True)
+        return self.run_git_command(['git', 'checkout', '-b', branch_name])
+
+    def switch_branch(self, branch_name, use_worktree=None):
+        """切换分支，使用工作树池时改为切换到该分支的工作树目录（见 create_branch）"""
+        if self.use_worktrees(use_worktree):
+            return self.open_worktree(branch_name)
+        return self.run_git_command(['git', 'checkout', branch_name])
+
+    def use_worktrees(self, use_worktree=None):
+        """是否用工作树池切换分支，未指定时按 git config gitmanager.useWorktrees"""
+        if use_worktree is None:
+            return bool(self.config_flag('gitmanager.useWorktrees'))
+        return use_worktree
+
+    def worktree_pool(self):
+        """获取工作树池
+
+        池目录默认是主工作树旁边的 <仓库名>.worktrees，可通过 gitmanager.worktreeDir 修改；
+        数量上限 gitmanager.worktreeMax（默认4），总大小上限 gitmanager.worktreeMaxSize（默认2g）。
+        """
+        if self._worktree_pool is None:
+            pool = WorktreePool(self, None)
+            result = self.run_git_process(['git', 'config', '--type=path', '--get', 'gitmanager.worktreeDir'])
+            if result.returncode == 0 and result.stdout.strip():
+                pool.directory = os.path.abspath(result.stdout.strip())
+            else:
+                worktrees = pool.list_worktrees()
+                main = worktrees[0]['path'] if worktrees else self.worktree_root()
+                pool.directory = os.path.normpath(main) + '.worktrees'
+            pool.max_worktrees = max(self.config_int('gitmanager.worktreeMax') or pool.max_worktrees, 1)
+            pool.max_bytes = self.config_int('gitmanager.worktreeMaxSize') or pool.max_bytes
+            self._worktree_pool = pool
+        return self._worktree_pool
+
+    def open_worktree(self, branch_name, create=False, start_point='HEAD'):
+        """从工作树池获取分支的工作树，之后的操作都在该目录中进行，返回说明"""
+        start = time.perf_counter()
+        path, how = self.worktree_pool().acquire(branch_name, create, start_point, active=self.worktree_root())
+        if path is None:
+            return OperationResult(how, ok=False)
+        self.enter_worktree(path)
+        action = {'existing': '使用已有的工作树', 'recycled': '回收最久未用的工作树并增量切换',
+                  'created': '新建工作树'}[how]
+        return OperationResult(f"{action}: {path}（{time.perf_counter() - start:.2f} 秒）")
+
+    def enter_worktree(self, path):
+        """让之后的操作在指定的工作树中进行（对象库和状态目录是共享的）"""
+        path = os.path.normpath(os.path.abspath(path))
+        if path == self.worktree_root():
+            return
+        state_dir = self.state_dir()
+        # 常驻读取器和原生引擎按工作树解析 HEAD，需要重新打开
+        self.close()
+        self.repo_path = path
+        self._worktree_root = None
+        self._state_dir = state_dir
+
+    def resolve_worktree(self, target):
+        """按分支名或目录查找工作树，返回 {'path', 'head', 'branch'}，找不到时打印错误并返回None"""
+        info = self.worktree_pool().find(target)
+        if info is None:
+            print(f"错误: 找不到工作树 {target}")
+        return info
+
+    def list_branches(self):
+        """列出所有分支"""
+        return self.run_git_command(['git', 'branch'])
+
+    def pull(self):
+        """拉取远程更新"""
+        return self.run_git_command(['git', 'pull'])
+
+    def push(self, remote='origin', branch='', worktree=None):
+        """推送到远程仓库，未指定分支时推送当前分支（指定 worktree 时为该工作树检出的分支）"""
+        if worktree:
+            info = self.resolve_worktree(worktree)
+            if info is None:
+                return None
+            branch = branch or info['branch']
+            if not branch:
+                print(f"错误: 工作树 {info['path']} 没有检出分支")
+                return None
+            command = ['git', '-C', info['path'], 'push', remote, branch]
+        else:
+            branch = branch or self.current_branch()
+            if not branch:
+                print("错误: 无法获取当前分支")
+                return None
+            command = ['git', 'push', remote, branch]
+        result = self.run_git_command(command)
+        if result is not None:
+            # 远程分支已变化，下次需要重新查询
+            self.remember_remote_ref(remote, branch, None)
+        return result
+
+    # 这些错误通常是网络抖动造成的，值得退避后重试。不匹配笼统的 "unable to access"，
+    # 它也包括 401/403、地址错误等重试也不会成功的情况，只匹配其后具体的临时性原因
+    TRANSIENT_ERRORS = (
+        'timed out', 'timeout', 'could not resolve host', 'connection reset',
+        'connection was reset', 'early eof', 'rpc failed', 'remote end hung up',
+        'failed to connect', 'temporary failure', 'http 502', 'http 503', 'http 504',
+        'returned error: 429', 'returned error: 502', 'returned error: 503', 'returned error: 504',
+        'gnutls', 'ssl_read', 'broken pipe'
+    )
+
+    def is_transient_error(self, stderr):
+        """判断Git错误输出是否属于可重试的临时性网络故障"""
+        text = (stderr or '').lower()
+        return any(pattern in text for pattern in self.TRANSIENT_ERRORS)
+
+    def run_with_retry(self, command, retries=2, backoff=1.0):
+        """执行Git命令，遇到临时性故障时按指数退避重试，返回结果字典"""
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            result = self.run_git_process(command)
+            if result.returncode == 0 or attempts > retries or not self.is_transient_error(result.stderr):
+                break
+            time.sleep(backoff * (2 ** (attempts - 1)))
+        return {
+            'ok': result.returncode == 0,
+            'output': (result.stdout + result.stderr).strip(),
+            'attempts': attempts,
+            'elapsed': time.perf_counter() - start
+        }
+
+    def list_remote_names(self):
+        """获取所有远程仓库名称"""
+        output = self.run_git_command(['git', 'remote'])
+        return output.split() if output else []
+
+    def run_on_remotes(self, build_command, remotes=None, max_workers=4, retries=2, backoff=1.0):
+        """在线程池中并发地对多个远程仓库执行命令，返回 {远程名: 结果字典}"""
+        from concurrent.futures import ThreadPoolExecutor
+        remotes = remotes or self.list_remote_names()
+        if not remotes:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(remotes)))) as pool:
+            futures = {
+                remote: pool.submit(self.run_with_retry, build_command(remote), retries, backoff)
+                for remote in remotes
+            }
+            return {remote: future.result() for remote, future in futures.items()}
+
+    def push_remotes(self, remotes=None, branch='', max_workers=4, retries=2, backoff=1.0):
+        """并发推送当前分支（或指定分支）到多个远程仓库"""
+        if not branch:
+            branch_output = self.run_git_command(['git', 'branch', '--show-current'])
+            if not branch_output:
+                return {}
+            branch = branch_output.strip()
+        results = self.run_on_remotes(
+            lambda remote: ['git', 'push', remote, branch],
+            remotes, max_workers, retries, backoff)
+        for remote in results:
+            self.remember_remote_ref(remote, branch, None)
+        return results
+
+    def fetch_remotes(self, remotes=None, max_workers=4, retries=2, backoff=1.0):
+        """并发从多个远程仓库获取更新"""
+        # 并发 fetch 时不写 FETCH_HEAD，避免多个进程争用同一个文件（需要 git 2.29+）
+        extra = ['--no-write-fetch-head'] if self.git.at_least(2, 29) else []
+        return self.run_on_remotes(
+            lambda remote: ['git', 'fetch'] + extra + [remote],
+            remotes, max_workers, retries, backoff)
+
+    def format_remote_results(self, results, action):
+        """汇总多个远程仓库的执行结果"""
+        if not results:
+            return "没有可用的远程仓库"
+        lines = [f"\n=== {action}结果 ==="]
+        for remote, result in results.items():
+            mark = '✅' if result['ok'] else '❌'
+            retry_note = f"，重试 {result['attempts'] - 1} 次" if result['attempts'] > 1 else ''
+            lines.append(f"{mark} {remote}: 耗时 {result['elapsed']:.2f} 秒{retry_note}")
+            if not result['ok'] and result['output']:
+                lines.extend(f"    {line}" for line in result['output'].splitlines() if line.strip())
+        failed = sum(1 for result in results.values() if not result['ok'])
+        lines.append(f"成功: {len(results) - failed}，失败: {failed}")
+        return '\n'.join(lines)
+
+    REMOTE_REF_CACHE = 'remote_refs.json'
+    DEFAULT_REMOTE_REF_TTL = 60
+
+    def remote_ref_ttl(self):
+        """远程引用缓存的有效期（秒），可通过 git config gitmanager.remoteRefTTL 配置"""
+        if getattr(self, '_remote_ref_ttl', None) is None:
+            result = self.run_git_process(['git', 'config', '--get', 'gitmanager.remoteRefTTL'])
+            try:
+                self._remote_ref_ttl = max(0, int(result.stdout.strip()))
+            except ValueError:
+                self._remote_ref_ttl = self.DEFAULT_REMOTE_REF_TTL
+        return self._remote_ref_ttl
+
+    def remote_ref_cache(self):
+        """会话内共享、跨会话持久化的远程引用快照 {远程/分支: {'oid', 'time'}}"""
+        if getattr(self, '_remote_ref_cache', None) is None:
+            self._remote_ref_cache = self.read_state(self.REMOTE_REF_CACHE, {})
+        return self._remote_ref_cache
+
+    def remember_remote_ref(self, remote, branch, oid):
+        """记录远程分支的最新提交（oid 为 None 时删除快照）"""
+        cache = self.remote_ref_cache()
+        key = f'{remote}/{branch}'
+        if oid is None:
+            cache.pop(key, None)
+        else:
+            cache[key] = {'oid': oid, 'time': time.time()}
+        self.write_state(self.REMOTE_REF_CACHE, cache)
+
+    def advertised_ref(self, remote, branch, max_age=None):
+        """获取远程仓库通告的分支最新提交，缓存未过期时不访问网络
+
+        返回提交ID，远程没有该分支时返回空字符串，无法访问远程时返回None。
+        """
+        max_age = self.remote_ref_ttl() if max_age is None else max_age
+        entry = self.remote_ref_cache().get(f'{remote}/{branch}')
+        if entry and time.time() - entry['time'] < max_age:
+            return entry['oid']
+        # ls-remote 带上引用名时，协议 v2 只通告匹配的引用
+        result = self.run_git_process(['git', 'ls-remote', '--heads', remote, f'refs/heads/{branch}'])
+        if result.returncode != 0:
+            return None
+        oid = ''
+        for line in result.stdout.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1] == f'refs/heads/{branch}':
+                oid = parts[0]
+        self.remember_remote_ref(remote, branch, oid)
+        return oid
+
+    def tracking_ref(self, remote, branch):
+        """获取本地远程跟踪分支指向的提交，不存在时返回空字符串"""
+        ref = f'refs/remotes/{remote}/{branch}'
+        oid = self.run_native('resolve', ref)
+        if oid:
+            return oid
+        result = self.run_git_process(['git', 'rev-parse', '--verify', '-q', ref])
+        return result.stdout.strip() if result.returncode == 0 else ''
+
+    def ensure_remote_fresh(self, remote, branch):
+        """只有远程通告的分支最新提交与本地跟踪分支不一致时才执行 git fetch"""
+        advertised = self.advertised_ref(remote, branch)
+        if advertised is not None and advertised == self.tracking_ref(remote, branch):
+            return False
+        self.run_git_command(['git', 'fetch', remote])
+        return True
+
+    DEFAULT_LARGE_FILE_THRESHOLD = 10 * 1024 * 1024
 
-    def status(self):
-        """查看仓库状态"""
-        return self.run_git_command(['git', 'status'])
+    def large_file_threshold(self):
+        """大文件阈值（字节），可通过 git config gitmanager.largeFileThreshold 配置（支持 k/m/g 后缀）"""
+        result = self.run_git_process(['git', 'config', '--type=int', '--get', 'gitmanager.largeFileThreshold'])
+        try:
+            return int(result.stdout.strip())
+        except ValueError:
+            return self.DEFAULT_LARGE_FILE_THRESHOLD
 
-    def add_files(self, files='.'):
-        """添加文件到暂存区"""
-        return self.run_git_command(['git', 'add', files])
+    def scan_staged_objects(self, threshold=None):
+        """扫描暂存区中新增/修改的文件大小（只查询对象头，不读取内容），返回超过阈值的文件列表"""
+        threshold = self.large_file_threshold() if threshold is None else threshold
+        output = self.run_git_command(['git', 'diff', '--cached', '--raw', '-z', '--no-abbrev', '--no-renames'])
+        if not output:
+            return []
+        tokens = output.split('\0')
+        staged = []
+        for meta, path in zip(tokens[0::2], tokens[1::2]):
+            fields = meta.split()
+            if len(fields) == 5 and fields[4] != 'D':
+                staged.append((fields[3], path))
+        infos = self.object_reader().check_many(oid for oid, _ in staged)
+        return [{'path': path, 'oid': oid, 'size': info[2], 'disk_size': info[3]}
+                for (oid, path), info in zip(staged, infos)
+                if info and info[1] == 'blob' and info[2] >= threshold]
 
-    def unstage_files(self, files='.'):
-        """撤销添加到暂存区的文件"""
-        # 将files拆分成列表，确保每个文件名被单独处理
-        if files == '.':
-            # 如果是所有文件，直接使用'.'
-            return self.run_git_command(['git', 'restore', '--staged', '.'])
-        else:
-            # 对于多个文件，拆分并分别处理
-            file_list = files.split()
-            result = ""
-            for file in file_list:
-                # 为每个文件单独执行命令，避免命令行解析问题
-                output = self.run_git_command(['git', 'restore', '--staged', file])
-                if output:
-                    result += output + "\n"
-            return result if result else "已撤销暂存"
-
-    def commit(self, message):
-        """提交更改"""
-        return self.run_git_command(['git', 'commit', '-m', message])
+    def scan_unpushed_objects(self, remote='origin', threshold=None):
+        """扫描尚未推送到远程的提交中新增的文件，返回超过阈值的文件列表"""
+        threshold = self.large_file_threshold() if threshold is None else threshold
+        output = self.run_git_command(['git', 'rev-list', '--objects', 'HEAD', '--not', f'--remotes={remote}'])
+        if not output:
+            return []
+        objects = []
+        for line in output.splitlines():
+            oid, _, path = line.partition(' ')
+            if path:
+                objects.append((oid, path))
+        infos = self.object_reader().check_many(oid for oid, _ in objects)
+        return [{'path': path, 'oid': oid, 'size': info[2], 'disk_size': info[3]}
+                for (oid, path), info in zip(objects, infos)
+                if info and info[1] == 'blob' and info[2] >= threshold]
 
-    def create_branch(self, branch_name):
-        """创建新分支"""
-        return self.run_git_command(['git', 'checkout', '-b', branch_name])
+    def pending_commit_impact(self, remote='origin'):
+        """估算每个未推送提交对推送 pack 大小的贡献（不执行 fetch）"""
+        commits = [record.as_dict() for record in self.iter_commits(['HEAD', '--not', f'--remotes={remote}'])]
+        commits.reverse()
+        sizes = self.estimate_commit_sizes(commits, remote)
+        return [dict(commit, pack_bytes=size) for commit, size in zip(commits, sizes)]
 
-    def switch_branch(self, branch_name):
-        """切换分支"""
-        return self.run_git_command(['git', 'checkout', branch_name])
+    def large_asset_report(self, remote='origin', threshold=None, staged=True, unpushed=True):
+        """汇总暂存区和未推送提交中的大文件，以及每个未推送提交的 pack 大小"""
+        threshold = self.large_file_threshold() if threshold is None else threshold
+        lines = [f"大文件阈值: {self.format_size(threshold)}"]
+        flagged = []
+        if staged:
+            found = self.scan_staged_objects(threshold)
+            flagged += [dict(item, staged=True) for item in found]
+            lines.append(f"\n暂存区中的大文件: {len(found)} 个")
+            lines += [f"  ⚠️  {item['path']} ({self.format_size(item['size'])})" for item in found]
+        if unpushed:
+            found = self.scan_unpushed_objects(remote, threshold)
+            flagged += [dict(item, staged=False) for item in found]
+            lines.append(f"\n未推送提交中的大文件: {len(found)} 个")
+            lines += [f"  ⚠️  {item['path']} ({self.format_size(item['size'])})" for item in found]
+            impact = self.pending_commit_impact(remote)
+            if impact:
+                lines.append(f"\n未推送提交的预估推送大小（共 {self.format_size(sum(c['pack_bytes'] for c in impact))}）:")
+                lines += [f"  {c['hash']} {self.format_size(c['pack_bytes']):>10}  {c['message']}" for c in impact]
+        return flagged, '\n'.join(lines)
 
-    def list_branches(self):
-        """列出所有分支"""
-        return self.run_git_command(['git', 'branch'])
+    def worktree_root(self):
+        """工作区根目录（git 输出的路径都相对于它）"""
+        if getattr(self, '_worktree_root', None) is None:
+            output = self.run_git_command(['git', 'rev-parse', '--show-toplevel'])
+            self._worktree_root = output.strip() if output else (self.repo_path or os.getcwd())
+        return self._worktree_root
 
-    def pull(self):
-        """拉取远程更新"""
-        return self.run_git_command(['git', 'pull'])
+    def lfs_available(self):
+        """是否安装了 git-lfs 客户端"""
+        return shutil.which('git-lfs') is not None
 
-    def push(self, remote='origin', branch='master'):
-        """推送到远程仓库"""
-        return self.run_git_command(['git', 'push', remote, branch])
+    def convert_to_pointers(self, paths):
+        """用 git-lfs 接管大文件：写入 .gitattributes 跟踪规则并重新暂存，暂存区中保存为指针文件
+
+        paths 为相对工作区根目录的路径（与 git 输出一致）。工作区里的文件内容保持不变，
+        推送时由 git-lfs 上传真实内容。没有安装 git-lfs 时不做转换，返回None。
+        """
+        if not self.lfs_available():
+            print("错误: 未安装 git-lfs，无法转为指针存储（请先安装 git-lfs 后执行 git lfs install）")
+            return None
+        if not paths:
+            return []
+        git = ['git', '-C', self.worktree_root()]
+        if self.run_git_command(git + ['lfs', 'install', '--local']) is None:
+            return None
+        # --filename 按字面路径跟踪，避免文件名中的 * [ 等字符被当作通配符
+        if self.run_git_command(git + ['lfs', 'track', '--filename'] + list(paths)) is None:
+            return None
+        report = self.run_pathspec_command(git + ['add'], ['.gitattributes'] + list(paths))
+        return [path for path in paths if path in report['ok']]
+
+    def confirm_large_assets(self, remote='origin', staged=True, unpushed=False):
+        """提交或推送前检查大文件；发现大文件时询问处理方式，返回是否继续"""
+        flagged, report = self.large_asset_report(remote, staged=staged, unpushed=unpushed)
+        if not flagged:
+            return True
+        print(report)
+        print("\n发现超过阈值的大文件，可能导致推送缓慢或失败。")
+        if staged:
+            choice = input("继续(c) / 交给 git-lfs 管理后继续(p) / 取消(N): ").strip().lower()
+            if choice == 'p':
+                root = self.worktree_root()
+                paths = [item['path'] for item in flagged if item['staged']
+                         and os.path.exists(os.path.join(root, item['path']))]
+                converted = self.convert_to_pointers(paths)
+                if converted is None:
+                    return False
+                print(f"已交给 git-lfs 管理: {len(converted)} 个")
+                return True
+            return choice == 'c'
+        return input("仍然继续推送吗？(y/N): ").strip().lower() == 'y'
 
     def get_unpushed_commits(self, remote='origin', branch=''):
         """获取未推送到远程的提交列表"""
@@ -185,31 +2711,18 @@ class GitManager:
             else:
                 return None, "无法获取当前分支"
         
-        # 先尝试获取远程分支信息
-        fetch_result = self.run_git_command(['git', 'fetch', remote])
+        # 远程分支没有变化时跳过 fetch
+        self.ensure_remote_fresh(remote, branch)
         
-        # 获取未推送的提交
-        commits_output = self.run_git_command(['git', 'log', '--oneline', f'{remote}/{branch}..HEAD'])
-        
-        if not commits_output or not commits_output.strip():
+        # 获取未推送的提交（从新到旧），反转后从旧到新排列（推送顺序）
+        commits = [record.as_dict() for record in self.iter_commits(f'{remote}/{branch}..HEAD')]
+        if not commits:
             return [], "没有未推送的提交"
-        
-        # 解析提交列表（从新到旧）
-        commits = []
-        for line in commits_output.strip().split('\n'):
-            if line.strip():
-                parts = line.strip().split(' ', 1)
-                if len(parts) >= 2:
-                    commit_hash = parts[0]
-                    commit_message = parts[1]
-                    commits.append({'hash': commit_hash, 'message': commit_message})
-        
-        # 反转列表，使其从旧到新排列（推送顺序）
         commits.reverse()
         return commits, None
 
     def push_batch(self, commits_batch, remote='origin', branch=''):
-        """推送一批提交到远程仓库"""
+        """推送一批提交到远程仓库，失败时返回 ok=False 的错误输出"""
         if not branch:
             branch_output = self.run_git_command(['git', 'branch', '--show-current'])
             if branch_output:
@@ -217,69 +2730,207 @@ class GitManager:
             else:
                 return "无法获取当前分支"
         
-        # 推送到指定的提交
-        last_commit = commits_batch[-1]['hash']
-        result = self.run_git_command(['git', 'push', remote, f'{last_commit}:{branch}'])
-        return result
+        # 推送到指定的提交（优先使用完整哈希）
+        last_commit = commits_batch[-1].get('oid') or commits_batch[-1]['hash']
+        result = self.run_git_process(['git', 'push', remote, f'{last_commit}:{branch}'])
+        if result.returncode != 0:
+            print(f"错误: {result.stderr}")
+            return OperationResult(result.stderr.strip(), ok=False)
+        self.remember_remote_ref(remote, branch, last_commit)
+        return result.stdout
+
+    def estimate_commit_sizes(self, commits, remote='origin'):
+        """预估每个提交在推送 pack 中新增的字节数
+
+        用 rev-list --objects 找出每个提交相对上一个提交和远程已有内容新增的对象，
+        再通过常驻的 cat-file --batch-check 查询对象在磁盘上的压缩大小（不读取内容）。
+        """
+        sizes = []
+        previous = None
+        for commit in commits:
+            oid = commit.get('oid') or commit['hash']
+            command = ['git', 'rev-list', '--objects', '--no-object-names', oid, '--not', f'--remotes={remote}']
+            if previous:
+                command.append(previous)
+            output = self.run_git_command(command) or ''
+            infos = self.object_reader().check_many(output.split())
+            sizes.append(sum(info[3] for info in infos if info))
+            previous = oid
+        return sizes
+
+    BATCH_JOURNAL = 'batch_push_journal.json'
+
+    def current_branch(self):
+        """获取当前分支名，失败时返回None"""
+        branch_output = self.run_git_command(['git', 'branch', '--show-current'])
+        return branch_output.strip() if branch_output and branch_output.strip() else None
+
+    def load_batch_journal(self, remote, branch):
+        """读取指定远程分支未完成的分批次推送记录"""
+        journal = self.read_state(self.BATCH_JOURNAL, {})
+        return journal.get('entries', {}).get(f'{remote}/{branch}')
+
+    def save_batch_journal(self, remote, branch, entry):
+        """保存（entry 为 None 时删除）指定远程分支的分批次推送记录"""
+        journal = self.read_state(self.BATCH_JOURNAL, {})
+        entries = journal.setdefault('entries', {})
+        key = f'{remote}/{branch}'
+        if entry is None:
+            entries.pop(key, None)
+        else:
+            entry['updated'] = time.time()
+            entries[key] = entry
+        self.write_state(self.BATCH_JOURNAL, journal)
+
+    def clear_batch_journal(self, remote=None, branch=None):
+        """清除分批次推送的断点记录，不指定远程和分支时全部清除"""
+        journal = self.read_state(self.BATCH_JOURNAL, {})
+        entries = journal.get('entries', {})
+        if remote is None and branch is None:
+            removed = len(entries)
+            entries.clear()
+        else:
+            keys = [key for key in entries
+                    if (remote is None or key.split('/', 1)[0] == remote)
+                    and (branch is None or key.split('/', 1)[1] == branch)]
+            removed = len(keys)
+            for key in keys:
+                del entries[key]
+        self.write_state(self.BATCH_JOURNAL, {'entries': entries})
+        return f"已清除 {removed} 条分批次推送断点记录"
+
+    def batch_push(self, remote='origin', branch='', batch_size=1, adaptive=False,
+                   interactive=True, target_seconds=20.0, resume=True):
+        """分批次推送到远程仓库
 
-    def batch_push(self, remote='origin', branch='', batch_size=1):
-        """分批次推送到远程仓库"""
+        adaptive=True 时根据提交大小和实测吞吐量自动决定每批的提交数，
+        interactive=False 时推送失败不再询问是否继续。
+        每批成功后都会把进度写入 .git/git_manager 下的断点记录，
+        中断后再次执行会从下一批继续，不再重新 fetch 和列出提交。
+        """
         print(f"\n开始分批次推送到 {remote}/{branch or '当前分支'}...")
-        print(f"批次大小: {batch_size} 个提交")
-        
-        # 获取未推送的提交
-        commits, error = self.get_unpushed_commits(remote, branch)
-        if error:
-            return error
+        if adaptive:
+            print(f"自适应批次：每批目标耗时约 {target_seconds:.0f} 秒")
+        else:
+            print(f"批次大小: {batch_size} 个提交")
+
+        branch = branch or self.current_branch()
+        if not branch:
+            return OperationResult("无法获取当前分支", ok=False)
+        head = self.resolve_commit('HEAD')
+
+        commits = None
+        entry = self.load_batch_journal(remote, branch) if resume else None
+        if entry and entry.get('head') == head and entry.get('acked_index', -1) < len(entry['plan']) - 1:
+            remaining = entry['plan'][entry['acked_index'] + 1:]
+            print(f"\n发现未完成的分批次推送（已确认 {entry['acked_index'] + 1}/{len(entry['plan'])} 个提交）")
+            if not interactive or input("是否从断点继续？(Y/n): ").strip().lower() != 'n':
+                commits = remaining
+        if commits is None:
+            # 获取未推送的提交
+            commits, error = self.get_unpushed_commits(remote, branch)
+            if error:
+                self.save_batch_journal(remote, branch, None)
+                # commits 为空列表表示没有未推送的提交，不算失败
+                return OperationResult(error, ok=commits is not None)
+            entry = {'head': head, 'plan': commits, 'acked': None, 'acked_index': -1, 'batches': []}
+            self.save_batch_journal(remote, branch, entry)
+        offset = entry['acked_index'] + 1
         
         if not commits:
-            return "没有需要推送的提交"
+            return OperationResult("没有需要推送的提交")
         
         print(f"\n发现 {len(commits)} 个未推送的提交:")
         for i, commit in enumerate(commits, 1):
             print(f"{i}. {commit['hash']} - {commit['message']}")
+
+        scheduler = None
+        if adaptive:
+            print("\n正在预估每个提交的推送大小...")
+            scheduler = AdaptiveBatchScheduler(self.estimate_commit_sizes(commits, remote), target_seconds)
+            print(f"预估总大小: {self.format_size(sum(scheduler.sizes))}")
         
         # 分批处理
-        total_batches = (len(commits) + batch_size - 1) // batch_size
+        total_batches = None if adaptive else (len(commits) + batch_size - 1) // batch_size
         successful_pushes = 0
         failed_pushes = []
+        pushed_bytes = 0
+        push_seconds = 0.0
+        start_idx = 0
+        batch_num = 0
         
-        for batch_num in range(total_batches):
-            start_idx = batch_num * batch_size
-            end_idx = min(start_idx + batch_size, len(commits))
+        while start_idx < len(commits):
+            end_idx = scheduler.next_end(start_idx) if adaptive else min(start_idx + batch_size, len(commits))
             current_batch = commits[start_idx:end_idx]
+            batch_label = f"{batch_num + 1}/{total_batches}" if total_batches else f"{batch_num + 1}"
             
-            print(f"\n--- 推送第 {batch_num + 1}/{total_batches} 批 ---")
+            print(f"\n--- 推送第 {batch_label} 批 ---")
+            if adaptive:
+                print(f"  {len(current_batch)} 个提交，预估 {self.format_size(scheduler.batch_bytes(start_idx, end_idx))}")
             for commit in current_batch:
                 print(f"  {commit['hash']} - {commit['message']}")
             
+            batch_start = time.perf_counter()
             try:
                 result = self.push_batch(current_batch, remote, branch)
-                if result is not None and "fatal:" not in str(result).lower() and "error:" not in str(result).lower():
-                    print(f"✅ 第 {batch_num + 1} 批推送成功")
-                    successful_pushes += len(current_batch)
-                else:
-                    print(f"❌ 第 {batch_num + 1} 批推送失败: {result}")
-                    failed_pushes.extend(current_batch)
-                    
-                    # 询问是否继续
-                    if batch_num < total_batches - 1:
-                        continue_choice = input("\n推送失败，是否继续下一批？(y/N): ").strip().lower()
-                        if continue_choice != 'y':
-                            break
+                ok = (result is not None and getattr(result, 'ok', True)
+                      and "fatal:" not in str(result).lower() and "error:" not in str(result).lower())
             except Exception as e:
-                print(f"❌ 第 {batch_num + 1} 批推送出现异常: {str(e)}")
+                result = f"异常: {str(e)}"
+                ok = False
+            elapsed = time.perf_counter() - batch_start
+            # 只有网络类的临时性故障才值得缩小批次重试
+            transient = not ok and result is not None and self.is_transient_error(str(result))
+
+            if adaptive:
+                size = scheduler.batch_bytes(start_idx, end_idx)
+                scheduler.record(size, elapsed, ok, transient)
+                if ok:
+                    pushed_bytes += size
+                    push_seconds += elapsed
+                    print(f"  耗时 {elapsed:.2f} 秒，下一批预算 {self.format_size(scheduler.budget)}")
+
+            entry['batches'].append({'commits': len(current_batch), 'elapsed': round(elapsed, 3), 'ok': ok})
+            if ok:
+                entry['acked'] = current_batch[-1]['oid']
+                entry['acked_index'] = offset + end_idx - 1
+            self.save_batch_journal(remote, branch, entry)
+
+            if ok:
+                print(f"✅ 第 {batch_num + 1} 批推送成功")
+                successful_pushes += len(current_batch)
+            else:
+                print(f"❌ 第 {batch_num + 1} 批推送失败: {result}")
+                if adaptive and transient and len(current_batch) > 1:
+                    # 预算已减半（已是下限时改为单个提交），用更小的批次重试同一段提交；
+                    # 单个提交的批次失败后按普通失败处理，不会无限重试。
+                    # 非快进、认证失败、钩子拒绝等与批次大小无关，直接按普通失败处理
+                    print("缩小批次后重试")
+                    batch_num += 1
+                    continue
                 failed_pushes.extend(current_batch)
                 
                 # 询问是否继续
-                if batch_num < total_batches - 1:
-                    continue_choice = input("\n推送出现异常，是否继续下一批？(y/N): ").strip().lower()
+                if end_idx < len(commits):
+                    if not interactive:
+                        break
+                    continue_choice = input("\n推送失败，是否继续下一批？(y/N): ").strip().lower()
                     if continue_choice != 'y':
                         break
+
+            start_idx = end_idx
+            batch_num += 1
         
+        if entry['acked_index'] >= len(entry['plan']) - 1:
+            # 全部推送完成，清除断点记录
+            self.save_batch_journal(remote, branch, None)
+
         # 总结推送结果
         print(f"\n=== 分批次推送完成 ===")
         print(f"成功推送: {successful_pushes} 个提交")
+        if adaptive and push_seconds > 0:
+            print(f"推送数据: {self.format_size(pushed_bytes)}，耗时 {push_seconds:.2f} 秒，"
+                  f"平均吞吐量 {self.format_size(pushed_bytes / push_seconds)}/秒")
         if failed_pushes:
             print(f"失败推送: {len(failed_pushes)} 个提交")
             print("失败的提交:")
@@ -288,111 +2939,1087 @@ class GitManager:
         else:
             print("🎉 所有提交都已成功推送！")
         
-        return f"分批次推送完成，成功: {successful_pushes}，失败: {len(failed_pushes)}"
+        return OperationResult(f"分批次推送完成，成功: {successful_pushes}，失败: {len(failed_pushes)}",
+                               ok=not failed_pushes)
+
+    def undo_last_push(self, remote='origin', branch=''):
+        """撤销上一次推送到远程仓库
+        注意：这是一个危险操作，会重写远程历史
+        """
+        # 如果未指定分支，获取当前分支
+        if not branch:
+            branch_output = self.run_git_command(['git', 'branch', '--show-current'])
+            if branch_output:
+                branch = branch_output.strip()
+            else:
+                return "无法获取当前分支"
+                
+        # 获取当前分支最新提交的前一个提交
+        commit_output = self.run_git_command(['git', 'rev-parse', 'HEAD~1'])
+        if not commit_output:
+            return "无法获取上一个提交，可能只有一个提交或仓库为空"
+            
+        previous_commit = commit_output.strip()
+        
+        # 使用force-with-lease进行强制推送，这比纯force更安全
+        result = self.run_git_command([
+            'git', 'push', '--force-with-lease', remote, f'{previous_commit}:{branch}'
+        ])
+        self.remember_remote_ref(remote, branch, None)
+        
+        return result or f"已成功撤销最近一次推送，远程分支 {remote}/{branch} 现在指向 {previous_commit[:7]}"
+
+    # 字段之间用 NUL 分隔，每条记录以 0x1e 开头，一次遍历即可解析
+    LOG_FIELDS = '%H%x00%h%x00%P%x00%an%x00%ae%x00%at%x00%ai%x00%ct%x00%s%x00'
+
+    def iter_commits(self, revision='HEAD', max_count=None, numstat=False, body=False):
+        """逐条产出 CommitRecord，只调用一次 git log（或由原生引擎直接读取）
+
+        revision 可以是单个版本（范围）字符串，也可以是版本参数列表。
+        numstat=True 时附带每个文件的增删行数（含重命名），body=True 时附带提交说明正文。
+        """
+        if max_count is not None and not numstat and isinstance(revision, str) and '..' not in revision:
+            records = self.run_native('records', revision, max_count)
+            if records is not None:
+                yield from records
+                return
+
+        fields = self.LOG_FIELDS + ('%b%x00' if body else '')
+        command = ['git', 'log', '-z', f'--format=%x1e{fields}']
+        if max_count is not None:
+            command.append(f'-{max_count}')
+        if numstat:
+            command += ['--numstat', '-M']
+        command += ([revision] if isinstance(revision, str) else list(revision)) + ['--']
+
+        pending = ''
+        for chunk in self.stream_git_command(command, lines=False):
+            pending += chunk
+            *complete, pending = pending.split('\x1e')
+            for raw in complete:
+                if raw:
+                    yield self._parse_commit_record(raw, numstat, body)
+        if pending:
+            yield self._parse_commit_record(pending, numstat, body)
+
+    @staticmethod
+    def _parse_commit_record(raw, numstat, body):
+        """解析一条 NUL 分隔的提交记录"""
+        count = 10 if body else 9
+        parts = raw.split('\0', count)
+        (oid, short, parents, author, email, author_time, author_iso, commit_time, subject) = parts[:9]
+        message_body = parts[9].strip('\n') if body else None
+        files = None
+        if numstat:
+            files = []
+            tokens = parts[count].lstrip('\0\n').split('\0') if len(parts) > count else []
+            i = 0
+            while i < len(tokens):
+                token = tokens[i].lstrip('\n')
+                i += 1
+                if not token:
+                    continue
+                added, deleted, path = token.split('\t', 2)
+                old_path = None
+                if not path:
+                    # 重命名：路径为空，后面依次是原路径和新路径
+                    old_path, path = tokens[i], tokens[i + 1]
+                    i += 2
+                files.append((None if added == '-' else int(added),
+                              None if deleted == '-' else int(deleted), path, old_path))
+            files = tuple(files)
+        return CommitRecord(oid, short, tuple(parents.split()), author, email,
+                            int(author_time or 0), int(commit_time or 0), subject,
+                            body=message_body, files=files, author_tz=author_iso.rsplit(' ', 1)[-1] or '+0000')
+
+    # 会改变 log/show/diff 输出的配置段；core 段中只关心下面几个键
+    OUTPUT_CONFIG_SECTIONS = ('log', 'format', 'pretty', 'diff', 'color', 'notes', 'i18n', 'mailmap', 'core')
+    OUTPUT_CONFIG_CORE_KEYS = ('abbrev', 'quotepath', 'notesref')
+    CONFIG_SECTION = re.compile(r'^\[\s*([\w.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\](.*)$')
+
+    def config_files(self):
+        """按 git 的读取顺序列出系统、全局和仓库配置文件（不一定存在），不启动 git"""
+        files = []
+        if not os.environ.get('GIT_CONFIG_NOSYSTEM'):
+            if os.environ.get('GIT_CONFIG_SYSTEM'):
+                files.append(os.environ['GIT_CONFIG_SYSTEM'])
+            else:
+                files.append('/etc/gitconfig')
+                if self.git:
+                    prefix = os.path.dirname(os.path.dirname(self.git.path))
+                    files.append(os.path.join(prefix, 'etc', 'gitconfig'))
+        if os.environ.get('GIT_CONFIG_GLOBAL'):
+            files.append(os.environ['GIT_CONFIG_GLOBAL'])
+        else:
+            xdg = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+            files += [os.path.join(xdg, 'git', 'config'), os.path.expanduser('~/.gitconfig')]
+        state_dir = self.state_dir()
+        if state_dir:
+            files.append(os.path.join(os.path.dirname(state_dir), 'config'))
+        store = self.native_store()
+        if store is not None:
+            files.append(os.path.join(store.git_dir, 'config.worktree'))
+        return files
+
+    def _read_output_config(self, path, entries, read, depth=0):
+        """收集配置文件中影响输出格式的条目，并跟随 include.path / includeIf.*.path"""
+        read.append(path)
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        section = subsection = None
+        for line in lines:
+            line = line.strip()
+            match = self.CONFIG_SECTION.match(line)
+            if match:
+                section, subsection, line = match.group(1).lower(), match.group(2), match.group(3).strip()
+            if not line or line[0] in '#;' or section is None:
+                continue
+            key, _, value = line.partition('=')
+            key, value = key.strip().lower(), value.strip()
+            if section in ('include', 'includeif') and key == 'path' and depth < 10:
+                include = os.path.expanduser(value.strip('"'))
+                self._read_output_config(os.path.join(os.path.dirname(path), include), entries, read, depth + 1)
+            elif section.split('.')[0] in self.OUTPUT_CONFIG_SECTIONS and \
+                    (section != 'core' or key in self.OUTPUT_CONFIG_CORE_KEYS):
+                entries.append((section, subsection, key, value))
+
+    def output_config_entries(self):
+        """影响输出格式的配置条目（配置文件和 GIT_CONFIG_* 环境变量），配置文件修改后才重新读取"""
+        def stamp(paths):
+            result = []
+            for path in dict.fromkeys(paths):
+                try:
+                    info = os.stat(path)
+                    result.append((path, info.st_mtime_ns, info.st_size))
+                except OSError:
+                    result.append((path, None, None))
+            return result
+
+        files = self.config_files()
+        cached = getattr(self, '_output_config', None)
+        if cached is not None and cached[0] == stamp(files + cached[2]):
+            return cached[1]
+        entries, read = [], []
+        for path in files:
+            self._read_output_config(path, entries, read)
+        if os.environ.get('GIT_CONFIG_PARAMETERS'):
+            entries.append(('env', None, 'parameters', os.environ['GIT_CONFIG_PARAMETERS']))
+        try:
+            count = int(os.environ.get('GIT_CONFIG_COUNT') or 0)
+        except ValueError:
+            count = 0
+        for i in range(count):
+            entries.append(('env', None, os.environ.get(f'GIT_CONFIG_KEY_{i}', '').lower(),
+                            os.environ.get(f'GIT_CONFIG_VALUE_{i}', '')))
+        # 包含进来的文件被修改时同样需要重新读取
+        included = [path for path in read if path not in files]
+        self._output_config = (stamp(files + included), entries, included)
+        return entries
+
+    def output_config_digest(self):
+        """影响输出格式的配置的摘要，作为结果缓存命名空间的一部分"""
+        return hashlib.sha1(repr(self.output_config_entries()).encode('utf-8')).hexdigest()[:12]
+
+    def result_cache(self):
+        """获取查询结果缓存（内存 + .git/git_manager/results）
+
+        键中包含 git 版本和影响输出格式的配置（log.date、diff.*、color.* 等）的摘要，
+        配置修改后旧结果不再命中。
+        """
+        namespace = '.'.join(str(part) for part in self.git.version) + ':' + self.output_config_digest()
+        if self._result_cache is None:
+            state_dir = self.state_dir()
+            self._result_cache = ResultCache(
+                os.path.join(state_dir, 'results') if state_dir else None, namespace=namespace)
+        self._result_cache.namespace = namespace
+        return self._result_cache
+
+    def cached_stream(self, key, produce, ref=None):
+        """带结果缓存的流式输出
+
+        命中时直接逐行产出缓存内容，不启动 git；未命中时调用 produce() 得到生成器，
+        边产出边收集，生成器返回成功时写入缓存。生成器的返回值为是否成功。
+        """
+        cache = self.result_cache()
+        data = cache.get(key)
+        if data is not None:
+            yield from data.decode('utf-8').splitlines(keepends=True)
+            return True
+        chunks = []
+        stream = produce()
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                ok = stop.value
+                break
+            chunks.append(chunk)
+            yield chunk
+        if ok:
+            cache.put(key, ''.join(chunks).encode('utf-8'), ref)
+        return ok
+
+    def head_commit(self):
+        """HEAD 指向的完整提交ID，并让依赖旧 HEAD 的缓存结果失效；没有提交时返回None"""
+        oid = self.run_native('resolve', 'HEAD')
+        if oid is None:
+            try:
+                info = self.object_reader().check('HEAD^{commit}')
+            except (OSError, ValueError, EOFError):
+                info = None
+            oid = info[0] if info else None
+        if oid is not None:
+            self.result_cache().observe_ref('HEAD', oid)
+        return oid
+
+    def log(self, num_entries=5, stream=False, worktree=None):
+        """查看提交历史，stream=True 时返回逐行产出的生成器，worktree 为分支名或目录时查看该工作树的历史"""
+        if worktree:
+            info = self.resolve_worktree(worktree)
+            if info is None or not info['head']:
+                return None
+            head = info['head']
+        else:
+            head = self.head_commit()
+        if head is None:
+            # 还没有提交时交给 git 报告错误
+            command = ['git', 'log', f'-{num_entries}', '--oneline']
+            return self.stream_git_command(command) if stream else self.run_git_command(command)
+
+        def produce():
+            for record in self.iter_commits(head, num_entries):
+                yield record.oneline() + '\n'
+            return True
+        # 其他工作树的 HEAD 不是当前的 HEAD，按提交ID缓存即可，不登记引用
+        ref = None if worktree else ('HEAD', head)
+        lines = self.cached_stream(('log', head, num_entries), produce, ref=ref)
+        if stream:
+            return lines
+        return ''.join(lines)
+
+    def log_detailed(self, num_entries=5, stream=False):
+        """查看详细提交历史（git log --stat），stream=True 时返回逐行产出的生成器
+
+        统计图的宽度和缩放、日期格式都由 git 自己决定，结果按 HEAD 的提交ID缓存。
+        """
+        head = self.head_commit()
+        command = ['git', 'log', f'-{num_entries}', '--stat']
+        if head is None:
+            return self.stream_git_command(command) if stream else self.run_git_command(command)
+        entries = self.cached_stream(('log_stat', head, num_entries),
+                                     lambda: self.stream_git_command(command + [head]), ref=('HEAD', head))
+        if stream:
+            return entries
+        return ''.join(entries)
+
+    def resolve_commit(self, commit_hash):
+        """解析提交，返回完整的提交ID，无效时返回None
+
+        优先用原生引擎直接读取对象库，否则通过常驻的 cat-file 读取器解析。
+        """
+        oid = self.run_native('resolve', commit_hash)
+        commit = self.run_native('read_commit', oid) if oid else None
+        if commit is not None:
+            return commit['oid']
+        try:
+            info = self.object_reader().check(f'{commit_hash}^{{commit}}')
+        except (OSError, ValueError, EOFError) as e:
+            print(f"错误: {e}")
+            return None
+        return info[0] if info else None
+
+    def native_show_header(self, oid):
+        """用原生引擎生成 git show 的提交头部，返回 (文本, 是否为合并提交)
+
+        配置了影响输出的选项（彩色输出只有 always 才算）、存在注释、.mailmap 或无法原生读取时返回None，
+        由 git show 完整输出。
+        """
+        store = self.native_store()
+        if store is None or os.environ.get('GIT_NOTES_REF') or os.environ.get('GIT_NOTES_DISPLAY_REF'):
+            return None
+        for section, _, _, value in self.output_config_entries():
+            if not section.startswith('color') or value.lower() == 'always':
+                return None
+        if os.path.exists(os.path.join(store.worktree or '', '.mailmap')) or \
+                self.run_native('resolve', 'refs/notes/commits'):
+            return None
+        return self.run_native('show_header', oid)
+
+    def _show_lines(self, oid, header, merge):
+        """逐行产出 git show 的输出：原生生成的头部加上 git diff-tree 给出的差异"""
+        yield from header.splitlines(keepends=True)
+        diff = self.stream_git_command(['git', 'diff-tree', '-p', '--cc', '--root', '-M', '--no-commit-id', oid])
+        # git show 在合并提交后总会输出空行，普通提交只在有差异时才输出
+        separated = merge
+        if merge:
+            yield '\n'
+        while True:
+            try:
+                line = next(diff)
+            except StopIteration as stop:
+                return bool(stop.value)
+            if not separated:
+                separated = True
+                yield '\n'
+            yield line
+
+    def show_commit(self, commit_hash, stream=False):
+        """查看特定提交的详细信息，stream=True 时返回逐行产出的生成器
+
+        解析提交时已经读到了提交对象，能原生生成头部时只需 git diff-tree 输出差异，
+        否则由 git show 输出全部内容。
+        """
+        # 先校验提交是否存在，无效哈希不必启动任何 git 进程
+        oid = self.resolve_commit(commit_hash)
+        if not oid:
+            print(f"错误: 找不到提交 {commit_hash}")
+            return None
+        # 用的是引用名（分支、标签）时，输出可能包含标签对象，因此名字也作为键的一部分
+        name = '' if oid.startswith(commit_hash.lower()) else commit_hash
+        key = ('show', oid, name)
+        ref = (name, oid) if name else None
+        header = None if name else self.native_show_header(oid)
+        if header is not None:
+            stream_lines = self.cached_stream(key, lambda: self._show_lines(oid, *header), ref)
+            if stream:
+                return stream_lines
+            chunks = []
+            while True:
+                try:
+                    chunks.append(next(stream_lines))
+                except StopIteration as stop:
+                    return ''.join(chunks) if stop.value else None
+        command = ['git', 'show', commit_hash]
+        if stream:
+            return self.cached_stream(key, lambda: self.stream_git_command(command), ref)
+        cache = self.result_cache()
+        data = cache.get(key)
+        if data is not None:
+            return data.decode('utf-8')
+        output = self.run_git_command(command)
+        if output is not None:
+            cache.put(key, output.encode('utf-8'), ref)
+        return output
+
+    def export_commit_to_file(self, commit_hash, filename, patch_series=False):
+        """导出特定提交的详细信息到文件
+
+        commit_hash 也可以是 A..B 形式的提交范围；patch_series=True 时导出
+        format-patch 补丁系列（mbox 格式，可用 git am 应用）。
+        文件以二进制方式打开，git 的标准输出直接写入文件描述符，
+        不经过 Python 解码和编码，二进制差异使用 --binary 完整导出。
+        """
+        if patch_series:
+            command = ['git', 'format-patch', '--stdout', '--binary']
+            command += [commit_hash] if '..' in commit_hash else ['-1', commit_hash]
+        else:
+            command = ['git', 'show', '--binary', commit_hash]
+
+        # 范围的两端或单个提交都解析为完整ID后才能作为缓存键
+        ends = commit_hash.split('..', 1) if '..' in commit_hash and '...' not in commit_hash else [commit_hash]
+        oids = [self.resolve_commit(end) for end in ends if end]
+        key = None
+        if len(oids) == len(ends) and all(oids) and (len(ends) == 1 or patch_series):
+            names = tuple(end for end, oid in zip(ends, oids) if not oid.startswith(end.lower()))
+            key = ('export', patch_series, *oids, names)
+        cache = self.result_cache()
+
+        try:
+            start = time.perf_counter()
+            cached = cache.get(key) if key else None
+            if cached is not None:
+                with open(filename, 'wb') as f:
+                    f.write(cached)
+                elapsed = time.perf_counter() - start
+                return OperationResult(f"提交 {commit_hash} 的详细信息已成功导出到文件: {filename}\n"
+                                       f"共 {self.format_size(len(cached))}，耗时 {elapsed:.2f} 秒（来自缓存）")
+            with open(filename, 'wb') as f:
+                context = self.tracer.begin(command, self.git_env())
+                result = subprocess.run(
+                    command,
+                    stdout=f,
+                    stderr=subprocess.PIPE,
+                    env=context['env'],
+                    cwd=self.repo_path
+                )
+                size = os.fstat(f.fileno()).st_size
+                self.tracer.end(context, result.returncode, 0, size + len(result.stderr or b''))
+            elapsed = time.perf_counter() - start
+
+            if result.returncode == 0:
+                if key and size <= cache.max_entry_bytes:
+                    with open(filename, 'rb') as f:
+                        cache.put(key, f.read())
+                rate = size / elapsed if elapsed > 0 else 0
+                return OperationResult(f"提交 {commit_hash} 的详细信息已成功导出到文件: {filename}\n"
+                                       f"共 {self.format_size(size)}，耗时 {elapsed:.2f} 秒，速度 {self.format_size(rate)}/秒")
+            else:
+                error_msg = result.stderr.decode('utf-8', errors='replace') if result.stderr else "未知错误"
+                return OperationResult(f"导出失败: {error_msg}", ok=False)
+
+        except Exception as e:
+            return OperationResult(f"导出时发生错误: {str(e)}", ok=False)
+
+    @staticmethod
+    def format_size(size):
+        """把字节数格式化为易读的大小"""
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if abs(size) < 1024 or unit == 'GB':
+                return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
+
+    def reset_to_commit(self, commit_hash, hard=False):
+        """回退到指定的提交
+        hard=True 会丢弃所有更改
+        hard=False 会保留更改在工作区
+        """
+        mode = '--hard' if hard else '--soft'
+        return self.run_git_command(['git', 'reset', mode, commit_hash])
+
+    def revert_commit(self, commit_hash):
+        """撤销指定的提交（会创建新的提交）"""
+        return self.run_git_command(['git', 'revert', commit_hash])
+
+    # 路径 -> 提交索引：按 git log 的拓扑顺序（旧到新）给每个改动过文件的提交编号，
+    # 每个路径保存提交编号列表，重命名单独记录，便于按文件名追溯历史。
+    # 合并提交只记录与所有父提交都不同的路径（解决冲突时的改动），与 git log -- <路径> 一致
+    PATH_INDEX = 'path_index.bin'
+    # 格式或内容有变化时修改，旧索引会被重新建立（GMP2：开始记录合并提交）
+    PATH_INDEX_MAGIC = b'GMP2'
+
+    def write_state_bytes(self, name, payload):
+        """原子地写入二进制状态文件"""
+        state_dir = self.state_dir()
+        if state_dir is None:
+            return False
+        fd, temp_path = tempfile.mkstemp(prefix=f'.{name}.', dir=state_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, os.path.join(state_dir, name))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
+
+    def load_path_index(self):
+        """读取磁盘上的路径索引，不存在或格式不对时返回None"""
+        state_dir = self.state_dir()
+        if state_dir is None:
+            return None
+        path = os.path.join(state_dir, self.PATH_INDEX)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            cached = getattr(self, '_path_index', None)
+            if cached is not None and cached['mtime'] == mtime:
+                return cached
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, oid_size, count, meta_size = struct.unpack_from('>4sBII', data)
+            if magic != self.PATH_INDEX_MAGIC:
+                return None
+            offset = struct.calcsize('>4sBII')
+            oids = data[offset:offset + oid_size * count]
+            meta = json.loads(zlib.decompress(data[offset + len(oids):offset + len(oids) + meta_size]))
+        except (OSError, ValueError, struct.error, zlib.error):
+            return None
+        paths = {}
+        for name, deltas in meta['paths'].items():
+            # 编号以差值形式存储，这里还原为递增列表
+            total, positions = 0, []
+            for delta in deltas:
+                total += delta
+                positions.append(total)
+            paths[name] = positions
+        self._path_index = {'tip': meta['tip'], 'oid_size': oid_size, 'oids': bytearray(oids),
+                            'paths': paths, 'renames': meta['renames'], 'mtime': mtime}
+        return self._path_index
+
+    def save_path_index(self, index):
+        """把路径索引写入磁盘：提交ID按二进制连续存放，其余部分为 zlib 压缩的 JSON"""
+        paths = {}
+        for name, positions in index['paths'].items():
+            previous, deltas = 0, []
+            for position in positions:
+                deltas.append(position - previous)
+                previous = position
+            paths[name] = deltas
+        meta = zlib.compress(json.dumps({'tip': index['tip'], 'paths': paths, 'renames': index['renames']},
+                                        ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+        count = len(index['oids']) // index['oid_size']
+        payload = (struct.pack('>4sBII', self.PATH_INDEX_MAGIC, index['oid_size'], count, len(meta))
+                   + bytes(index['oids']) + meta)
+        self.write_state_bytes(self.PATH_INDEX, payload)
+        index['mtime'] = os.stat(os.path.join(self.state_dir(), self.PATH_INDEX)).st_mtime_ns
+        self._path_index = index
+
+    def ensure_changed_path_filters(self):
+        """没有 commit-graph 时写入带修改路径 Bloom 过滤器的 commit-graph（git 2.27 及以上）
+
+        git log -- <路径> 会利用这些过滤器跳过没有改动该路径的提交。
+        """
+        if not self.git.at_least(2, 27):
+            return False
+        output = self.run_git_command(['git', 'rev-parse', '--git-path', 'objects/info'])
+        if not output:
+            return False
+        info_dir = os.path.join(self.repo_path or os.getcwd(), output.strip())
+        if os.path.exists(os.path.join(info_dir, 'commit-graph')) or \
+                os.path.isdir(os.path.join(info_dir, 'commit-graphs')):
+            return True
+        result = self.run_git_process(['git', 'commit-graph', 'write', '--reachable', '--changed-paths'])
+        return result.returncode == 0
+
+    def update_path_index(self):
+        """把上次索引的提交之后的新提交加入路径索引，返回最新的索引；没有提交时返回None
+
+        上次索引的提交不再是 HEAD 的祖先（例如切换分支或重写历史）时重新建立索引。
+        """
+        result = self.run_git_process(['git', 'rev-parse', '--verify', '-q', 'HEAD'])
+        if result.returncode != 0:
+            return None
+        head = result.stdout.strip()
+        index = self.load_path_index()
+        if index is not None and index['tip'] == head:
+            return index
+
+        revision = 'HEAD'
+        if index is not None:
+            check = self.run_git_process(['git', 'merge-base', '--is-ancestor', index['tip'], head])
+            if check.returncode == 0:
+                revision = f"{index['tip']}..{head}"
+            else:
+                index = None
+        if index is None:
+            index = {'tip': None, 'oid_size': len(head) // 2, 'oids': bytearray(), 'paths': {}, 'renames': {}}
+            self.ensure_changed_path_filters()
+
+        # --cc：合并提交按组合差异列出与所有父提交都不同的路径
+        command = ['git', 'log', '-z', '--reverse', '--topo-order', '--format=%x1e%H',
+                   '--name-status', '-M', '--cc', revision, '--']
+
+        def add(raw):
+            oid, _, changes = raw.partition('\0')
+            tokens = changes.lstrip('\n').split('\0')
+            position = None
+            i = 0
+            while i < len(tokens) - 1:
+                status = tokens[i]
+                if not status:
+                    i += 1
+                    continue
+                if position is None:
+                    position = len(index['oids']) // index['oid_size']
+                    index['oids'] += bytes.fromhex(oid)
+                # 组合差异的状态是每个父提交一个字母（如 MM），后面只有一个路径；
+                # 普通的重命名和复制状态带相似度（如 R100），后面有新旧两个路径
+                if status[0] in 'RC' and status[1:].isdigit():
+                    old_path, new_path = tokens[i + 1], tokens[i + 2]
+                    i += 3
+                    if status[0] == 'R':
+                        index['paths'].setdefault(old_path, []).append(position)
+                        index['renames'].setdefault(new_path, []).append([position, old_path])
+                else:
+                    new_path = tokens[i + 1]
+                    i += 2
+                index['paths'].setdefault(new_path, []).append(position)
+
+        pending = ''
+        stream = self.stream_git_command(command, lines=False)
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                if not stop.value:
+                    return None
+                break
+            pending += chunk
+            *complete, pending = pending.split('\x1e')
+            for raw in complete:
+                if raw:
+                    add(raw)
+        if pending:
+            add(pending)
+
+        index['tip'] = head
+        try:
+            self.save_path_index(index)
+        except OSError as e:
+            print(f"错误: 无法保存路径索引: {e}")
+            # 仍在内存中使用本次的结果；mtime 与磁盘文件不符，下次会重新读取并增量更新
+            index['mtime'] = None
+            self._path_index = index
+        return index
+
+    def top_relative_path(self, file_path):
+        """把用户输入的路径转换为相对仓库根目录的路径（路径索引和 git 输出都使用这种形式）
+
+        普通路径相对当前目录，以 :(top) 或 :/ 开头的路径相对仓库根目录；路径在仓库之外时返回None。
+        """
+        if os.path.isabs(file_path):
+            file_path = os.path.relpath(file_path, self.worktree_root())
+        file_path = file_path.replace(os.sep, '/')
+        for magic in (':(top)', ':/'):
+            if file_path.startswith(magic):
+                file_path = file_path[len(magic):]
+                break
+        else:
+            cached = getattr(self, '_show_prefix', None)
+            if cached is None or cached[0] != self.repo_path:
+                output = self.run_git_command(['git', 'rev-parse', '--show-prefix'])
+                cached = self._show_prefix = (self.repo_path, (output or '').strip())
+            file_path = cached[1] + file_path
+        file_path = posixpath.normpath(file_path or '.')
+        if file_path == '..' or file_path.startswith('../'):
+            return None
+        return '' if file_path == '.' else file_path
+
+    def path_history(self, file_path, limit=None):
+        """从路径索引中查找改动过该路径的提交ID（新到旧），会跟随重命名
+
+        file_path 按 top_relative_path 的规则解析；目录路径会合并目录下所有文件的提交。
+        与 git log -- <路径> 一样，解决冲突时改动了该路径的合并提交也会列出（git log --follow 不列出合并提交）。
+        无法建立索引时返回None。
+        """
+        index = self.update_path_index()
+        if index is None:
+            return None
+        file_path = self.top_relative_path(file_path)
+        if not file_path:
+            return []
+        positions = []
+        current, upper = file_path, None
+        while current is not None:
+            touched = index['paths'].get(current)
+            if touched is None and current == file_path:
+                prefix = current + '/'
+                touched = sorted({p for name, values in index['paths'].items()
+                                  if name.startswith(prefix) for p in values})
+            touched = touched or []
+            # 找到 upper 之前最近一次重命名为当前路径的提交，更早的历史沿用原路径
+            rename = None
+            for position, old_path in index['renames'].get(current, []):
+                if (upper is None or position < upper) and (rename is None or position > rename[0]):
+                    rename = (position, old_path)
+            lower = rename[0] if rename else -1
+            positions += [p for p in reversed(touched) if p >= lower and (upper is None or p < upper)]
+            if limit is not None and len(positions) >= limit:
+                break
+            current, upper = (rename[1], rename[0]) if rename else (None, None)
+
+        size = index['oid_size']
+        oids = index['oids']
+        return [oids[p * size:(p + 1) * size].hex() for p in positions[:limit]]
+
+    def last_commit_touching(self, file_path):
+        """返回最后一次改动该路径的提交ID，找不到时返回None"""
+        history = self.path_history(file_path, limit=1)
+        return history[0] if history else None
+
+    def file_history(self, file_path, stream=False):
+        """查看特定文件的修改历史，stream=True 时返回逐行产出的生成器
+
+        优先使用路径索引找出相关提交，只让 git log 输出这些提交；索引不可用或索引中找不到该路径时
+        回退到 git log --follow。改动该路径的提交很多且没有重命名时，由 git log -- <路径> 直接输出。
+        索引按拓扑顺序排列提交，提交时间相同的提交之间的顺序可能与 git log --follow 不同。
+        """
+        oids = self.path_history(file_path)
+        renames = (getattr(self, '_path_index', None) or {}).get('renames', {})
+        if not oids or (len(oids) > 200 and self.top_relative_path(file_path) not in renames):
+            # 提交很多且没有重命名时，直接交给 git log（可利用 Bloom 过滤器）比逐个渲染提交更快
+            command = ['git', 'log', '--no-follow' if oids else '--follow', '--', file_path]
+            if stream:
+                return self.stream_git_command(command)
+            return self.run_git_command(command)
+
+        def render():
+            # 由 git log 按索引给出的顺序输出这些提交，每次最多 1000 个，避免命令行过长
+            for start in range(0, len(oids), 1000):
+                if start:
+                    yield '\n'
+                ok = yield from self.stream_git_command(['git', 'log', '--no-walk=unsorted', *oids[start:start + 1000]])
+                if not ok:
+                    return False
+            return True
+
+        if stream:
+            return render()
+        return ''.join(render())
+
+    def read_blob(self, file_path, commit_hash='HEAD'):
+        """读取指定版本中文件的内容（字节），不存在时返回None"""
+        # <提交>:<路径> 中的路径相对仓库根目录，先把相对当前目录的路径转换过来
+        top_path = self.top_relative_path(file_path)
+        if top_path is None:
+            return None
+        try:
+            info = self.object_reader().read(f'{commit_hash}:{top_path}')
+        except (OSError, ValueError, EOFError) as e:
+            print(f"错误: {e}")
+            return None
+        if not info or info[1] != 'blob':
+            return None
+        return info[2]
+
+    def preview_file(self, file_path, commit_hash='HEAD', max_lines=20):
+        """预览指定版本中文件的前几行内容"""
+        data = self.read_blob(file_path, commit_hash)
+        if data is None:
+            return None
+        if b'\0' in data[:8000]:
+            return f"[二进制文件，大小 {len(data)} 字节]"
+        lines = data.decode('utf-8', errors='replace').splitlines()
+        preview = '\n'.join(lines[:max_lines])
+        if len(lines) > max_lines:
+            preview += f"\n... (共 {len(lines)} 行，仅显示前 {max_lines} 行)"
+        return preview
+
+    def restore_file(self, file_path, commit_hash='HEAD'):
+        """恢复文件到指定版本"""
+        return self.run_git_command(['git', 'checkout', commit_hash, '--', file_path])
+
+    def list_files(self, stream=False):
+        """列出Git管理的所有文件，stream=True 时返回逐行产出的生成器"""
+        output = self.run_native('list_files', self.repo_path)
+        if output is not None:
+            if stream:
+                return iter(output.splitlines(keepends=True))
+            return output
+        if stream:
+            return self.stream_git_command(['git', 'ls-files'])
+        return self.run_git_command(['git', 'ls-files'])
+
+    # 发布目标记录在 publish_targets.json 中：{名称: {kind, path, source, branch, deployed}}
+    PUBLISH_TARGETS = 'publish_targets.json'
+
+    def publish_targets(self):
+        """读取所有发布目标"""
+        return self.read_state(self.PUBLISH_TARGETS, {})
+
+    @staticmethod
+    def guess_target_kind(path):
+        """判断发布目标是普通目录（dir）还是 git 仓库（repo）"""
+        if '://' in path or path.endswith('.git') or re.match(r'^[\w.-]+@[\w.-]+:', path):
+            return 'repo'
+        if os.path.isfile(os.path.join(path, 'HEAD')) and os.path.isdir(os.path.join(path, 'objects')):
+            return 'repo'
+        return 'dir'
+
+    def add_publish_target(self, name, path, source='web', kind=None, branch='gh-pages'):
+        """添加或更新发布目标；修改路径、源目录或类型后会重新完整发布"""
+        targets = self.publish_targets()
+        kind = kind or self.guess_target_kind(path)
+        if kind == 'dir':
+            path = os.path.abspath(path)
+        source = source.replace(os.sep, '/').strip('/')
+        old = targets.get(name, {})
+        same = (old.get('path'), old.get('source'), old.get('kind')) == (path, source, kind)
+        targets[name] = {'kind': kind, 'path': path, 'source': source, 'branch': branch,
+                         'deployed': old.get('deployed') if same else None}
+        self.write_state(self.PUBLISH_TARGETS, targets)
+        return f"发布目标 {name} 已保存: {kind} {path}（源目录: {source or '仓库根目录'}）"
+
+    DEFAULT_PUBLISH_CACHE_BYTES = 256 * 1024 * 1024
+
+    def publish_blob_dir(self):
+        """发布用的只读 blob 缓存目录，文件名为 blob ID，再次发布同一内容时不必重新读取对象"""
+        state_dir = self.state_dir()
+        return os.path.join(state_dir, 'publish', 'blobs') if state_dir else None
+
+    def trim_publish_cache(self, limit=None):
+        """blob 缓存超过上限（gitmanager.publishCacheSize，默认256MB）时按最近使用时间淘汰到上限的 80%"""
+        blob_dir = self.publish_blob_dir()
+        if limit is None:
+            limit = self.config_int('gitmanager.publishCacheSize') or self.DEFAULT_PUBLISH_CACHE_BYTES
+        entries = []
+        for dirpath, _, filenames in os.walk(blob_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total <= limit:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= limit * 0.8:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def publish_changes(self, target, revision):
+        """计算需要同步的文件，返回 [(状态, 模式, blob ID, 相对源目录的路径)]，失败时返回None
+
+        有上次发布的提交时只执行一次 diff-tree -z --raw，否则列出源目录下的全部文件。
+        """
+        source = target['source']
+        pathspec = ['--', source] if source else []
+        prefix = source + '/' if source else ''
+        if target.get('deployed'):
+            result = self.run_git_process(['git', 'diff-tree', '-r', '-z', '--raw', '--no-abbrev', '--no-renames',
+                                           target['deployed'], revision] + pathspec)
+            if result.returncode == 0:
+                fields = result.stdout.split('\0')
+                changes = []
+                for i in range(0, len(fields) - 1, 2):
+                    _, new_mode, _, new_oid, status = fields[i].lstrip(':').split(' ')
+                    changes.append((status[0], new_mode, new_oid, fields[i + 1][len(prefix):]))
+                return changes
+            # 上次发布的提交已不存在（例如历史被重写），退回完整发布
+        result = self.run_git_process(['git', 'ls-tree', '-r', '-z', revision] + pathspec)
+        if result.returncode != 0:
+            print(f"错误: {result.stderr.strip()}")
+            return None
+        changes = []
+        for entry in result.stdout.split('\0'):
+            if entry:
+                info, path = entry.split('\t', 1)
+                mode, _, oid = info.split(' ')
+                changes.append(('A', mode, oid, path[len(prefix):]))
+        return changes
 
-    def undo_last_push(self, remote='origin', branch=''):
-        """撤销上一次推送到远程仓库
-        注意：这是一个危险操作，会重写远程历史
+    def _sync_file(self, root, blob_dir, status, mode, oid, path, data):
+        """把一个文件同步到目标目录，返回 'copy'、'delete' 或 'skip'
+
+        目标文件总是独立的副本：与缓存共用 inode 会丢失可执行权限，目标被修改时还会破坏缓存。
         """
-        # 如果未指定分支，获取当前分支
-        if not branch:
-            branch_output = self.run_git_command(['git', 'branch', '--show-current'])
-            if branch_output:
-                branch = branch_output.strip()
-            else:
-                return "无法获取当前分支"
-                
-        # 获取当前分支最新提交的前一个提交
-        commit_output = self.run_git_command(['git', 'rev-parse', 'HEAD~1'])
-        if not commit_output:
-            return "无法获取上一个提交，可能只有一个提交或仓库为空"
-            
-        previous_commit = commit_output.strip()
-        
-        # 使用force-with-lease进行强制推送，这比纯force更安全
-        result = self.run_git_command([
-            'git', 'push', '--force-with-lease', remote, f'{previous_commit}:{branch}'
-        ])
-        
-        return result or f"已成功撤销最近一次推送，远程分支 {remote}/{branch} 现在指向 {previous_commit[:7]}"
+        destination = os.path.join(root, *path.split('/'))
+        if status == 'D':
+            try:
+                os.remove(destination)
+            except FileNotFoundError:
+                pass
+            # 删除因此变空的目录
+            directory = os.path.dirname(destination)
+            while directory != root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+            return 'delete'
+        if mode == '160000':
+            return 'skip'
 
-    def log(self, num_entries=5):
-        """查看提交历史"""
-        return self.run_git_command(['git', 'log', f'-{num_entries}', '--oneline'])
+        cached = os.path.join(blob_dir, oid[:2], oid[2:])
+        if data is not None and not os.path.exists(cached):
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            temp = f'{cached}.{threading.get_ident()}.tmp'
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.chmod(temp, 0o444)
+            os.replace(temp, cached)
 
-    def log_detailed(self, num_entries=5):
-        """查看详细提交历史"""
-        return self.run_git_command(['git', 'log', f'-{num_entries}', '--stat'])
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp = f'{destination}.publish-tmp'
+        if os.path.lexists(temp):
+            os.remove(temp)
+        if data is None:
+            # 命中缓存：更新修改时间，淘汰时按最近使用排序
+            os.utime(cached)
+        if mode == '120000':
+            with open(cached, 'rb') as f:
+                os.symlink(f.read(), temp)
+        else:
+            shutil.copyfile(cached, temp)
+            os.chmod(temp, 0o755 if mode == '100755' else 0o644)
+        os.replace(temp, destination)
+        return 'copy'
 
-    def show_commit(self, commit_hash):
-        """查看特定提交的详细信息"""
-        return self.run_git_command(['git', 'show', commit_hash])
+    def publish_to_directory(self, target, revision, changes, jobs=8):
+        """并行把变化的文件同步到目录，返回统计和失败列表"""
+        from concurrent.futures import ThreadPoolExecutor
+        blob_dir = self.publish_blob_dir()
+        root = target['path']
+        os.makedirs(root, exist_ok=True)
+        counts = collections.Counter()
+        failures = {}
+        lock = threading.Lock()
 
-    def export_commit_to_file(self, commit_hash, filename):
-        """导出特定提交的详细信息到文件"""
-        try:
-            # 设置环境变量，确保Git使用UTF-8编码
-            env = os.environ.copy()
-            env['LANG'] = 'en_US.UTF-8'
-            env['PYTHONIOENCODING'] = 'utf-8'
-            
-            # 使用git show命令并重定向到文件
-            with open(filename, 'w', encoding='utf-8', errors='replace') as f:
-                result = subprocess.run(
-                    ['git', 'show', commit_hash],
-                    stdout=f,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    env=env
-                )
-                
-            if result.returncode == 0:
-                return f"提交 {commit_hash} 的详细信息已成功导出到文件: {filename}"
+        def sync(change, data):
+            try:
+                method = self._sync_file(root, blob_dir, *change, data)
+            except OSError as e:
+                with lock:
+                    failures[change[3]] = str(e)
+                return
+            with lock:
+                counts[method] += 1
+
+        # 读取 blob 比写入快得多，限制已读入内存、尚未写入的 blob 数量，
+        # 否则首次发布大量媒体文件时所有内容会同时堆积在线程池队列里
+        batch = max(1, jobs) * 2
+        slots = threading.BoundedSemaphore(batch)
+
+        def sync_blob(change, data):
+            try:
+                sync(change, data)
+            finally:
+                slots.release()
+
+        missing, present = [], []
+        for change in changes:
+            if change[0] != 'D' and change[1] != '160000' and \
+                    not os.path.exists(os.path.join(blob_dir, change[2][:2], change[2][2:])):
+                missing.append(change)
             else:
-                error_msg = result.stderr if result.stderr else "未知错误"
-                return f"导出失败: {error_msg}"
-                
-        except Exception as e:
-            return f"导出时发生错误: {str(e)}"
+                present.append(change)
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            for change in present:
+                pool.submit(sync, change, None)
+            # 缺少的 blob 通过常驻 cat-file 分批读取，读到一批就交给线程池写入
+            reader = self.object_reader()
+            for start in range(0, len(missing), batch):
+                chunk = missing[start:start + batch]
+                try:
+                    objects = reader.read_many(c[2] for c in chunk)
+                except (OSError, ValueError, EOFError) as e:
+                    with lock:
+                        for change in chunk:
+                            failures[change[3]] = str(e)
+                    continue
+                for change, obj in zip(chunk, objects):
+                    if obj is None:
+                        with lock:
+                            failures[change[3]] = "找不到对象"
+                    else:
+                        slots.acquire()
+                        pool.submit(sync_blob, change, obj[2])
+                # 释放这一批的引用，内容只由尚未完成的写入任务持有
+                del objects
+        self.trim_publish_cache()
+        return counts, failures
 
-    def reset_to_commit(self, commit_hash, hard=False):
-        """回退到指定的提交
-        hard=True 会丢弃所有更改
-        hard=False 会保留更改在工作区
+    def publish_to_repository(self, name, target, revision):
+        """把源目录的树作为一个提交推送到目标仓库的分支，git 只会传输新对象
+
+        发布提交以上一次发布的提交为父提交，保存在 refs/git_manager/publish/<名称> 下，
+        避免被 gc 清理，推送总是快进。
         """
-        mode = '--hard' if hard else '--soft'
-        return self.run_git_command(['git', 'reset', mode, commit_hash])
+        spec = f"{revision}:{target['source']}" if target['source'] else f'{revision}^{{tree}}'
+        tree = self.run_git_command(['git', 'rev-parse', spec])
+        if not tree:
+            return None
+        tree = tree.strip()
+        local_ref = f'refs/git_manager/publish/{name}'
+        parent = self.run_git_process(['git', 'rev-parse', '--verify', '-q', local_ref]).stdout.strip()
+        commit = None
+        if parent:
+            # 树没有变化时直接重用上一次的发布提交
+            parent_tree = self.run_git_command(['git', 'rev-parse', f'{parent}^{{tree}}'])
+            if parent_tree and parent_tree.strip() == tree:
+                commit = parent
+        if commit is None:
+            short = self.run_git_command(['git', 'rev-parse', '--short', revision]) or revision
+            command = ['git', 'commit-tree', tree, '-m', f"发布 {short.strip()}"]
+            if parent:
+                command[3:3] = ['-p', parent]
+            output = self.run_git_command(command)
+            if not output:
+                return None
+            commit = output.strip()
+            if self.run_git_command(['git', 'update-ref', local_ref, commit]) is None:
+                return None
+        result = self.run_git_process(['git', 'push', target['path'], f"{commit}:refs/heads/{target['branch']}"])
+        if result.returncode != 0:
+            print(f"错误: {result.stderr.strip()}")
+            return None
+        return commit
 
-    def revert_commit(self, commit_hash):
-        """撤销指定的提交（会创建新的提交）"""
-        return self.run_git_command(['git', 'revert', commit_hash])
+    def publish(self, name, revision='HEAD', jobs=8, full=False):
+        """增量发布到目标：只同步上次发布的提交之后改动过的文件"""
+        targets = self.publish_targets()
+        target = targets.get(name)
+        if target is None:
+            return OperationResult(f"没有名为 {name} 的发布目标", ok=False)
+        oid = self.resolve_commit(revision)
+        if oid is None:
+            return OperationResult(f"找不到提交 {revision}", ok=False)
+        if full:
+            target = dict(target, deployed=None)
+        if target.get('deployed') == oid:
+            return OperationResult(f"{name} 已是最新（{oid[:7]}），无需发布")
 
-    def file_history(self, file_path):
-        """查看特定文件的修改历史"""
-        return self.run_git_command(['git', 'log', '--follow', '--', file_path])
+        start = time.perf_counter()
+        if target['kind'] == 'repo':
+            commit = self.publish_to_repository(name, target, oid)
+            if commit is None:
+                return OperationResult(f"发布到 {name} 失败", ok=False)
+            summary = f"已推送发布提交 {commit[:7]} 到 {target['path']} 的 {target['branch']} 分支"
+        else:
+            changes = self.publish_changes(target, oid)
+            if changes is None:
+                return OperationResult(f"发布到 {name} 失败", ok=False)
+            counts, failures = self.publish_to_directory(target, oid, changes, jobs)
+            if failures:
+                lines = [f"发布到 {name} 时有 {len(failures)} 个文件失败，未更新发布记录:"]
+                lines += [f"  {path}: {reason}" for path, reason in sorted(failures.items())]
+                return OperationResult('\n'.join(lines), ok=False)
+            summary = (f"同步 {len(changes)} 个变化：复制 {counts['copy']}，"
+                       f"删除 {counts['delete']}，跳过 {counts['skip']}")
 
-    def restore_file(self, file_path, commit_hash='HEAD'):
-        """恢复文件到指定版本"""
-        return self.run_git_command(['git', 'checkout', commit_hash, '--', file_path])
+        targets = self.publish_targets()
+        if name in targets:
+            targets[name]['deployed'] = oid
+            self.write_state(self.PUBLISH_TARGETS, targets)
+        previous = target.get('deployed')
+        return OperationResult(f"已发布 {oid[:7]} 到 {name}（{'从 ' + previous[:7] + ' 增量' if previous else '完整'}发布）\n"
+                               f"{summary}，耗时 {time.perf_counter() - start:.2f} 秒")
 
-    def list_files(self):
-        """列出Git管理的所有文件"""
-        return self.run_git_command(['git', 'ls-files'])
+    def format_publish_targets(self):
+        """列出发布目标和上次发布的提交"""
+        targets = self.publish_targets()
+        if not targets:
+            return "还没有发布目标"
+        return '\n'.join(f"{name}: {t['kind']} {t['path']}（源目录: {t['source'] or '仓库根目录'}"
+                         f"{'，分支: ' + t['branch'] if t['kind'] == 'repo' else ''}）"
+                         f" 上次发布: {t['deployed'][:7] if t.get('deployed') else '无'}"
+                         for name, t in sorted(targets.items()))
+
+    def show_file_commits(self, file_path, limit=10):
+        """用路径索引显示最近改动过该文件的提交，没有结果时返回False"""
+        oids = self.path_history(file_path, limit)
+        if not oids:
+            return False
+        print(f"\n最近改动过 {file_path} 的提交（格式：提交哈希值 提交信息）：")
+        for record in self.iter_commits(['--no-walk=unsorted', *oids]):
+            print(record.oneline())
+        print("\n提示：每行开头的字母和数字组合就是提交哈希值")
+        return True
 
     def show_commit_history(self):
         """显示最近的提交历史"""
         print("\n最近的提交历史（格式：提交哈希值 提交信息）：")
-        history = self.log(10)  # 显示最近10条提交
-        if history:
-            print(history)
+        printed = False
+        for line in self.log(10, stream=True):  # 显示最近10条提交
+            print(line, end='', flush=True)
+            printed = True
+        if printed:
             print("\n提示：每行开头的字母和数字组合就是提交哈希值")
             return True
         else:
             print("没有找到任何提交记录")
             return False
 
+    def ask_use_worktree(self):
+        """询问是否在工作树池中打开分支，直接回车时按 gitmanager.useWorktrees 配置"""
+        answer = input("是否在独立的工作树中打开？(y/n，直接回车按配置): ").strip().lower()
+        return {'y': True, 'n': False}.get(answer)
+
     def show_menu(self):
         """显示菜单"""
         menu = """
@@ -403,19 +4030,24 @@ Git 管理工具
 3. 查看仓库状态
 4. 添加文件到暂存区
    a) 撤销添加到暂存区的文件
+   b) 优化暂存区中的图片（无损压缩，去除元数据）
 5. 提交更改
 6. 创建新分支
 7. 切换分支
 8. 查看所有分支
+   a) 工作树池（每个分支一个检出目录，切换分支不改写当前目录）
 9. 远程仓库管理
     a) 添加远程仓库
     b) 查看远程仓库列表
     c) 删除远程仓库
     d) 克隆远程仓库
 10. 拉取远程更新
+    a) 并行获取多个远程仓库的更新
 11. 推送到远程仓库
     a) 撤销上一次推送（危险操作）
     b) 分批次推送（适用于大文件或网络不稳定）
+    c) 并行推送到多个远程仓库
+    d) 清除分批次推送断点记录
 12. 版本管理
     a) 查看简略提交历史
     b) 查看详细提交历史
@@ -426,17 +4058,30 @@ Git 管理工具
     g) 恢复文件到指定版本
     h) 导出特定提交详情到文件
 13. 查看仓库文件列表
+14. 大文件检查（暂存区与未推送提交）
+15. 多仓库工作区（并行查看状态/获取/拉取/推送）
+16. 查看本次运行中最慢的Git操作
+17. 发布网站（增量同步到目录或仓库）
+18. 仓库维护（commit-graph、multi-pack-index、松散对象）
 0. 退出
 """
         print(menu)
 
     def run(self):
         """运行主程序"""
+        # 配置了 gitmanager.autoMaintenance=true 时，等待输入的空闲时间用于后台维护对象库
+        self.maintenance = MaintenanceScheduler(self)
+        if self.maintenance.start():
+            print("后台维护已开启：空闲时会整理对象库（git config gitmanager.autoMaintenance false 可关闭）")
         while True:
             self.show_menu()
-            choice = input("请选择操作 (0-13 或 9a-9d, 11a-11b, 12a-12h): ").strip().lower()
+            self.maintenance.mark_idle()
+            choice = input("请选择操作 (0-18 或 4a-4b, 8a, 9a-9d, 10a, 11a-11d, 12a-12h): ").strip().lower()
+            self.maintenance.mark_busy()
+            self.tracer.action = f'menu:{choice}'
 
             if choice == '0':
+                self.maintenance.stop()
                 print("感谢使用！再见！")
                 break
             elif choice == '1':
@@ -451,17 +4096,19 @@ Git 管理工具
                     if name or email:
                         print(self.config_user(name, email))
             elif choice == '3':
+                self.ask_status_acceleration()
                 print(self.status())
             elif choice == '4':
                 # 先显示当前状态
                 print("\n当前仓库状态：")
-                print(self.status())
+                print(self.format_status())
                 
                 print("\n添加文件到暂存区：")
                 print("- 直接回车：添加所有文件（包括未被管理的文件）")
                 print("- 输入文件名：添加指定文件（从上面状态中复制文件名）")
                 print("- 输入通配符：如 *.java 添加所有Java文件")
                 print("- 多个文件用空格分隔：如 file1.txt file2.txt")
+                print("- 文件名含空格时用引号括起来：如 \"my file.txt\"")
                 print("- 输入 q 或 quit 退出")
                 print("\n提示：")
                 print("1. Untracked files (未被管理的文件) 也可以直接添加")
@@ -472,19 +4119,20 @@ Git 管理工具
                     print("已取消添加文件")
                     continue
                 files = files or '.'  # 如果输入为空，使用 '.' 表示所有文件
-                self.add_files(files)
+                print(self.add_files(files))
                 print("\n添加后的状态：")
-                print(self.status())
+                print(self.format_status())
             elif choice == '4a':
                 # 先显示当前状态
                 print("\n当前仓库状态：")
-                print(self.status())
+                print(self.format_status())
                 
                 print("\n撤销添加到暂存区的文件：")
                 print("- 直接回车：撤销所有已暂存的文件")
                 print("- 输入文件名：撤销指定文件（从上面状态中复制文件名）")
                 print("- 输入通配符：如 *.java 撤销所有已暂存的Java文件")
                 print("- 多个文件用空格分隔：如 file1.txt file2.txt")
+                print("- 文件名含空格时用引号括起来：如 \"my file.txt\"")
                 print("- 输入 q 或 quit 退出")
                 print("\n提示：")
                 print("1. 只能撤销已被添加到暂存区的文件 (Changes to be committed)")
@@ -495,26 +4143,48 @@ Git 管理工具
                     print("已取消撤销暂存")
                     continue
                 files = files or '.'  # 如果输入为空，使用 '.' 表示所有文件
-                self.unstage_files(files)
+                print(self.unstage_files(files))
                 print("\n撤销暂存后的状态：")
-                print(self.status())
+                print(self.format_status())
+            elif choice == '4b':
+                print("\n正在优化暂存区中的图片...")
+                print(self.optimize_staged_images())
+                print("提示: 执行 git config gitmanager.optimizeImages true 后，添加文件和提交时会自动优化")
             elif choice == '5':
                 message = self.validate_input(input("请输入提交信息: "), "提交信息")
-                if message:
+                if message and not self.confirm_large_assets(staged=True):
+                    print("已取消提交")
+                elif message:
                     self.commit(message)
                     print("更改已提交")
             elif choice == '6':
                 branch_name = self.validate_input(input("请输入新分支名称: "), "分支名称")
                 if branch_name:
-                    self.create_branch(branch_name)
-                    print(f"已创建并切换到分支 {branch_name}")
+                    use_worktree = self.ask_use_worktree()
+                    result = self.create_branch(branch_name, use_worktree)
+                    if self.use_worktrees(use_worktree):
+                        print(result)
+                    else:
+                        print(f"已创建并切换到分支 {branch_name}")
             elif choice == '7':
                 branch_name = self.validate_input(input("请输入要切换的分支名称: "), "分支名称")
                 if branch_name:
-                    self.switch_branch(branch_name)
-                    print(f"已切换到分支 {branch_name}")
+                    use_worktree = self.ask_use_worktree()
+                    result = self.switch_branch(branch_name, use_worktree)
+                    if self.use_worktrees(use_worktree):
+                        print(result)
+                    else:
+                        print(f"已切换到分支 {branch_name}")
             elif choice == '8':
                 print(self.list_branches())
+            elif choice == '8a':
+                pool = self.worktree_pool()
+                print(pool.format(self.worktree_root()))
+                target = input("\n输入分支名切换到它的工作树，输入 -分支名 删除工作树(直接回车返回): ").strip()
+                if target.startswith('-'):
+                    print(pool.remove(target[1:]))
+                elif target:
+                    print(self.open_worktree(target))
             elif choice == '9' or choice == '9b':
                 print(self.list_remotes())
             elif choice == '9a':
@@ -529,18 +4199,40 @@ Git 管理工具
                     print(self.remove_remote(name))
                     print(f"已删除远程仓库 {name}")
             elif choice == '9d':
-                url = self.validate_url(input("请输入要克隆的仓库URL: "))
+                url = self.validate_url(input("请输入要克隆的仓库URL或本地路径: "))
                 if url:
                     directory = input("请输入目标目录(直接回车使用默认目录): ").strip()
-                    print(self.clone_repository(url, directory))
-                    print("仓库克隆完成")
+                    profiles = list(self.CLONE_PROFILES)
+                    print("\n克隆方式：")
+                    for i, profile in enumerate(profiles, 1):
+                        print(f"{i}. {self.CLONE_PROFILES[profile]}")
+                    picked = self.validate_number(input("请选择克隆方式(1-4，默认1): ").strip() or '1', 1)
+                    profile = profiles[min(max(picked, 1), len(profiles)) - 1]
+                    depth = since = dirs = None
+                    if profile == 'shallow':
+                        since = input("只下载某日期之后的历史(如 2024-01-01，直接回车按提交数): ").strip() or None
+                        if not since:
+                            depth = self.validate_number(input("请输入要下载的提交数(默认1): ").strip() or '1', 1)
+                    elif profile == 'sparse':
+                        dirs = input("请输入要检出的目录，多个用空格分隔(默认web): ").split() or ['web']
+                    result = self.clone_repository(url, directory or None, profile, depth, since, dirs)
+                    if result:
+                        print(result)
+                        print("仓库克隆完成")
             elif choice == '10':
                 print(self.pull())
+            elif choice == '10a':
+                remotes = input("请输入远程仓库名，多个用空格分隔(直接回车表示全部): ").split()
+                print("\n正在并行获取...")
+                print(self.format_remote_results(self.fetch_remotes(remotes), "并行获取"))
             elif choice == '11':
                 remote = input("请输入远程仓库名(默认origin): ").strip() or 'origin'
                 branch = input("请输入分支名(默认当前分支): ").strip()
-                self.push(remote, branch or None)
-                print(f"已推送到 {remote}/{branch or '当前分支'}")
+                if not self.confirm_large_assets(remote, staged=False, unpushed=True):
+                    print("已取消推送")
+                    continue
+                if self.push(remote, branch) is not None:
+                    print(f"已推送到 {remote}/{branch or '当前分支'}")
             elif choice == '11a':
                 print("\n警告：撤销上一次推送是一个危险操作，将会重写远程仓库的历史！")
                 print("这可能会导致其他开发者需要手动修复他们的本地仓库。")
@@ -577,17 +4269,24 @@ Git 管理工具
                 remote = input("\n请输入远程仓库名(默认origin): ").strip() or 'origin'
                 branch = input("请输入分支名(默认当前分支): ").strip()
                 
-                # 先检查是否有未推送的提交
-                commits, error = self.get_unpushed_commits(remote, branch)
-                if error:
-                    print(f"\n{error}")
-                    continue
-                
-                if not commits:
-                    print("\n没有需要推送的提交")
-                    continue
-                
-                print(f"\n发现 {len(commits)} 个未推送的提交")
+                # 有未完成的断点记录时直接续推，不再 fetch 和列出提交
+                journal_branch = branch or self.current_branch()
+                pending = self.load_batch_journal(remote, journal_branch) if journal_branch else None
+                if pending and pending.get('acked_index', -1) < len(pending['plan']) - 1:
+                    remaining = len(pending['plan']) - pending['acked_index'] - 1
+                    print(f"\n发现未完成的分批次推送，剩余 {remaining} 个提交")
+                else:
+                    # 先检查是否有未推送的提交
+                    commits, error = self.get_unpushed_commits(remote, branch)
+                    if error:
+                        print(f"\n{error}")
+                        continue
+                    
+                    if not commits:
+                        print("\n没有需要推送的提交")
+                        continue
+                    
+                    print(f"\n发现 {len(commits)} 个未推送的提交")
                 
                 # 让用户选择批次大小
                 print("\n建议的批次大小：")
@@ -595,8 +4294,10 @@ Git 管理工具
                 print("2. 2-3个提交/批次 - 平衡安全性和效率")
                 print("3. 5个提交/批次 - 较快，适用于小文件")
                 print("4. 自定义批次大小")
+                print("5. 自适应批次 - 按提交大小和实测速度自动调整")
                 
-                batch_choice = input("\n请选择批次大小 (1-4): ").strip()
+                batch_choice = input("\n请选择批次大小 (1-5): ").strip()
+                adaptive = False
                 
                 if batch_choice == '1':
                     batch_size = 1
@@ -607,32 +4308,50 @@ Git 管理工具
                 elif batch_choice == '4':
                     custom_size = input("请输入自定义批次大小: ").strip()
                     batch_size = self.validate_number(custom_size, 1)
+                elif batch_choice == '5':
+                    batch_size = 1
+                    adaptive = True
                 else:
                     print("无效选择，使用默认批次大小: 1")
                     batch_size = 1
                 
                 # 确认开始分批次推送
-                print(f"\n准备以 {batch_size} 个提交为一批进行推送")
+                if adaptive:
+                    print("\n准备按自适应批次进行推送")
+                else:
+                    print(f"\n准备以 {batch_size} 个提交为一批进行推送")
                 confirm = input("确定开始分批次推送吗？(y/N): ").strip().lower()
                 
                 if confirm == 'y':
-                    result = self.batch_push(remote, branch, batch_size)
+                    result = self.batch_push(remote, branch, batch_size, adaptive=adaptive)
                     print(f"\n{result}")
                 else:
                     print("已取消分批次推送")
+            elif choice == '11c':
+                remotes = input("\n请输入远程仓库名，多个用空格分隔(直接回车表示全部): ").split()
+                branch = input("请输入分支名(默认当前分支): ").strip()
+                print("\n正在并行推送...")
+                print(self.format_remote_results(self.push_remotes(remotes, branch), "并行推送"))
+            elif choice == '11d':
+                if input("确定清除所有分批次推送断点记录吗？(y/N): ").strip().lower() == 'y':
+                    print(self.clear_batch_journal())
+                else:
+                    print("操作已取消")
             elif choice == '12' or choice == '12a':
                 num = input("请输入要查看的提交数量(默认5): ").strip() or '5'
                 num = self.validate_number(num, 5)
-                print(self.log(num))
+                self.print_stream(self.log(num, stream=True))
             elif choice == '12b':
                 num = input("请输入要查看的提交数量(默认5): ").strip() or '5'
                 num = self.validate_number(num, 5)
-                print(self.log_detailed(num))
+                self.print_stream(self.log_detailed(num, stream=True))
             elif choice == '12c':
                 if self.show_commit_history():
                     commit_hash = self.validate_input(input("\n请输入要查看的提交哈希值: "), "提交哈希值")
                     if commit_hash:
-                        print(self.show_commit(commit_hash))
+                        stream = self.show_commit(commit_hash, stream=True)
+                        if stream is not None:
+                            self.print_stream(stream)
             elif choice == '12d':
                 if self.show_commit_history():
                     commit_hash = self.validate_input(input("\n请输入要回退到的提交哈希值: "), "提交哈希值")
@@ -653,24 +4372,30 @@ Git 管理工具
                         print(f"已撤销提交 {commit_hash}")
             elif choice == '12f':
                 print("\n当前仓库中的文件列表：")
-                files = self.list_files()
-                if files:
-                    print(files)
+                if self.print_listing(self.list_files(stream=True)):
                     file_path = self.validate_input(input("\n请输入要查看历史的文件路径: "), "文件路径")
                     if file_path:
                         print("\n文件的修改历史：")
-                        print(self.file_history(file_path))
+                        self.print_stream(self.file_history(file_path, stream=True))
                 else:
                     print("仓库中没有文件")
             elif choice == '12g':
                 print("\n当前仓库中的文件列表：")
-                files = self.list_files()
-                if files:
-                    print(files)
+                if self.print_listing(self.list_files(stream=True)):
                     file_path = self.validate_input(input("\n请输入要恢复的文件路径: "), "文件路径")
                     if file_path:
-                        if self.show_commit_history():
+                        if self.show_file_commits(file_path) or self.show_commit_history():
                             commit_hash = input("\n请输入要恢复到的提交哈希值(直接回车恢复到最新版本): ").strip() or 'HEAD'
+                            preview = self.preview_file(file_path, commit_hash)
+                            if preview is None:
+                                # 目录或该版本中不存在的路径无法预览，是否恢复由 git checkout 决定
+                                print(f"\n无法预览 {commit_hash} 版本中的 {file_path}（可能是目录，或该版本中没有这个文件）")
+                            else:
+                                print(f"\n{commit_hash} 版本的文件预览：")
+                                print(preview)
+                            if input("\n确定恢复到该版本吗？(y/N): ").strip().lower() != 'y':
+                                print("操作已取消")
+                                continue
                             result = self.restore_file(file_path, commit_hash)
                             if result is not None:
                                 print(f"文件 {file_path} 已恢复到 {commit_hash} 版本")
@@ -680,8 +4405,9 @@ Git 管理工具
                     print("仓库中没有文件")
             elif choice == '12h':
                 if self.show_commit_history():
-                    commit_hash = self.validate_input(input("\n请输入要导出的提交哈希值: "), "提交哈希值")
+                    commit_hash = self.validate_input(input("\n请输入要导出的提交哈希值(也可输入 A..B 形式的范围): "), "提交哈希值")
                     if commit_hash:
+                        patch_series = input("是否导出为补丁系列(format-patch，可用 git am 应用)？(y/N): ").strip().lower() == 'y'
                         print("\n导出选项:")
                         print("1. 使用默认文件名 (格式: commit_[哈希值前7位].txt)")
                         print("2. 使用默认文件名 (格式: commit_[哈希值前7位]_changes.md)")
@@ -710,7 +4436,7 @@ Git 管理工具
                                 continue
                         
                         print(f"\n正在导出提交 {commit_hash} 到文件 {filename}...")
-                        result = self.export_commit_to_file(commit_hash, filename)
+                        result = self.export_commit_to_file(commit_hash, filename, patch_series)
                         print(result)
                         
                         # 显示文件大小信息
@@ -720,20 +4446,1066 @@ Git 管理工具
                             print(f"文件路径: {os.path.abspath(filename)}")
             elif choice == '13':
                 print("\n当前仓库中的文件列表：")
-                files = self.list_files()
-                if files:
-                    print(files)
-                else:
+                if not self.print_listing(self.list_files(stream=True)):
                     print("仓库中没有文件")
+            elif choice == '14':
+                remote = input("请输入远程仓库名(默认origin): ").strip() or 'origin'
+                threshold = input("请输入大文件阈值，单位MB(默认使用配置或10MB): ").strip()
+                threshold = self.validate_number(threshold, 10) * 1024 * 1024 if threshold else None
+                flagged, report = self.large_asset_report(remote, threshold)
+                print(report)
+                # 已经提交的大文件无法通过转换工作区文件补救，只对暂存区中的文件提供转换
+                root = self.worktree_root()
+                paths = [item['path'] for item in flagged if item['staged']
+                         and os.path.exists(os.path.join(root, item['path']))]
+                if paths and self.lfs_available() and \
+                        input("\n是否把暂存区中的这些文件交给 git-lfs 管理？(y/N): ").strip().lower() == 'y':
+                    converted = self.convert_to_pointers(paths)
+                    if converted is not None:
+                        print(f"已交给 git-lfs 管理: {len(converted)} 个")
+            elif choice == '15':
+                root = input("请输入工作区根目录(默认当前目录): ").strip() or '.'
+                operation = input("请选择操作 status/fetch/pull/push (默认status): ").strip().lower() or 'status'
+                if operation not in GitWorkspace.OPERATIONS:
+                    print("无效的操作")
+                    continue
+                workspace = GitWorkspace(root, tracer=self.tracer)
+                print(f"\n正在对 {workspace.root} 下的仓库执行 {operation}...")
+                print(GitWorkspace.format_table(workspace.run(operation), operation))
+            elif choice == '16':
+                print(self.tracer.summary())
+                path = input("\n导出为 JSON lines 文件(直接回车跳过): ").strip()
+                if path:
+                    try:
+                        print(f"已导出 {self.tracer.export(path)} 条记录到 {path}")
+                    except OSError as e:
+                        print(f"错误: 导出失败: {e}")
+            elif choice == '17':
+                print("\n发布目标：")
+                print(self.format_publish_targets())
+                name = self.validate_input(input("\n请输入发布目标名称(新名称会创建目标): "), "目标名称")
+                if not name:
+                    continue
+                if name not in self.publish_targets():
+                    path = self.validate_input(input("请输入目标目录或仓库地址: "), "目标路径")
+                    if not path:
+                        continue
+                    source = input("请输入要发布的源目录(默认web，输入 . 表示整个仓库): ").strip() or 'web'
+                    branch = 'gh-pages'
+                    if self.guess_target_kind(path) == 'repo':
+                        branch = input("请输入目标仓库的分支(默认gh-pages): ").strip() or 'gh-pages'
+                    print(self.add_publish_target(name, path, '' if source == '.' else source, branch=branch))
+                full = input("是否完整发布（忽略上次发布记录）？(y/N): ").strip().lower() == 'y'
+                print(self.publish(name, full=full))
+            elif choice == '18':
+                print("\n上次维护：")
+                print(MaintenanceScheduler.format_report(self.read_state(MaintenanceScheduler.STATE)))
+                if self.config_flag('gitmanager.autoMaintenance'):
+                    print("\n后台维护: 已开启（git config gitmanager.autoMaintenance false 可关闭）")
+                else:
+                    print("\n后台维护: 未开启（git config gitmanager.autoMaintenance true 可开启）")
+                if input("\n是否现在执行维护？(y/N): ").strip().lower() == 'y':
+                    print("\n正在维护，请稍候...")
+                    report = self.maintenance.run()
+                    print(MaintenanceScheduler.format_report(report) if report else "后台维护正在进行，请稍后再查看")
             else:
                 print("无效的选择，请重试")
 
             input("\n按回车键继续...")
 
-if __name__ == '__main__':
+
+class WorktreePool:
+    """受管理的 git worktree 池：每个活跃分支一个检出目录
+
+    切换分支时优先复用已有的工作树，只需换目录；池满时回收最久未用的干净工作树，
+    在其中切换分支，只改写有差异的文件；工作区总大小超过上限时删除最久未用的工作树。
+    """
+
+    STATE = 'worktree_pool.json'
+
+    def __init__(self, manager, directory, max_worktrees=4, max_bytes=2 * 1024 * 1024 * 1024):
+        self.manager = manager
+        self.directory = directory
+        self.max_worktrees = max_worktrees
+        self.max_bytes = max_bytes
+
+    def list_worktrees(self):
+        """解析 git worktree list --porcelain，返回 [{'path', 'head', 'branch'}]，第一个是主工作树"""
+        result = self.manager.run_git_process(['git', 'worktree', 'list', '--porcelain'])
+        worktrees = []
+        if result.returncode != 0:
+            return worktrees
+        for block in result.stdout.strip().split('\n\n'):
+            info = {'path': None, 'head': None, 'branch': None}
+            for line in block.splitlines():
+                key, _, value = line.partition(' ')
+                if key == 'worktree':
+                    info['path'] = os.path.normpath(value)
+                elif key == 'HEAD':
+                    info['head'] = value
+                elif key == 'branch':
+                    info['branch'] = value[len('refs/heads/'):] if value.startswith('refs/heads/') else value
+                elif key == 'bare':
+                    info['bare'] = True
+            # 目录已被手动删除的工作树（git 标记为 prunable）视为不存在
+            if info['path'] and os.path.isdir(info['path']):
+                worktrees.append(info)
+        return worktrees
+
+    def load(self):
+        """读取池中的工作树记录，去掉已被删除或不再属于本仓库的目录"""
+        entries = self.manager.read_state(self.STATE, {}).get('worktrees', {})
+        known = {info['path'] for info in self.list_worktrees()}
+        return {path: entry for path, entry in entries.items() if path in known and os.path.isdir(path)}
+
+    def save(self, entries):
+        self.manager.write_state(self.STATE, {'worktrees': entries})
+
+    def find(self, target):
+        """按分支名或目录查找工作树，找不到时返回None"""
+        worktrees = self.list_worktrees()
+        for info in worktrees:
+            if info['branch'] == target:
+                return info
+        if os.path.isdir(target):
+            path = os.path.normpath(os.path.abspath(target))
+            for info in worktrees:
+                if info['path'] == path:
+                    return info
+        return None
+
+    def is_clean(self, path):
+        """工作树中没有任何修改和未跟踪文件时才能安全地切换或删除"""
+        result = self.manager.run_git_process(['git', '-C', path, 'status', '--porcelain'])
+        return result.returncode == 0 and not result.stdout.strip()
+
+    def new_path(self, branch):
+        """为分支选择一个池目录下尚未使用的目录名"""
+        base = os.path.join(self.directory, re.sub(r'[^\w.-]+', '-', branch).strip('-.') or 'worktree')
+        path, suffix = base, 1
+        while os.path.exists(path):
+            suffix += 1
+            path = f'{base}-{suffix}'
+        return path
+
+    def acquire(self, branch, create=False, start_point='HEAD', active=None):
+        """获取检出了 branch 的工作树，返回 (目录, 方式)，失败时返回 (None, 错误信息)
+
+        方式为 existing（已检出，直接使用）、recycled（在回收的工作树中切换分支）
+        或 created（新建工作树）。create=True 时从 start_point 新建分支。
+        active 为当前正在使用的目录，不会被回收或删除。
+        """
+        entries = self.load()
+        if not create:
+            info = self.find(branch)
+            if info is not None:
+                if info['path'] in entries:
+                    entries[info['path']]['used'] = time.time()
+                    self.save(entries)
+                return info['path'], 'existing'
+
+        # 新分支的起点要在当前工作树中解析（各工作树的 HEAD 不同）
+        revision = branch
+        if create:
+            result = self.manager.run_git_process(['git', 'rev-parse', '--verify', '-q', f'{start_point}^{{commit}}'])
+            if result.returncode != 0:
+                return None, f"错误: 无效的起点 {start_point}"
+            revision = result.stdout.strip()
+
+        path, how = None, 'created'
+        if len(entries) >= self.max_worktrees:
+            for candidate, _ in sorted(entries.items(), key=lambda item: item[1]['used']):
+                if candidate != active and self.is_clean(candidate):
+                    path = candidate
+                    break
+            if path is None:
+                return None, "错误: 工作树池已满，且其他工作树都有未提交的修改"
+            command = ['git', '-C', path, 'switch', '-q']
+            command += ['-c', branch, revision] if create else [branch]
+            how = 'recycled'
+        else:
+            # 清理手动删除了目录的工作树记录，否则同名目录无法再次添加
+            self.manager.run_git_process(['git', 'worktree', 'prune'])
+            path = self.new_path(branch)
+            os.makedirs(self.directory, exist_ok=True)
+            command = ['git', 'worktree', 'add', '-q']
+            command += ['-b', branch, path, revision] if create else [path, branch]
+        result = self.manager.run_git_process(command)
+        if result.returncode != 0:
+            return None, f"错误: {result.stderr.strip()}"
+
+        entries.pop(path, None)
+        entries[path] = {'branch': branch, 'used': time.time(), 'bytes': 0}
+        self.trim(entries, keep=(path, active))
+        self.save(entries)
+        return path, how
+
+    def trim(self, entries, keep=()):
+        """工作区总大小超过上限时，按最久未用的顺序删除干净的工作树
+
+        工作树在使用过程中会变大（构建产物、新文件），每次都重新统计大小。
+        """
+        for path, entry in entries.items():
+            entry['bytes'] = GitManager.disk_usage(path)[1]
+        total = sum(entry['bytes'] for entry in entries.values())
+        for path, entry in sorted(entries.items(), key=lambda item: item[1]['used']):
+            if total <= self.max_bytes:
+                break
+            if path in keep or not self.is_clean(path):
+                continue
+            if self.manager.run_git_process(['git', 'worktree', 'remove', path]).returncode == 0:
+                total -= entry['bytes']
+                del entries[path]
+        return entries
+
+    def remove(self, target, force=False):
+        """从池中删除工作树（分支本身保留），返回说明"""
+        info = self.find(target)
+        entries = self.load()
+        if info is None or info['path'] not in entries:
+            return OperationResult(f"错误: 池中没有工作树 {target}", ok=False)
+        command = ['git', 'worktree', 'remove'] + (['--force'] if force else []) + [info['path']]
+        result = self.manager.run_git_process(command)
+        if result.returncode != 0:
+            return OperationResult(f"错误: {result.stderr.strip()}", ok=False)
+        del entries[info['path']]
+        self.save(entries)
+        return OperationResult(f"已删除工作树 {info['path']}")
+
+    def format(self, active=None):
+        """列出所有工作树，池中的显示大小和最近使用时间"""
+        entries = self.load()
+        lines = [f"工作树池: {self.directory}（最多 {self.max_worktrees} 个，"
+                 f"上限 {GitManager.format_size(self.max_bytes)}）"]
+        for info in self.list_worktrees():
+            if info.get('bare'):
+                continue
+            mark = '*' if info['path'] == active else ' '
+            entry = entries.get(info['path'])
+            detail = '主工作树' if entry is None else (
+                f"{GitManager.format_size(entry.get('bytes', 0))}，"
+                f"{time.strftime('%m-%d %H:%M', time.localtime(entry['used']))} 使用")
+            lines.append(f"{mark} {info['branch'] or '(分离HEAD)':<24} {info['path']}  {detail}")
+        return '\n'.join(lines)
+
+
+class MaintenanceScheduler:
+    """后台仓库维护：在工具空闲时，按时间和 IO 预算依次执行维护任务
+
+    任务包括带修改路径 Bloom 过滤器的增量 commit-graph、multi-pack-index、
+    基于 multi-pack-index 的增量重新打包，以及打包和清理松散对象。
+    git 进程以低优先级运行；菜单操作进行时不会开始新的任务。
+    时间预算用完后不再开始新的任务，正在执行的任务会正常结束（中止 repack 会留下临时 pack 文件）。
+    交互式菜单只在配置了 gitmanager.autoMaintenance=true 时才在后台维护。
+    """
+
+    STATE = 'maintenance.json'
+    LOOSE_THRESHOLD = 100
+    PACK_THRESHOLD = 10
+
+    def __init__(self, manager, time_budget=30.0, io_budget=256 * 1024 * 1024, idle_seconds=2.0,
+                 min_interval=3600):
+        self.manager = manager
+        self.time_budget = time_budget
+        self.io_budget = io_budget
+        self.idle_seconds = idle_seconds
+        self.min_interval = min_interval
+        self.report = None
+        self._idle = threading.Event()
+        self._idle.set()
+        self._idle_since = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._prefix = None
+        self._running = threading.Lock()
+        # 维护开始时记下的仓库目录：主线程切换工作树会修改 manager.repo_path，后台线程不读取它
+        self.repo_path = None
+
+    def mark_busy(self):
+        """用户开始一个操作"""
+        self._idle.clear()
+
+    def mark_idle(self):
+        """用户回到菜单等待输入"""
+        self._idle_since = time.monotonic()
+        self._idle.set()
+
+    def wait_idle(self):
+        """等待工具空闲至少 idle_seconds 秒，收到停止信号时返回False"""
+        while not self._stop.is_set():
+            if not self._idle.wait(0.5):
+                continue
+            remaining = self._idle_since + self.idle_seconds - time.monotonic()
+            if remaining <= 0:
+                return True
+            self._stop.wait(min(remaining, 0.5))
+        return False
+
+    def is_due(self):
+        """距上次维护是否已超过 min_interval 秒"""
+        state = self.manager.read_state(self.STATE, {})
+        return time.time() - state.get('time', 0) >= self.min_interval
+
+    def start(self):
+        """配置了 gitmanager.autoMaintenance=true 且到期时在后台线程中开始维护，返回是否启动"""
+        if self._thread is not None:
+            return False
+        if self.manager.run_git_process(['git', 'rev-parse', '--git-dir']).returncode != 0:
+            return False
+        if self.manager.config_flag('gitmanager.autoMaintenance') is not True:
+            return False
+        # 在调用方线程中确定状态目录，后台线程不再访问原生引擎
+        if self.manager.state_dir() is None or not self.is_due():
+            return False
+        repo_path = self.manager.repo_path or os.getcwd()
+        self._thread = threading.Thread(target=self.run, kwargs={'wait': True, 'repo_path': repo_path}, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """请求后台维护在当前任务结束后停止"""
+        self._stop.set()
+
+    def low_priority(self, command):
+        """为维护命令加上 nice/ionice 前缀，降低 CPU 和 IO 优先级"""
+        if self._prefix is None:
+            self._prefix = []
+            if shutil.which('nice'):
+                self._prefix += ['nice', '-n', '19']
+            if sys.platform.startswith('linux') and shutil.which('ionice'):
+                self._prefix += ['ionice', '-c', '3']
+        return self._prefix + command
+
+    def git_process(self, command, timeout=None):
+        """在维护开始时的仓库目录中执行 git 命令"""
+        return self.manager.run_git_process(command, timeout, cwd=self.repo_path)
+
+    def git_output(self, command):
+        """静默执行 git 命令并返回输出，失败时返回空字符串（后台线程中不打印错误）"""
+        result = self.git_process(command)
+        return result.stdout if result.returncode == 0 else ''
+
+    def object_stats(self):
+        """解析 git count-objects -v，大小换算为字节"""
+        output = self.git_output(['git', 'count-objects', '-v'])
+        stats = {}
+        for line in output.splitlines():
+            key, _, value = line.partition(':')
+            try:
+                stats[key.strip()] = int(value.strip())
+            except ValueError:
+                continue
+        for key in ('size', 'size-pack', 'size-garbage'):
+            stats[key] = stats.get(key, 0) * 1024
+        return stats
+
+    def pack_dir(self):
+        """对象库的 pack 目录"""
+        output = self.git_output(['git', 'rev-parse', '--git-path', 'objects/pack'])
+        # 输出相对于执行 git 的目录；直接调用 plan() 时还没有记下维护目录，git 在 manager 的目录中执行
+        base = self.repo_path or self.manager.repo_path or os.getcwd()
+        return os.path.join(base, output.strip()) if output else None
+
+    def refs_fingerprint(self):
+        """所有引用指向的摘要，用来判断 commit-graph 是否需要更新"""
+        output = self.git_output(['git', 'for-each-ref', '--format=%(objectname)'])
+        head = self.git_output(['git', 'rev-parse', '-q', '--verify', 'HEAD'])
+        return hashlib.sha1((output + head).encode('utf-8')).hexdigest()
+
+    def plan(self):
+        """根据对象库现状生成需要执行的任务 [(名称, 命令, 预计 IO 字节数)]"""
+        git = self.manager.git
+        state = self.manager.read_state(self.STATE, {})
+        stats = self.object_stats()
+        tasks = []
+
+        fingerprint = self.refs_fingerprint()
+        if git.at_least(2, 27) and state.get('refs') != fingerprint:
+            # --split 只为新提交追加一层，不必重写整个 commit-graph
+            tasks.append(('commit-graph', ['git', 'commit-graph', 'write', '--reachable', '--split',
+                                           '--changed-paths'], 0))
+
+        if stats.get('count', 0) >= self.LOOSE_THRESHOLD:
+            tasks.append(('loose-objects', ['git', 'repack', '-d', '-l', '-q', '--no-write-bitmap-index'],
+                          stats.get('size', 0)))
+
+        pack_dir = self.pack_dir()
+        packs = stats.get('packs', 0)
+        if pack_dir and git.at_least(2, 23) and packs >= 2:
+            midx = os.path.join(pack_dir, 'multi-pack-index')
+            try:
+                names = os.listdir(pack_dir)
+                newest = max(os.path.getmtime(os.path.join(pack_dir, name)) for name in names if name.endswith('.idx'))
+                sizes = sorted(os.path.getsize(os.path.join(pack_dir, name)) for name in names if name.endswith('.pack'))
+            except (OSError, ValueError):
+                newest, sizes = 0, []
+            if not os.path.exists(midx) or os.path.getmtime(midx) < newest:
+                tasks.append(('multi-pack-index', ['git', 'multi-pack-index', 'write'], 0))
+            if packs >= self.PACK_THRESHOLD and len(sizes) >= 2:
+                # 与 git maintenance 的 incremental-repack 相同：先删除已被合并的 pack，再合并小 pack；
+                # 批次为除最大 pack 外的总大小，最大的 pack 不会被重写
+                tasks.append(('expire-packs', ['git', 'multi-pack-index', 'expire'], 0))
+                tasks.append(('incremental-repack', ['git', 'multi-pack-index', 'repack'], sum(sizes[:-1])))
+        return tasks, fingerprint, stats
+
+    def measure_reads(self, repeat=3):
+        """测量常用读操作的耗时（毫秒，取中位数），它们会受 commit-graph 和 pack 数量影响"""
+        top = self.git_output(['git', 'ls-tree', '--name-only', 'HEAD']).split('\n')[0]
+        operations = {
+            'rev-list --count HEAD': ['git', 'rev-list', '--count', 'HEAD'],
+            'log -50': ['git', 'log', '-50', '--format=%H'],
+            'cat-file HEAD^{tree}': ['git', 'cat-file', '-p', 'HEAD^{tree}'],
+        }
+        if top:
+            label = top if len(top) <= 20 else top[:17] + '...'
+            operations[f'log -1 -- {label}'] = ['git', 'log', '-1', '--format=%H', '--', top]
+        if self.git_process(['git', 'rev-parse', '-q', '--verify', '@{upstream}']).returncode == 0:
+            operations['rev-list @{upstream}..HEAD'] = ['git', 'rev-list', '@{upstream}..HEAD']
+        timings = {}
+        for name, command in operations.items():
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = self.git_process(command)
+                samples.append((time.perf_counter() - start) * 1000)
+                if result.returncode != 0:
+                    break
+            else:
+                timings[name] = sorted(samples)[len(samples) // 2]
+        return timings
+
+    def run(self, wait=False, repo_path=None):
+        """执行一次维护并返回报告；wait=True 时只在工具空闲时开始每个任务，已有维护在进行时返回None
+
+        在后台线程中运行时 repo_path 由启动它的线程传入，否则使用 manager 当前的仓库目录。
+        """
+        if repo_path is None:
+            repo_path = self.manager.repo_path
+        if wait and not self.wait_idle():
+            return None
+        if not self._running.acquire(blocking=False):
+            return None
+        self.repo_path = repo_path
+        tracer = self.manager.tracer
+        tracer.set_thread_action('maintenance:plan')
+        try:
+            return self._run(wait)
+        finally:
+            tracer.set_thread_action(None)
+            self._running.release()
+
+    def _run(self, wait):
+        started = time.monotonic()
+        tasks, fingerprint, stats = self.plan()
+        report = {'time': time.time(), 'tasks': [], 'before': {}, 'after': {}, 'objects': stats}
+        if not tasks:
+            report['refs'] = fingerprint
+            self.manager.write_state(self.STATE, report)
+            self.report = report
+            return report
+
+        tracer = self.manager.tracer
+        tracer.set_thread_action('maintenance:measure')
+        report['before'] = self.measure_reads()
+        io_used = 0
+        completed = True
+        for name, command, io_cost in tasks:
+            if wait and not self.wait_idle():
+                completed = False
+                break
+            remaining = self.time_budget - (time.monotonic() - started)
+            if remaining <= 0:
+                report['tasks'].append({'name': name, 'status': '超出时间预算，跳过', 'ok': False})
+                completed = False
+                continue
+            if name == 'incremental-repack':
+                # 增量重新打包一次最多处理剩余 IO 预算大小的 pack
+                io_cost = min(io_cost, self.io_budget - io_used)
+                if io_cost <= 0:
+                    report['tasks'].append({'name': name, 'status': '超出IO预算，跳过', 'ok': False})
+                    completed = False
+                    continue
+                command = command + [f'--batch-size={io_cost}']
+            elif io_used + io_cost > self.io_budget:
+                report['tasks'].append({'name': name, 'status': '超出IO预算，跳过', 'ok': False})
+                completed = False
+                continue
+            start = time.perf_counter()
+            tracer.set_thread_action(f'maintenance:{name}')
+            # 不设超时：已经开始的任务即使超出预算也让它完成
+            result = self.git_process(self.low_priority(command))
+            ok = result.returncode == 0
+            status = '完成' if ok else f"失败: {result.stderr.strip()}"
+            io_used += io_cost
+            report['tasks'].append({'name': name, 'status': status, 'ok': ok,
+                                    'ms': round((time.perf_counter() - start) * 1000, 1)})
+
+        # 还有大量松散对象（多为不可达对象）时清理两周前的
+        tracer.set_thread_action('maintenance:plan')
+        after_stats = self.object_stats()
+        if after_stats.get('count', 0) >= self.LOOSE_THRESHOLD and time.monotonic() - started < self.time_budget:
+            tracer.set_thread_action('maintenance:prune-loose')
+            start = time.perf_counter()
+            result = self.git_process(self.low_priority(['git', 'prune', '--expire=2.weeks.ago']))
+            ok = result.returncode == 0
+            status = '完成' if ok else f"失败: {result.stderr.strip()}"
+            report['tasks'].append({'name': 'prune-loose', 'status': status, 'ok': ok,
+                                    'ms': round((time.perf_counter() - start) * 1000, 1)})
+            after_stats = self.object_stats()
+
+        tracer.set_thread_action('maintenance:measure')
+        report['after'] = self.measure_reads()
+        report['objects_after'] = after_stats
+        if completed:
+            report['refs'] = fingerprint
+        else:
+            # 没有全部完成时保留上次的引用摘要，下次继续
+            report['refs'] = self.manager.read_state(self.STATE, {}).get('refs')
+        self.manager.write_state(self.STATE, report)
+        # pack 文件可能已变化，让原生引擎下次使用前重新加载
+        self.manager.refresh_native_store()
+        self.report = report
+        return report
+
+    @staticmethod
+    def format_report(report):
+        """把维护报告渲染为文本"""
+        if not report:
+            return "还没有维护记录"
+        lines = [f"维护时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(report['time']))}"]
+        if not report['tasks']:
+            lines.append("对象库状态良好，没有需要执行的任务")
+        for task in report['tasks']:
+            cost = f"（{task['ms']:.0f} ms）" if 'ms' in task else ''
+            lines.append(f"  {task['name']}: {task['status']}{cost}")
+        objects = report.get('objects', {})
+        after = report.get('objects_after')
+        if after:
+            lines.append(f"松散对象 {objects.get('count', 0)} → {after.get('count', 0)}，"
+                         f"pack 文件 {objects.get('packs', 0)} → {after.get('packs', 0)}")
+        if report['before']:
+            lines.append("\n读操作耗时（毫秒）:")
+            lines.append(f"  {'操作':<32}{'维护前':>10}{'维护后':>10}")
+            for name, before in report['before'].items():
+                now = report['after'].get(name)
+                lines.append(f"  {name:<32}{before:>10.1f}{now if now is None else format(now, '.1f'):>10}")
+        return '\n'.join(lines)
+
+
+class GitWorkspace:
+    """多仓库工作区：发现根目录下的所有仓库，并在线程池中并行执行状态/获取/拉取/推送"""
+
+    OPERATIONS = ('status', 'fetch', 'pull', 'push')
+
+    def __init__(self, root, max_workers=8, tracer=None):
+        self.root = os.path.abspath(root)
+        self.max_workers = max_workers
+        # 所有仓库共用一个 tracer，便于汇总整个工作区的耗时
+        self.tracer = tracer if tracer is not None else GitTracer.from_env()
+
+    def discover(self):
+        """递归查找根目录下的仓库（包含 .git 目录或 .git 文件的目录）"""
+        repos = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if '.git' in dirnames or '.git' in filenames:
+                repos.append(dirpath)
+            # 不进入 .git 目录本身，但继续查找嵌套的仓库
+            dirnames[:] = sorted(name for name in dirnames if name != '.git')
+        return repos
+
+    def _run_one(self, repo_path, operation):
+        """在单个仓库上执行操作，返回表格中的一行"""
+        start = time.perf_counter()
+        manager = GitManager(repo_path=repo_path, tracer=self.tracer)
+        row = {'repo': os.path.relpath(repo_path, self.root), 'branch': '-', 'ok': True, 'summary': ''}
+        try:
+            # 损坏的仓库在这里就可能出错，也要作为失败的一行返回，不能中断整个工作区
+            row['branch'] = manager.current_branch() or '-'
+            if operation == 'status':
+                branch, entries = manager.status_entries()
+                counts = manager.status_counts(entries)
+                ahead_behind = (branch or {}).get('branch.ab', '')
+                row['ok'] = branch is not None
+                row['summary'] = (f"暂存 {counts['staged']} 修改 {counts['unstaged']} "
+                                  f"未跟踪 {counts['untracked']} 冲突 {counts['unmerged']} {ahead_behind}").strip()
+            else:
+                command = {'fetch': ['git', 'fetch', '--all'], 'pull': ['git', 'pull'],
+                           'push': ['git', 'push']}[operation]
+                result = manager.run_git_process(command)
+                row['ok'] = result.returncode == 0
+                lines = (result.stdout + result.stderr).strip().splitlines()
+                row['summary'] = lines[-1].strip() if lines else '完成'
+        except Exception as e:
+            row['ok'] = False
+            row['summary'] = str(e)
+        finally:
+            manager.close()
+        row['elapsed'] = time.perf_counter() - start
+        return row
+
+    def run(self, operation, repos=None):
+        """在所有仓库上并行执行操作，返回结果行列表（按仓库路径排序）"""
+        from concurrent.futures import ThreadPoolExecutor
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"不支持的操作: {operation}")
+        repos = self.discover() if repos is None else repos
+        if not repos:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(repos)))) as pool:
+            return list(pool.map(lambda repo: self._run_one(repo, operation), repos))
+
+    @staticmethod
+    def format_table(rows, operation):
+        """把结果行渲染为紧凑的汇总表"""
+        if not rows:
+            return "没有找到任何仓库"
+        repo_width = max(len('仓库'), max(len(row['repo']) for row in rows))
+        branch_width = max(len('分支'), max(len(row['branch']) for row in rows))
+        lines = [f"{'仓库'.ljust(repo_width)}  {'分支'.ljust(branch_width)}  结果  耗时      {operation}",
+                 '-' * (repo_width + branch_width + 30)]
+        for row in rows:
+            mark = '✅' if row['ok'] else '❌'
+            lines.append(f"{row['repo'].ljust(repo_width)}  {row['branch'].ljust(branch_width)}  {mark}   "
+                         f"{row['elapsed']:6.2f}s  {row['summary']}")
+        failed = sum(1 for row in rows if not row['ok'])
+        lines.append(f"共 {len(rows)} 个仓库，失败 {failed} 个")
+        return '\n'.join(lines)
+
+
+class AsyncGitManager:
+    """基于 asyncio 子进程的异步 Git 管理器
+
+    适合在异步服务中同时驱动多个仓库：每个实例绑定一个仓库路径，
+    用信号量限制该仓库的并发 git 进程数；超时或任务被取消时会结束子进程。
+    """
+
+    def __init__(self, repo_path='.', max_concurrency=4, timeout=None):
+        self.repo_path = os.path.abspath(repo_path)
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        # 信号量绑定到事件循环，在执行命令时（已处于事件循环中）按当前循环创建
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._env = None
+
+    # 与同步版本使用同一份子进程环境
+    git_env = GitManager.git_env
+
+    async def run_git(self, args, timeout=None, stdout=None):
+        """执行 git 子命令，返回 (退出码, 标准输出, 错误输出)
+
+        超时抛出 asyncio.TimeoutError，被取消时抛出 CancelledError，两种情况都会先结束子进程。
+        stdout 可以传入已打开的文件，输出直接写入文件描述符。
+        """
+        import asyncio
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        async with self._semaphore:
+            process = await asyncio.create_subprocess_exec(
+                'git', *args,
+                cwd=self.repo_path,
+                stdout=stdout if stdout is not None else asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=self.git_env(),
+                # 放在独立的进程组中，结束时连同 ssh/remote-https 等孙进程一起结束
+                start_new_session=(os.name == 'posix')
+            )
+            try:
+                out, err = await asyncio.wait_for(process.communicate(), timeout)
+            except BaseException:
+                # 超时或被取消：结束整个进程组并回收，避免留下僵尸进程
+                self._kill(process)
+                await process.wait()
+                raise
+        return (process.returncode,
+                (out or b'').decode('utf-8', errors='replace'),
+                (err or b'').decode('utf-8', errors='replace'))
+
+    @staticmethod
+    def _kill(process):
+        try:
+            if os.name == 'posix':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def run_git_command(self, args, timeout=None):
+        """执行 git 子命令并返回输出，失败或超时时打印错误并返回None"""
+        import asyncio
+        try:
+            code, out, err = await self.run_git(args, timeout)
+        except asyncio.TimeoutError:
+            print(f"错误: [{self.repo_path}] git {' '.join(args)} 执行超时")
+            return None
+        if code != 0:
+            print(f"错误: [{self.repo_path}] {err}")
+            return None
+        return out
+
+    async def status(self):
+        """查看仓库状态"""
+        return await self.run_git_command(['status'])
+
+    async def log(self, num_entries=5):
+        """查看提交历史"""
+        return await self.run_git_command(['log', f'-{num_entries}', '--oneline'])
+
+    async def fetch(self, remote='origin'):
+        """获取远程更新"""
+        return await self.run_git_command(['fetch', remote])
+
+    async def pull(self):
+        """拉取远程更新"""
+        return await self.run_git_command(['pull'])
+
+    async def current_branch(self):
+        output = await self.run_git_command(['branch', '--show-current'])
+        return output.strip() if output and output.strip() else None
+
+    async def push(self, remote='origin', branch=''):
+        """推送到远程仓库"""
+        branch = branch or await self.current_branch()
+        if not branch:
+            return None
+        return await self.run_git_command(['push', remote, branch])
+
+    async def get_unpushed_commits(self, remote='origin', branch=''):
+        """获取未推送到远程的提交（从旧到新）"""
+        branch = branch or await self.current_branch()
+        if not branch:
+            return None, "无法获取当前分支"
+        await self.fetch(remote)
+        output = await self.run_git_command(
+            ['log', '-z', f'--format=%x1e{GitManager.LOG_FIELDS}', f'{remote}/{branch}..HEAD', '--'])
+        records = [GitManager._parse_commit_record(raw, False, False)
+                   for raw in (output or '').split('\x1e') if raw]
+        if not records:
+            return [], "没有未推送的提交"
+        return [record.as_dict() for record in reversed(records)], None
+
+    async def batch_push(self, remote='origin', branch='', batch_size=1):
+        """分批次推送（非交互式），失败时停止"""
+        branch = branch or await self.current_branch()
+        commits, error = await self.get_unpushed_commits(remote, branch)
+        if error:
+            return error
+        pushed = 0
+        for start in range(0, len(commits), batch_size):
+            batch = commits[start:start + batch_size]
+            if await self.run_git_command(['push', remote, f"{batch[-1]['oid']}:{branch}"]) is None:
+                break
+            pushed += len(batch)
+        return f"分批次推送完成，成功: {pushed}，失败: {len(commits) - pushed}"
+
+    async def export(self, commit_hash, filename, patch_series=False):
+        """导出提交详情到文件（二进制直写）"""
+        import asyncio
+        if patch_series:
+            args = ['format-patch', '--stdout', '--binary']
+            args += [commit_hash] if '..' in commit_hash else ['-1', commit_hash]
+        else:
+            args = ['show', '--binary', commit_hash]
+        try:
+            with open(filename, 'wb') as f:
+                code, _, err = await self.run_git(args, stdout=f)
+        except asyncio.TimeoutError:
+            return "导出失败: 执行超时"
+        if code != 0:
+            return f"导出失败: {err}"
+        return f"提交 {commit_hash} 的详细信息已成功导出到文件: {filename}"
+
+    @classmethod
+    async def run_on_repos(cls, repo_paths, operation, *args, max_concurrency=4, timeout=None, **kwargs):
+        """在多个仓库上并发执行同一个操作，返回 {仓库路径: 结果}"""
+        import asyncio
+        managers = [cls(path, max_concurrency, timeout) for path in repo_paths]
+        results = await asyncio.gather(
+            *(getattr(manager, operation)(*args, **kwargs) for manager in managers),
+            return_exceptions=True)
+        return {manager.repo_path: result for manager, result in zip(managers, results)}
+
+
+def build_arg_parser():
+    """构造非交互式命令行的参数解析器"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='git_manager.py',
+        description='Git 管理工具。不带参数运行时进入交互式菜单。')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='把每次 git 调用的耗时记录追加到 JSON lines 文件（也可用环境变量 GIT_MANAGER_TRACE）')
+    parser.add_argument('--trace2', action='store_true',
+                        help='通过 GIT_TRACE2_EVENT 收集 git 内部各阶段耗时并合并到记录中')
+    parser.add_argument('--trace-summary', action='store_true', help='结束时在标准错误输出最慢的 git 调用')
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('menu', help='进入交互式菜单')
+    status_parser = subparsers.add_parser('status', help='查看仓库状态')
+    status_parser.add_argument('--worktree', metavar='BRANCH|DIR', help='查看指定工作树的状态')
+
+    log_parser = subparsers.add_parser('log', help='查看提交历史')
+    log_parser.add_argument('-n', '--num', type=int, default=5, help='提交数量（默认5）')
+    log_parser.add_argument('--detailed', action='store_true', help='显示详细的文件变更统计')
+    log_parser.add_argument('--worktree', metavar='BRANCH|DIR', help='查看指定工作树的提交历史')
+
+    show_parser = subparsers.add_parser('show', help='查看特定提交')
+    show_parser.add_argument('commit')
+
+    subparsers.add_parser('files', help='列出仓库文件')
+
+    history_parser = subparsers.add_parser('history', help='查看文件的修改历史')
+    history_parser.add_argument('path')
+
+    add_parser = subparsers.add_parser('add', help='添加文件到暂存区')
+    add_parser.add_argument('paths', nargs='*', default=['.'])
+    add_parser.add_argument('--optimize-images', action='store_true', default=None,
+                            help='添加后优化暂存的图片（默认按 gitmanager.optimizeImages 配置）')
+
+    unstage_parser = subparsers.add_parser('unstage', help='撤销添加到暂存区的文件')
+    unstage_parser.add_argument('paths', nargs='*', default=['.'])
+
+    commit_parser = subparsers.add_parser('commit', help='提交更改')
+    commit_parser.add_argument('-m', '--message', required=True)
+    commit_parser.add_argument('--optimize-images', action='store_true', default=None,
+                               help='提交前优化暂存的图片（默认按 gitmanager.optimizeImages 配置）')
+
+    optimize_parser = subparsers.add_parser('optimize-images', help='优化暂存区中的图片')
+    optimize_parser.add_argument('--jobs', type=int, help='并行进程数（默认CPU核数）')
+
+    push_parser = subparsers.add_parser('push', help='推送到远程仓库')
+    push_parser.add_argument('--remote', default='origin')
+    push_parser.add_argument('--branch', default='')
+    push_parser.add_argument('--all-remotes', nargs='*', metavar='REMOTE',
+                             help='并行推送到多个远程仓库（不写远程名表示全部）')
+    push_parser.add_argument('--worktree', metavar='BRANCH|DIR', help='推送指定工作树检出的分支')
+
+    switch_parser = subparsers.add_parser('switch', help='切换分支（可使用工作树池）')
+    switch_parser.add_argument('branch')
+    switch_parser.add_argument('-c', '--create', action='store_true', help='从当前 HEAD 创建新分支')
+    switch_parser.add_argument('--worktree', action='store_true', default=None,
+                               help='在工作树池中打开（默认按 gitmanager.useWorktrees 配置）')
+    switch_parser.add_argument('--no-worktree', dest='worktree', action='store_false', help='在当前目录中 checkout')
+
+    worktrees_parser = subparsers.add_parser('worktrees', help='查看或清理工作树池')
+    worktrees_parser.add_argument('--remove', metavar='BRANCH|DIR', help='删除池中的工作树（分支保留）')
+    worktrees_parser.add_argument('--force', action='store_true', help='删除有未提交修改的工作树')
+
+    fetch_parser = subparsers.add_parser('fetch', help='并行获取远程仓库的更新')
+    fetch_parser.add_argument('remotes', nargs='*', help='远程仓库名（默认全部）')
+
+    batch_parser = subparsers.add_parser('batch-push', help='分批次推送')
+    batch_parser.add_argument('--remote', default='origin')
+    batch_parser.add_argument('--branch', default='')
+    batch_parser.add_argument('--batch-size', type=int, default=1)
+    batch_parser.add_argument('--adaptive', action='store_true', help='按提交大小和实测速度自动调整批次')
+    batch_parser.add_argument('--target-seconds', type=float, default=20.0)
+    batch_parser.add_argument('--no-resume', action='store_true', help='忽略未完成的断点记录')
+
+    subparsers.add_parser('clear-journal', help='清除分批次推送断点记录')
+
+    export_parser = subparsers.add_parser('export', help='导出提交详情到文件')
+    export_parser.add_argument('commit', help='提交哈希值或 A..B 范围')
+    export_parser.add_argument('filename')
+    export_parser.add_argument('--patch-series', action='store_true', help='导出 format-patch 补丁系列')
+
+    clone_parser = subparsers.add_parser('clone', help='克隆仓库（支持部分克隆、浅克隆和稀疏检出）')
+    clone_parser.add_argument('url', help='仓库地址、file:// 地址或本地路径')
+    clone_parser.add_argument('directory', nargs='?')
+    clone_parser.add_argument('--profile', choices=sorted(GitManager.CLONE_PROFILES), default='full')
+    clone_parser.add_argument('--depth', type=int, help='浅克隆的提交数')
+    clone_parser.add_argument('--since', help='浅克隆只下载该日期之后的历史')
+    clone_parser.add_argument('--sparse', nargs='+', metavar='DIR', help='稀疏检出保留的目录（默认web）')
+    clone_parser.add_argument('--branch', help='要检出的分支')
+
+    publish_parser = subparsers.add_parser('publish', help='增量发布网站到目录或仓库（不写目标时列出所有目标）')
+    publish_parser.add_argument('target', nargs='?')
+    publish_parser.add_argument('--path', help='设置目标目录或仓库地址（会创建或更新目标）')
+    publish_parser.add_argument('--source', default='web', help='要发布的源目录（默认web，. 表示整个仓库）')
+    publish_parser.add_argument('--kind', choices=('dir', 'repo'), help='目标类型（默认自动判断）')
+    publish_parser.add_argument('--branch', default='gh-pages', help='仓库目标的分支（默认gh-pages）')
+    publish_parser.add_argument('--rev', default='HEAD', help='要发布的版本（默认HEAD）')
+    publish_parser.add_argument('--jobs', type=int, default=8, help='并行数（默认8）')
+    publish_parser.add_argument('--full', action='store_true', help='忽略上次发布记录，完整发布')
+
+    maintenance_parser = subparsers.add_parser('maintenance', help='维护对象库并对比维护前后的读操作耗时')
+    maintenance_parser.add_argument('--time-budget', type=float, default=30.0, help='时间预算，秒（默认30）')
+    maintenance_parser.add_argument('--io-budget', type=int, default=256, help='重新打包的 IO 预算，MB（默认256）')
+    maintenance_parser.add_argument('--dry-run', action='store_true', help='只列出需要执行的任务')
+
+    workspace_parser = subparsers.add_parser('workspace', help='在根目录下的所有仓库上并行执行操作')
+    workspace_parser.add_argument('operation', choices=GitWorkspace.OPERATIONS)
+    workspace_parser.add_argument('root', nargs='?', default='.')
+    workspace_parser.add_argument('--jobs', type=int, default=8, help='并行数（默认8）')
+
+    script_parser = subparsers.add_parser('script', help='在同一进程中依次执行文件（或标准输入）中的多条命令')
+    script_parser.add_argument('file', nargs='?', default='-', help='命令文件，默认读取标准输入')
+    script_parser.add_argument('--stop-on-error', action='store_true', help='遇到失败时停止执行')
+    return parser
+
+
+def run_cli_command(manager, args):
+    """执行一条解析后的命令，返回是否成功"""
+    command = args.command
+    manager.tracer.action = f'cli:{command}'
+    if command == 'status':
+        result = manager.status(args.worktree)
+    elif command == 'log':
+        if args.worktree:
+            if args.detailed:
+                print("错误: --detailed 不能与 --worktree 一起使用")
+                return False
+            lines = manager.log(args.num, stream=True, worktree=args.worktree)
+            return lines is not None and manager.print_listing(lines)
+        if args.detailed:
+            return manager.print_listing(manager.log_detailed(args.num, stream=True))
+        return manager.print_listing(manager.log(args.num, stream=True))
+    elif command == 'show':
+        stream = manager.show_commit(args.commit, stream=True)
+        return stream is not None and manager.print_stream(stream)
+    elif command == 'files':
+        return manager.print_listing(manager.list_files(stream=True))
+    elif command == 'history':
+        return manager.print_stream(manager.file_history(args.path, stream=True))
+    elif command == 'add':
+        result = manager.add_files(args.paths, args.optimize_images)
+    elif command == 'unstage':
+        result = manager.unstage_files(args.paths)
+    elif command == 'commit':
+        result = manager.commit(args.message, args.optimize_images)
+    elif command == 'optimize-images':
+        result = manager.optimize_staged_images(args.jobs)
+    elif command == 'push':
+        if args.all_remotes is not None:
+            results = manager.push_remotes(args.all_remotes, args.branch)
+            print(manager.format_remote_results(results, "并行推送"))
+            return bool(results) and all(r['ok'] for r in results.values())
+        result = manager.push(args.remote, args.branch, args.worktree)
+    elif command == 'fetch':
+        results = manager.fetch_remotes(args.remotes)
+        print(manager.format_remote_results(results, "并行获取"))
+        return bool(results) and all(r['ok'] for r in results.values())
+    elif command == 'batch-push':
+        result = manager.batch_push(args.remote, args.branch, max(1, args.batch_size),
+                                    adaptive=args.adaptive, interactive=False,
+                                    target_seconds=args.target_seconds, resume=not args.no_resume)
+    elif command == 'workspace':
+        rows = GitWorkspace(args.root, args.jobs, tracer=manager.tracer).run(args.operation)
+        print(GitWorkspace.format_table(rows, args.operation))
+        return bool(rows) and all(row['ok'] for row in rows)
+    elif command == 'clone':
+        url = manager.validate_url(args.url)
+        if url is None:
+            return False
+        result = manager.clone_repository(url, args.directory, args.profile, args.depth, args.since,
+                                          args.sparse, args.branch)
+    elif command == 'publish':
+        if not args.target:
+            print(manager.format_publish_targets())
+            return True
+        if args.path:
+            source = '' if args.source == '.' else args.source
+            print(manager.add_publish_target(args.target, args.path, source, args.kind, args.branch))
+        result = manager.publish(args.target, args.rev, args.jobs, args.full)
+    elif command == 'maintenance':
+        scheduler = MaintenanceScheduler(manager, args.time_budget, args.io_budget * 1024 * 1024)
+        if args.dry_run:
+            tasks = scheduler.plan()[0]
+            print('\n'.join(' '.join(task[1]) for task in tasks) if tasks else "对象库状态良好，没有需要执行的任务")
+            return True
+        report = scheduler.run()
+        print(MaintenanceScheduler.format_report(report))
+        return all(task['ok'] for task in report['tasks'])
+    elif command == 'switch':
+        if args.create:
+            result = manager.create_branch(args.branch, args.worktree)
+        else:
+            result = manager.switch_branch(args.branch, args.worktree)
+    elif command == 'worktrees':
+        pool = manager.worktree_pool()
+        if args.remove:
+            result = pool.remove(args.remove, args.force)
+        else:
+            print(pool.format(manager.worktree_root()))
+            return True
+    elif command == 'clear-journal':
+        result = manager.clear_batch_journal()
+    elif command == 'export':
+        result = manager.export_commit_to_file(args.commit, args.filename, args.patch_series)
+    else:
+        print(f"未知命令: {command}")
+        return False
+
+    if result is not None:
+        print(result)
+    # 方法返回 OperationResult 时按其成功标志，否则 None 表示失败
+    return result is not None and getattr(result, 'ok', True)
+
+
+def run_script(manager, parser, lines, stop_on_error=False):
+    """在同一个进程中依次执行多条命令（每行一条，# 开头为注释），返回失败的条数"""
+    failures = 0
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            args = parser.parse_args(shlex.split(line))
+        except SystemExit:
+            # argparse 在参数错误时会退出，脚本模式下只记为失败
+            args = None
+        except ValueError as e:
+            print(f"第 {line_no} 行解析失败: {e}")
+            args = None
+        if args is not None and args.command in (None, 'menu', 'script'):
+            print(f"第 {line_no} 行: 脚本中不支持该命令")
+            args = None
+        ok = args is not None and run_cli_command(manager, args)
+        if not ok:
+            failures += 1
+            print(f"第 {line_no} 行执行失败: {line}")
+            if stop_on_error:
+                break
+    return failures
+
+
+def main(argv=None):
+    """命令行入口：不带子命令时进入交互式菜单"""
+    argv = sys.argv[1:] if argv is None else argv
+    # 交互式菜单不需要 argparse，避免无谓的导入
+    parser = build_arg_parser() if argv and argv != ['menu'] else None
+    args = parser.parse_args(argv) if parser else None
+    manager = None
+    tracer = GitTracer.from_env()
+    if args is not None:
+        tracer.jsonl_path = args.trace or tracer.jsonl_path
+        tracer.trace2 = tracer.trace2 or args.trace2
     try:
-        manager = GitManager()
-        manager.run()
+        manager = GitManager(tracer=tracer)
+        if args is None or args.command in (None, 'menu'):
+            manager.run()
+            return 0
+        if args.command == 'script':
+            if args.file == '-':
+                lines = sys.stdin.readlines()
+            else:
+                with open(args.file, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+            return 1 if run_script(manager, parser, lines, args.stop_on_error) else 0
+        return 0 if run_cli_command(manager, args) else 1
     except KeyboardInterrupt:
         print("\n程序已终止")
-        sys.exit(0) 
\ No newline at end of file
+        return 0
+    finally:
+        if manager is not None:
+            manager.close()
+        if args is not None and args.trace_summary:
+            print(tracer.summary(), file=sys.stderr)
+        tracer.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""GitManager 性能基准测试
+
+用法:
+    python git_manager_bench.py startup [--repeat N]
+    python git_manager_bench.py status [--files N] [--repeat N]
+    python git_manager_bench.py async [--repos N] [--commits N]
+    python git_manager_bench.py suite [--commits N] [--files N] [--binary-size N] [--output FILE]
+    python git_manager_bench.py compare BASELINE.json CURRENT.json [--threshold PCT]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import git_manager
+from git_manager import AsyncGitManager, GitInstallation, GitManager
+
+
+def measure(func, repeat):
+    """多次执行函数，返回每次耗时（毫秒）列表"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(name, timings):
+    """打印耗时统计"""
+    timings = sorted(timings)
+    median = timings[len(timings) // 2]
+    print(f"{name:<32} 中位数 {median:8.2f} ms   最小 {timings[0]:8.2f} ms   最大 {timings[-1]:8.2f} ms")
+    return median
+
+
+def legacy_startup():
+    """旧的启动方式：每次构造都运行 git --version"""
+    subprocess.run(['git', '--version'], check=True, capture_output=True)
+
+
+def legacy_env():
+    """旧的环境变量构造方式：每条命令都复制一次 os.environ"""
+    env = os.environ.copy()
+    env['LANG'] = 'en_US.UTF-8'
+    env['PYTHONIOENCODING'] = 'utf-8'
+    return env
+
+
+def bench_startup(repeat):
+    """对比启动时探测 git 与读取缓存的开销，以及每条命令构造环境变量的开销"""
+    print("=== 启动开销 ===")
+
+    def cold_start():
+        GitInstallation._detected = None
+        if os.path.exists(GitInstallation.cache_path()):
+            os.remove(GitInstallation.cache_path())
+        GitManager()
+
+    def warm_start():
+        GitInstallation._detected = None
+        GitManager()
+
+    before = summarize("旧方式: git --version", measure(legacy_startup, repeat))
+    summarize("新方式: 无缓存（首次运行）", measure(cold_start, repeat))
+    after = summarize("新方式: 读取磁盘缓存", measure(warm_start, repeat))
+    print(f"启动探测加速: {before / after:.1f} 倍\n")
+
+    print("=== 每条命令的额外开销 ===")
+    manager = GitManager()
+    before = summarize("旧方式: 每次复制环境变量", measure(legacy_env, repeat * 100))
+    after = summarize("新方式: 复用冻结的环境变量", measure(manager.git_env, repeat * 100))
+    print(f"环境变量构造加速: {before / max(after, 1e-6):.1f} 倍\n")
+
+    print("=== 解释器启动 + 导入 ===")
+    script = os.path.abspath(git_manager.__file__)
+    summarize("python -c 'import git_manager'", measure(
+        lambda: subprocess.run([sys.executable, '-c', 'import git_manager'], check=True,
+                               cwd=os.path.dirname(script)), max(3, repeat // 4)))
+
+
+def git(repo, *args):
+    """在指定仓库中执行 git 命令"""
+    env = dict(os.environ, GIT_AUTHOR_NAME='bench', GIT_AUTHOR_EMAIL='bench@example.com',
+               GIT_COMMITTER_NAME='bench', GIT_COMMITTER_EMAIL='bench@example.com')
+    return subprocess.run(['git', *args], cwd=repo, check=True, capture_output=True, env=env).stdout
+
+
+def make_tree_repo(path, files, per_dir=500):
+    """生成一个包含大量小文件的仓库，并提交一次"""
+    git(path, 'init', '-q')
+    for i in range(files):
+        directory = os.path.join(path, 'assets', f'd{i // per_dir:04d}')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'f{i:06d}.txt'), 'w') as f:
+            f.write(f'{i}\n')
+    git(path, 'add', '-A')
+    git(path, 'commit', '-q', '-m', 'initial')
+
+
+def bench_status(files, repeat):
+    """在合成的大仓库上对比重复查看状态的耗时（关闭/开启状态加速）"""
+    workdir = tempfile.mkdtemp(prefix='git_manager_bench_')
+    cwd = os.getcwd()
+    try:
+        print(f"正在生成包含 {files} 个文件的仓库...")
+        make_tree_repo(workdir, files)
+        os.chdir(workdir)
+
+        print("=== 重复查看状态 ===")
+        git(workdir, 'config', 'core.untrackedCache', 'false')
+        manager = GitManager()
+        manager.status_entries()
+        before = summarize("未加速: porcelain v2", measure(manager.status_entries, repeat))
+
+        git(workdir, 'config', GitManager.STATUS_ACCEL_CONFIG, 'true')
+        manager = GitManager()
+        report = manager.enable_status_acceleration()
+        manager._status_accel = report
+        manager.status_entries()
+        after = summarize("已加速: porcelain v2", measure(manager.status_entries, repeat))
+        print(f"untrackedCache: {'已启用' if report['untracked_cache'] else '不可用'}，"
+              f"fsmonitor: {'已启用' if report['fsmonitor'] else '不可用'}")
+        print(f"重复状态查询加速: {before / after:.1f} 倍")
+        counts = summarize("status_counts（不渲染文本）", measure(manager.status_counts, repeat))
+        print(f"目标 < 100 ms: {'达成' if counts < 100 else '未达成'}")
+        manager.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def make_history_repo(path, commits, remote=None):
+    """生成一个有多次提交的仓库；指定 remote 时创建本地裸仓库作为 origin 并推送"""
+    git(path, 'init', '-q')
+    for i in range(commits):
+        with open(os.path.join(path, 'index.html'), 'a') as f:
+            f.write(f'<p>{i}</p>\n')
+        git(path, 'add', 'index.html')
+        git(path, 'commit', '-q', '-m', f'update {i}')
+    if remote:
+        git(os.path.dirname(remote), 'init', '-q', '--bare', remote)
+        git(path, 'remote', 'add', 'origin', remote)
+        git(path, 'push', '-q', 'origin', 'HEAD')
+
+
+def bench_async(repos, commits):
+    """对比逐个仓库顺序执行与 AsyncGitManager 并发执行的总耗时"""
+    workdir = tempfile.mkdtemp(prefix='git_manager_bench_')
+    try:
+        print(f"正在生成 {repos} 个仓库（各 {commits} 次提交，带本地裸仓库远程）...")
+        paths = []
+        for i in range(repos):
+            path = os.path.join(workdir, f'site{i}')
+            os.makedirs(path)
+            make_history_repo(path, commits, os.path.join(workdir, f'site{i}.git'))
+            paths.append(path)
+
+        async def workload(manager):
+            start = time.perf_counter()
+            await manager.status()
+            await manager.log(20)
+            await manager.fetch('origin')
+            return time.perf_counter() - start
+
+        async def sequential():
+            return [await workload(AsyncGitManager(path)) for path in paths]
+
+        async def concurrent():
+            return await asyncio.gather(*(workload(AsyncGitManager(path)) for path in paths))
+
+        print("=== 多仓库 status + log + fetch ===")
+        start = time.perf_counter()
+        asyncio.run(sequential())
+        sequential_time = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        singles = asyncio.run(concurrent())
+        concurrent_time = (time.perf_counter() - start) * 1000
+        print(f"顺序执行总耗时: {sequential_time:8.2f} ms")
+        print(f"并发执行总耗时: {concurrent_time:8.2f} ms")
+        print(f"并发时最慢的单个仓库: {max(singles) * 1000:8.2f} ms")
+        print(f"加速: {sequential_time / concurrent_time:.1f} 倍")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def percentile(values, fraction):
+    """线性插值的百分位数"""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def make_synthetic_repo(path, commits, files, binary_size=0, binary_every=0, seed=0):
+    """用 git fast-import 快速生成合成仓库
+
+    第一次提交包含 files 个文本文件，之后每次提交修改 index.html 和一个轮换的文本文件，
+    binary_every 大于0时每隔这么多次提交加入一个 binary_size 字节的随机二进制文件。
+    返回按时间顺序排列的提交ID列表。
+    """
+    rng = random.Random(seed)
+    git(path, 'init', '-q')
+    branch = git(path, 'symbolic-ref', 'HEAD').decode().strip()
+    proc = subprocess.Popen(['git', 'fast-import', '--quiet', '--export-marks=.git/bench-marks'],
+                            cwd=path, stdin=subprocess.PIPE)
+
+    def data(payload):
+        proc.stdin.write(b'data %d\n' % len(payload) + payload + b'\n')
+
+    def text_path(i):
+        return f'src/d{i // 500:04d}/page{i:06d}.html'.encode()
+
+    for n in range(commits):
+        proc.stdin.write(b'commit %s\nmark :%d\n' % (branch.encode(), n + 1))
+        proc.stdin.write(b'committer bench <bench@example.com> %d +0000\n' % (1500000000 + n * 60))
+        data(b'update %d' % n)
+        if n:
+            proc.stdin.write(b'from :%d\n' % n)
+        else:
+            for i in range(files):
+                proc.stdin.write(b'M 100644 inline ' + text_path(i) + b'\n')
+                data(b'<p>page %d</p>\n' % i)
+        proc.stdin.write(b'M 100644 inline index.html\n')
+        # 只保留最近 50 行，提交数很多时文件大小不会随提交数平方增长
+        data(b''.join(b'<p>%d</p>\n' % i for i in range(max(0, n - 49), n + 1)))
+        if n and files:
+            i = (n * 7) % files
+            proc.stdin.write(b'M 100644 inline ' + text_path(i) + b'\n')
+            data(b'<p>page %d revision %d</p>\n' % (i, n))
+        if binary_every and binary_size and n % binary_every == binary_every - 1:
+            proc.stdin.write(b'M 100644 inline assets/blob%06d.bin\n' % n)
+            data(rng.getrandbits(binary_size * 8).to_bytes(binary_size, 'little'))
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise RuntimeError("git fast-import 失败")
+    git(path, 'reset', '-q', '--hard')
+
+    marks = {}
+    with open(os.path.join(path, '.git', 'bench-marks')) as f:
+        for line in f:
+            mark, oid = line.split()
+            marks[int(mark[1:])] = oid
+    os.remove(os.path.join(path, '.git', 'bench-marks'))
+    return [marks[n + 1] for n in range(commits)]
+
+
+def reset_remote(repo, remote_path, oid):
+    """把裸仓库远程和本地跟踪分支都退回到指定提交，并清除远程引用缓存和推送断点"""
+    branch = git(repo, 'rev-parse', '--abbrev-ref', 'HEAD').decode().strip()
+    git(remote_path, 'update-ref', f'refs/heads/{branch}', oid)
+    git(repo, 'update-ref', f'refs/remotes/origin/{branch}', oid)
+    state_dir = os.path.join(repo, '.git', 'git_manager')
+    for name in ('remote_refs.json', 'batch_push_journal.json'):
+        if os.path.exists(os.path.join(state_dir, name)):
+            os.remove(os.path.join(state_dir, name))
+
+
+# 基准测试中的操作：名称 -> (准备函数, 被测函数)，两者都接收 (manager, context)
+SUITE_OPERATIONS = {
+    'log': (None, lambda m, c: m.log(50)),
+    'log_detailed': (None, lambda m, c: m.log_detailed(20)),
+    'status': (None, lambda m, c: m.format_status()),
+    'show_commit': (None, lambda m, c: m.show_commit(c['head'])),
+    'file_history': (None, lambda m, c: m.file_history('index.html')),
+    'export_commit_to_file': (None, lambda m, c: m.export_commit_to_file(
+        c['head'], os.path.join(c['tmp'], 'export.patch'))),
+    'batch_push': (lambda m, c: reset_remote(c['repo'], c['remote'], c['base']),
+                   lambda m, c: m.batch_push('origin', '', c['batch_size'], interactive=False, resume=False)),
+}
+
+
+def run_worker(repo, operation, warmup, repeat, context):
+    """在独立进程中执行一个操作，返回耗时、子进程数和峰值内存
+
+    每个操作单独一个进程，峰值 RSS 才不会被其他操作的结果污染。
+    """
+    import resource
+    os.chdir(repo)
+    setup, func = SUITE_OPERATIONS[operation]
+    manager = GitManager()
+    timings, spawns = [], []
+    sink = io.StringIO()
+    for n in range(warmup + repeat):
+        if setup:
+            with contextlib.redirect_stdout(sink):
+                setup(manager, context)
+        before = sum(1 for r in manager.tracer.records if r['spawned'])
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sink):
+            func(manager, context)
+        elapsed = (time.perf_counter() - start) * 1000
+        sink.seek(0)
+        sink.truncate()
+        if n >= warmup:
+            timings.append(elapsed)
+            spawns.append(sum(1 for r in manager.tracer.records if r['spawned']) - before)
+    manager.close()
+    # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'timings_ms': timings,
+        'subprocesses': sum(spawns) / len(spawns) if spawns else 0,
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'peak_child_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def bench_suite(commits, files, binary_size, binary_every, pending, warmup, repeat,
+                operations, output, keep=None):
+    """在合成仓库上运行各项操作并把结果写成 JSON 文件"""
+    workdir = keep or tempfile.mkdtemp(prefix='git_manager_bench_')
+    repo = os.path.join(workdir, 'site')
+    remote = os.path.join(workdir, 'site.git')
+    try:
+        if not os.path.isdir(os.path.join(repo, '.git')):
+            print(f"正在生成合成仓库: {commits} 次提交，{files} 个文件，"
+                  f"每 {binary_every or '-'} 次提交一个 {binary_size} 字节的二进制文件...")
+            os.makedirs(repo, exist_ok=True)
+            start = time.perf_counter()
+            oids = make_synthetic_repo(repo, commits, files, binary_size, binary_every)
+            git(workdir, 'init', '-q', '--bare', remote)
+            git(repo, 'remote', 'add', 'origin', remote)
+            print(f"生成完成，耗时 {time.perf_counter() - start:.1f} 秒")
+        else:
+            oids = git(repo, 'rev-list', '--reverse', 'HEAD').decode().split()
+        base = oids[max(0, len(oids) - 1 - pending)]
+        git(repo, 'push', '-q', '--force', 'origin', f'{base}:refs/heads/'
+            + git(repo, 'rev-parse', '--abbrev-ref', 'HEAD').decode().strip())
+        git(repo, 'fetch', '-q', 'origin')
+
+        context = {'repo': repo, 'remote': remote, 'head': oids[-1], 'base': base,
+                   'tmp': workdir, 'batch_size': max(1, pending // 4)}
+        results = {
+            'meta': {
+                'time': time.time(),
+                'git': git(repo, 'version').decode().strip(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'params': {'commits': commits, 'files': files, 'binary_size': binary_size,
+                           'binary_every': binary_every, 'pending': pending,
+                           'warmup': warmup, 'repeat': repeat},
+            },
+            'operations': {},
+        }
+        script = os.path.abspath(__file__)
+        for operation in operations:
+            proc = subprocess.run(
+                [sys.executable, script, 'worker', repo, operation, '--warmup', str(warmup),
+                 '--repeat', str(repeat), '--context', json.dumps(context)],
+                capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{operation:<24} 失败: {proc.stderr.strip().splitlines()[-1:]}")
+                results['operations'][operation] = {'error': proc.stderr.strip()}
+                continue
+            data = json.loads(proc.stdout.strip().splitlines()[-1])
+            timings = data.pop('timings_ms')
+            data.update(p50_ms=percentile(timings, 0.5), p95_ms=percentile(timings, 0.95),
+                        min_ms=min(timings), max_ms=max(timings), samples=timings)
+            results['operations'][operation] = data
+            print(f"{operation:<24} p50 {data['p50_ms']:9.2f} ms   p95 {data['p95_ms']:9.2f} ms   "
+                  f"子进程 {data['subprocesses']:5.1f}   峰值RSS {data['peak_rss_bytes'] / 1048576:6.1f} MB")
+
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {output}")
+        return results
+    finally:
+        if keep is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_results(baseline_path, current_path, threshold):
+    """对比两次运行的结果，返回 p50 变慢超过阈值（百分比）的操作数"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, encoding='utf-8') as f:
+        current = json.load(f)
+    shape = ('commits', 'files', 'binary_size', 'binary_every', 'pending')
+    if any(baseline['meta']['params'].get(key) != current['meta']['params'].get(key) for key in shape):
+        print("警告: 两次运行的合成仓库参数不同，结果不能直接比较")
+
+    regressions = 0
+    print(f"{'操作':<24} {'基线 p50':>10} {'当前 p50':>10} {'变化':>8} {'基线 p95':>10} {'当前 p95':>10} {'子进程':>9}")
+    for operation, now in current['operations'].items():
+        before = baseline['operations'].get(operation)
+        if not before or 'error' in before or 'error' in now:
+            print(f"{operation:<24} 无法比较")
+            continue
+        change = (now['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            regressions += 1
+            flag = '  变慢'
+        print(f"{operation:<24} {before['p50_ms']:10.2f} {now['p50_ms']:10.2f} {change:+7.1f}% "
+              f"{before['p95_ms']:10.2f} {now['p95_ms']:10.2f} "
+              f"{before['subprocesses']:4.0f}→{now['subprocesses']:<4.0f}{flag}")
+    print(f"\n变慢超过 {threshold:.0f}% 的操作: {regressions} 个")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GitManager 性能基准测试')
+    subparsers = parser.add_subparsers(dest='scenario', required=True)
+    startup_parser = subparsers.add_parser('startup', help='启动与每条命令的固定开销')
+    startup_parser.add_argument('--repeat', type=int, default=20)
+    status_parser = subparsers.add_parser('status', help='大仓库上重复查看状态的耗时')
+    status_parser.add_argument('--files', type=int, default=20000)
+    status_parser.add_argument('--repeat', type=int, default=10)
+    async_parser = subparsers.add_parser('async', help='多个仓库并发执行与顺序执行的对比')
+    async_parser.add_argument('--repos', type=int, default=8)
+    async_parser.add_argument('--commits', type=int, default=20)
+    suite_parser = subparsers.add_parser('suite', help='在合成仓库上测量各项操作，结果写成 JSON')
+    suite_parser.add_argument('--commits', type=int, default=500)
+    suite_parser.add_argument('--files', type=int, default=2000)
+    suite_parser.add_argument('--binary-size', type=int, default=256 * 1024, help='二进制文件大小（字节）')
+    suite_parser.add_argument('--binary-every', type=int, default=50, help='每隔多少次提交加入一个二进制文件，0 表示不加')
+    suite_parser.add_argument('--pending', type=int, default=20, help='batch_push 需要推送的提交数')
+    suite_parser.add_argument('--warmup', type=int, default=2)
+    suite_parser.add_argument('--repeat', type=int, default=10)
+    suite_parser.add_argument('--ops', nargs='*', choices=sorted(SUITE_OPERATIONS), help='只运行这些操作')
+    suite_parser.add_argument('--output', default='git_manager_bench.json')
+    suite_parser.add_argument('--keep', metavar='DIR', help='在该目录生成并保留合成仓库，下次运行直接复用')
+    compare_parser = subparsers.add_parser('compare', help='对比两次 suite 运行的结果')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='p50 变慢超过该百分比视为回退')
+    worker_parser = subparsers.add_parser('worker', help=argparse.SUPPRESS)
+    worker_parser.add_argument('repo')
+    worker_parser.add_argument('operation', choices=sorted(SUITE_OPERATIONS))
+    worker_parser.add_argument('--warmup', type=int, default=2)
+    worker_parser.add_argument('--repeat', type=int, default=10)
+    worker_parser.add_argument('--context', default='{}')
+    args = parser.parse_args(argv)
+
+    if args.scenario == 'startup':
+        bench_startup(args.repeat)
+    elif args.scenario == 'status':
+        bench_status(args.files, args.repeat)
+    elif args.scenario == 'async':
+        bench_async(args.repos, args.commits)
+    elif args.scenario == 'suite':
+        bench_suite(args.commits, args.files, args.binary_size, args.binary_every, args.pending,
+                    args.warmup, args.repeat, args.ops or list(SUITE_OPERATIONS), args.output,
+                    os.path.abspath(args.keep) if args.keep else None)
+    elif args.scenario == 'compare':
+        return 1 if compare_results(args.baseline, args.current, args.threshold) else 0
+    elif args.scenario == 'worker':
+        result = run_worker(args.repo, args.operation, args.warmup, args.repeat, json.loads(args.context))
+        print(json.dumps(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""git_manager 测试的公共夹具：在临时目录中创建 file:// 远程裸仓库和工作仓库"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import git_manager  # noqa: E402
+
+
+def git(cwd, *args, check=True):
+    """在 cwd 中执行 git 并返回标准输出"""
+    result = subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, encoding='utf-8')
+    if check and result.returncode != 0:
+        raise AssertionError(f"git {' '.join(args)} 失败: {result.stderr}")
+    return result.stdout
+
+
+def commit_file(repo, path, content, message=None):
+    """写入文件并提交，返回新提交的ID"""
+    full_path = os.path.join(repo, *path.split('/'))
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(content)
+    git(repo, 'add', path)
+    git(repo, 'commit', '-q', '-m', message or f'update {path}')
+    return git(repo, 'rev-parse', 'HEAD').strip()
+
+
+@pytest.fixture(autouse=True)
+def isolated_git(tmp_path, monkeypatch):
+    """隔离用户和系统的 git 配置，固定提交者信息"""
+    home = tmp_path / 'home'
+    home.mkdir()
+    monkeypatch.setenv('HOME', str(home))
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(home / '.config'))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(home / '.cache'))
+    monkeypatch.setenv('GIT_CONFIG_NOSYSTEM', '1')
+    for name in ('GIT_DIR', 'GIT_WORK_TREE', 'GIT_OBJECT_DIRECTORY', 'GIT_MANAGER_TRACE', 'GIT_MANAGER_TRACE2'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('GIT_AUTHOR_NAME', 'Tester')
+    monkeypatch.setenv('GIT_AUTHOR_EMAIL', 'tester@example.com')
+    monkeypatch.setenv('GIT_COMMITTER_NAME', 'Tester')
+    monkeypatch.setenv('GIT_COMMITTER_EMAIL', 'tester@example.com')
+    git_manager.GitInstallation._detected = None
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """带一个初始提交的远程裸仓库"""
+    seed = tmp_path / 'seed'
+    seed.mkdir()
+    git(seed, 'init', '-q', '-b', 'main')
+    commit_file(str(seed), 'README.md', 'seed\n', 'initial')
+    bare = tmp_path / 'remote.git'
+    git(tmp_path, 'clone', '-q', '--bare', str(seed), str(bare))
+    return bare
+
+
+@pytest.fixture
+def remote_url(remote):
+    return 'file://' + str(remote).replace(os.sep, '/')
+
+
+@pytest.fixture
+def work(tmp_path, remote_url):
+    """从远程裸仓库克隆出的工作仓库"""
+    path = tmp_path / 'work'
+    git(tmp_path, 'clone', '-q', remote_url, str(path))
+    return path
+
+
+@pytest.fixture
+def manager(work):
+    manager = git_manager.GitManager(repo_path=str(work))
+    yield manager
+    manager.close()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""AsyncGitManager：超时和取消时结束整个进程组，信号量可以跨事件循环使用"""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+def slow_command(pid_file):
+    """一个会运行很久的 git 别名，把真正干活的孙进程的 pid 写入 pid_file"""
+    return ['-c', f"alias.slow=!echo $$ > '{pid_file}'; exec sleep 10", 'slow']
+
+
+def process_gone(pid, wait=5.0):
+    """等待进程退出（已退出但未被回收的僵尸进程也算）"""
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            with open(f'/proc/{pid}/stat', encoding='utf-8') as f:
+                if f.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                    return True
+        except FileNotFoundError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+async def wait_for_file(path):
+    while not os.path.exists(path) or not open(path, encoding='utf-8').read().strip():
+        await asyncio.sleep(0.02)
+    with open(path, encoding='utf-8') as f:
+        return int(f.read())
+
+
+posix_only = pytest.mark.skipif(os.name != 'posix', reason='按进程组结束子进程只在 POSIX 上可用')
+
+
+@posix_only
+def test_timeout_kills_the_process_group(work, tmp_path):
+    manager = git_manager.AsyncGitManager(str(work))
+    pid_file = str(tmp_path / 'slow.pid')
+
+    async def scenario():
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await manager.run_git(slow_command(pid_file), timeout=0.5)
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 5
+    assert process_gone(int(open(pid_file, encoding='utf-8').read()))
+
+
+@posix_only
+def test_cancel_kills_the_process_group(work, tmp_path):
+    manager = git_manager.AsyncGitManager(str(work))
+    pid_file = str(tmp_path / 'slow.pid')
+
+    async def scenario():
+        task = asyncio.create_task(manager.run_git(slow_command(pid_file)))
+        pid = await wait_for_file(pid_file)
+        start = time.monotonic()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return pid, time.monotonic() - start
+
+    pid, elapsed = asyncio.run(scenario())
+    # 只结束 git 时，孙进程仍占着输出管道，要等它自己退出
+    assert elapsed < 5
+    assert process_gone(pid)
+
+
+def test_run_git_command_reports_timeouts_and_failures(work, tmp_path, capsys):
+    manager = git_manager.AsyncGitManager(str(work), timeout=0.5)
+    assert asyncio.run(manager.run_git_command(slow_command(str(tmp_path / 'slow.pid')))) is None
+    assert asyncio.run(manager.run_git_command(['show', 'no-such-commit'])) is None
+    out = capsys.readouterr().out
+    assert '执行超时' in out and out.count('错误:') == 2
+
+
+def test_semaphore_is_recreated_for_each_event_loop(work):
+    manager = git_manager.AsyncGitManager(str(work), max_concurrency=1)
+    results = []
+
+    async def two_at_once():
+        return await asyncio.gather(manager.log(1), manager.current_branch())
+
+    def run_twice():
+        for _ in range(2):
+            results.append((asyncio.run(two_at_once()), manager._semaphore))
+
+    # 沿用上一个循环的信号量时 asyncio 会出错甚至卡住，放在线程中限制等待时间
+    thread = threading.Thread(target=run_twice, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive() and len(results) == 2
+    (first, first_semaphore), (second, second_semaphore) = results
+    assert first == second and first[1] == 'main'
+    assert second_semaphore is not first_semaphore
+
+
+def test_environment_is_shared_with_git_manager(work):
+    env = git_manager.AsyncGitManager(str(work)).git_env()
+    assert env['LANG'] == 'en_US.UTF-8'
+    with pytest.raises(TypeError):
+        env['LANG'] = 'C'
+
+
+def test_batch_push(work, remote):
+    for i in range(3):
+        commit_file(str(work), 'web/index.html', f'<p>{i}</p>\n')
+    manager = git_manager.AsyncGitManager(str(work))
+    assert asyncio.run(manager.batch_push(batch_size=2)) == '分批次推送完成，成功: 3，失败: 0'
+    assert git(remote, 'rev-parse', 'main') == git(work, 'rev-parse', 'HEAD')
+    assert asyncio.run(manager.batch_push()) == '没有未推送的提交'
+
+
+def test_export_writes_binary_output(work, tmp_path):
+    data = bytes(range(256)) * 4
+    with open(work / 'logo.bin', 'wb') as f:
+        f.write(data)
+    git(work, 'add', 'logo.bin')
+    git(work, 'commit', '-q', '-m', 'binary')
+    filename = str(tmp_path / 'export.patch')
+    manager = git_manager.AsyncGitManager(str(work))
+    assert '已成功导出' in asyncio.run(manager.export('HEAD', filename))
+    with open(filename, 'rb') as f:
+        assert f.read() == git_manager.subprocess.run(
+            ['git', 'show', '--binary', 'HEAD'], cwd=work, capture_output=True).stdout
+
+
+def test_run_on_repos(work, tmp_path, remote_url):
+    other = tmp_path / 'other'
+    git(tmp_path, 'clone', '-q', remote_url, str(other))
+    missing = tmp_path / 'missing'
+    results = asyncio.run(git_manager.AsyncGitManager.run_on_repos(
+        [str(work), str(other), str(missing)], 'current_branch', timeout=30))
+    assert results[str(work)] == 'main' and results[str(other)] == 'main'
+    # 目录不存在时返回异常对象，不影响其他仓库
+    assert isinstance(results[str(missing)], OSError)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""基准测试脚本：合成仓库、逐操作测量和两次结果的对比"""
+
+import json
+
+from conftest import git
+import git_manager_bench as bench
+
+
+def test_percentile():
+    assert bench.percentile([], 0.5) is None
+    assert bench.percentile([3, 1, 2], 0.5) == 2
+    assert bench.percentile([0, 10], 0.95) == 9.5
+
+
+def test_synthetic_repo(tmp_path):
+    oids = bench.make_synthetic_repo(str(tmp_path), 60, 30, binary_size=1000, binary_every=20)
+    assert oids == git(tmp_path, 'rev-list', '--reverse', 'HEAD').split()
+    files = git(tmp_path, 'ls-files').split()
+    assert len([path for path in files if path.startswith('src/')]) == 30
+    assert [path for path in files if path.startswith('assets/')] == [
+        'assets/blob000019.bin', 'assets/blob000039.bin', 'assets/blob000059.bin']
+    # index.html 只保留最近 50 行
+    assert len((tmp_path / 'index.html').read_text().splitlines()) == 50
+
+
+def write_results(path, params, operations):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': {'params': params}, 'operations': operations}, f)
+    return str(path)
+
+
+def operation(p50, subprocesses=1):
+    return {'p50_ms': p50, 'p95_ms': p50 * 2, 'subprocesses': subprocesses}
+
+
+def test_compare_counts_regressions(tmp_path, capsys):
+    params = {'commits': 10, 'files': 10}
+    baseline = write_results(tmp_path / 'a.json', params, {
+        'log': operation(10.0), 'status': operation(10.0), 'show_commit': {'error': 'boom'}})
+    current = write_results(tmp_path / 'b.json', params, {
+        'log': operation(10.5), 'status': operation(20.0), 'show_commit': operation(1.0)})
+    assert bench.compare_results(baseline, current, 10.0) == 1
+    out = capsys.readouterr().out
+    assert '变慢超过 10% 的操作: 1 个' in out and '警告' not in out
+    assert 'show_commit' in out and '无法比较' in out
+    assert bench.main(['compare', baseline, current, '--threshold', '200']) == 0
+    assert bench.main(['compare', baseline, current]) == 1
+
+
+def test_compare_warns_about_different_repositories(tmp_path, capsys):
+    baseline = write_results(tmp_path / 'a.json', {'commits': 10}, {'log': operation(10.0)})
+    current = write_results(tmp_path / 'b.json', {'commits': 20}, {'log': operation(10.0)})
+    assert bench.compare_results(baseline, current, 10.0) == 0
+    assert '警告: 两次运行的合成仓库参数不同' in capsys.readouterr().out
+
+
+def test_suite_writes_results(tmp_path):
+    output = tmp_path / 'results.json'
+    results = bench.bench_suite(20, 20, 0, 0, 4, 0, 2, ['log', 'batch_push'], str(output))
+    with open(output, encoding='utf-8') as f:
+        assert json.load(f) == results
+    assert results['meta']['params']['commits'] == 20
+    for name in ('log', 'batch_push'):
+        data = results['operations'][name]
+        assert 'error' not in data and len(data['samples']) == 2
+        assert data['min_ms'] <= data['p50_ms'] <= data['max_ms']
+    # 每次测量前都把远程退回，batch_push 每次都要真正推送
+    assert results['operations']['batch_push']['subprocesses'] > 0
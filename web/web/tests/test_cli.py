@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""非交互式命令行和脚本模式：子命令、退出码和一个进程内执行多条命令"""
+
+import io
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+@pytest.fixture
+def in_work(work, monkeypatch):
+    """命令行入口在当前目录的仓库中工作"""
+    monkeypatch.chdir(work)
+    return work
+
+
+def test_status_and_log(in_work, capsys):
+    head = commit_file(str(in_work), 'web/index.html', '<p>cli</p>\n', 'cli change')
+    assert git_manager.main(['status']) == 0
+    assert git_manager.main(['log', '-n', '1']) == 0
+    out = capsys.readouterr().out
+    assert head[:7] in out and 'cli change' in out
+
+
+def test_add_and_commit(in_work, capsys):
+    (in_work / 'web').mkdir()
+    (in_work / 'web' / 'about.html').write_text('about\n', encoding='utf-8')
+    assert git_manager.main(['add', 'web/about.html']) == 0
+    assert git_manager.main(['commit', '-m', 'add about']) == 0
+    assert git(in_work, 'log', '-1', '--format=%s').strip() == 'add about'
+    # 没有可提交的更改时 git commit 失败
+    assert git_manager.main(['commit', '-m', 'nothing']) == 1
+
+
+def test_failed_operation_result_sets_the_exit_code(in_work, tmp_path, capsys):
+    assert git_manager.main(['export', 'no-such-commit', str(tmp_path / 'out.txt')]) == 1
+    assert git_manager.main(['publish', 'missing']) == 1
+    assert '没有名为 missing 的发布目标' in capsys.readouterr().out
+
+
+def test_invalid_arguments_exit_through_argparse(in_work):
+    with pytest.raises(SystemExit) as excinfo:
+        git_manager.main(['log', '-n', 'many'])
+    assert excinfo.value.code == 2
+
+
+def test_script_runs_every_line_and_counts_failures(manager, work, capsys):
+    commit_file(str(work), 'web/index.html', 'one\n', 'first')
+    lines = [
+        '# 注释和空行会被跳过',
+        '',
+        'log -n 1',
+        'show HEAD',
+        'log -n many',
+        'menu',
+        'status',
+    ]
+    parser = git_manager.build_arg_parser()
+    assert git_manager.run_script(manager, parser, lines) == 2
+    out = capsys.readouterr().out
+    assert '第 5 行执行失败: log -n many' in out
+    assert '第 6 行: 脚本中不支持该命令' in out
+    assert 'first' in out
+
+
+def test_script_stops_on_error(manager, capsys):
+    parser = git_manager.build_arg_parser()
+    lines = ['show no-such-commit', 'log -n 1']
+    assert git_manager.run_script(manager, parser, lines, stop_on_error=True) == 1
+    assert '第 2 行' not in capsys.readouterr().out
+
+
+def test_script_from_stdin(in_work, monkeypatch, capsys):
+    commit_file(str(in_work), 'web/index.html', 'one\n', 'from stdin')
+    monkeypatch.setattr('sys.stdin', io.StringIO('log -n 1\nstatus\n'))
+    assert git_manager.main(['script']) == 0
+    assert 'from stdin' in capsys.readouterr().out
+
+    monkeypatch.setattr('sys.stdin', io.StringIO('show no-such-commit\n'))
+    assert git_manager.main(['script']) == 1
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""克隆方式：完整、部分、浅克隆和稀疏检出"""
+
+import os
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+@pytest.fixture
+def site_remote(tmp_path, work, remote_url):
+    """有多次提交、web/ 和 docs/ 两个目录的远程仓库"""
+    for i in range(3):
+        commit_file(str(work), 'web/index.html', f'<h1>{i}</h1>\n')
+        commit_file(str(work), 'docs/notes.md', f'note {i}\n')
+    git(work, 'push', '-q', 'origin', 'main')
+    # 允许按需获取单个对象（部分克隆之后读取缺少的文件内容）
+    git(remote_url[len('file://'):], 'config', 'uploadpack.allowFilter', 'true')
+    return remote_url
+
+
+@pytest.fixture
+def cloner(tmp_path):
+    target = tmp_path / 'clones'
+    target.mkdir()
+    manager = git_manager.GitManager(repo_path=str(target))
+    yield manager, target
+    manager.close()
+
+
+def test_clone_directory_name():
+    name = git_manager.GitManager.clone_directory_name
+    assert name('https://example.com/team/site.git') == 'site'
+    assert name('git@example.com:team/site.git/') == 'site'
+    assert name('file:///srv/repos/site/.git') == 'site'
+
+
+def test_full_clone(cloner, site_remote):
+    manager, target = cloner
+    assert manager.clone_repository(site_remote, 'full', profile='full') is not None
+    clone = target / 'full'
+    assert git(clone, 'rev-list', '--count', 'HEAD').strip() == '7'
+    assert (clone / 'docs' / 'notes.md').exists()
+    assert git(clone, 'config', '--get', 'remote.origin.partialclonefilter', check=False) == ''
+
+
+def test_partial_clone(cloner, site_remote):
+    manager, target = cloner
+    assert manager.clone_repository(site_remote, 'partial', profile='partial') is not None
+    clone = target / 'partial'
+    assert git(clone, 'config', '--get', 'remote.origin.partialclonefilter').strip() == 'blob:none'
+    # 历史中的旧版本文件内容尚未下载
+    missing = git(clone, 'rev-list', '--objects', '--missing=print', 'HEAD').split()
+    assert any(line.startswith('?') for line in missing)
+    # 需要时自动从远程获取
+    assert git(clone, 'show', 'HEAD~3:web/index.html') == '<h1>1</h1>\n'
+
+
+def test_shallow_clone(cloner, site_remote):
+    manager, target = cloner
+    result = manager.clone_repository(site_remote, 'shallow', profile='shallow', depth=2)
+    assert result is not None and 'git fetch --unshallow' in result
+    clone = target / 'shallow'
+    assert (clone / '.git' / 'shallow').exists()
+    assert git(clone, 'rev-list', '--count', 'HEAD').strip() == '2'
+
+
+def test_sparse_checkout(cloner, site_remote):
+    manager, target = cloner
+    assert manager.clone_repository(site_remote, 'sparse', profile='sparse', sparse_dirs=['web']) is not None
+    clone = target / 'sparse'
+    assert (clone / 'web' / 'index.html').exists()
+    assert not (clone / 'docs').exists()
+    # 根目录下的文件在 cone 模式中总会检出
+    assert (clone / 'README.md').exists()
+    assert git(clone, 'sparse-checkout', 'list').split() == ['web']
+
+
+def test_unknown_profile(cloner, site_remote):
+    manager, target = cloner
+    assert manager.clone_repository(site_remote, 'x', profile='mirror') is None
+    assert not os.listdir(target)
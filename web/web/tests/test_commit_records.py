@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""一次 git log 解析出的 CommitRecord 必须与 git 自己的输出一致"""
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+@pytest.fixture
+def history(work, monkeypatch):
+    """作者在不同时区的几次提交，包含重命名、二进制文件和多行说明"""
+    monkeypatch.setenv('GIT_AUTHOR_DATE', '2024-02-03T04:05:06+0800')
+    commit_file(str(work), 'web/index.html', '<p>one</p>\n', '首页\n\n第一段说明\n第二行')
+    monkeypatch.setenv('GIT_AUTHOR_DATE', '2024-07-08T09:10:11-0530')
+    git(work, 'mv', 'web/index.html', 'web/home.html')
+    with open(work / 'web' / 'logo.png', 'wb') as f:
+        f.write(b'\x89PNG\0\x01' * 10)
+    git(work, 'add', 'web')
+    git(work, 'commit', '-q', '-m', 'rename and logo')
+    monkeypatch.delenv('GIT_AUTHOR_DATE')
+    return work
+
+
+@pytest.fixture(params=[True, False], ids=['native', 'git-log'])
+def any_manager(request, history):
+    manager = git_manager.GitManager(use_native=request.param, repo_path=str(history))
+    yield manager
+    manager.close()
+
+
+def test_fields_match_git_log(any_manager, history):
+    records = list(any_manager.iter_commits('HEAD', 10))
+    expected = git(history, 'log', '-10', '--format=%H|%h|%P|%an|%ae|%at|%ct|%s|%ad').splitlines()
+    assert len(records) == len(expected)
+    for record, line in zip(records, expected):
+        oid, short, parents, author, email, author_time, commit_time, subject, date = line.split('|')
+        assert (record.hash, record.short_hash, record.parents) == (oid, short, tuple(parents.split()))
+        assert (record.author, record.email, record.subject) == (author, email, subject)
+        assert (record.author_time, record.commit_time) == (int(author_time), int(commit_time))
+        # 日期按作者自己的时区显示
+        assert record.author_date() == date
+
+
+def test_body_and_numstat(manager, history):
+    newest, older = list(manager.iter_commits('HEAD', 2, numstat=True, body=True))
+    assert older.body == '第一段说明\n第二行'
+    assert newest.body == ''
+    assert sorted(newest.files, key=lambda f: f[2]) == [
+        (0, 0, 'web/home.html', 'web/index.html'),
+        (None, None, 'web/logo.png', None),
+    ]
+    assert older.files == ((1, 0, 'web/index.html', None),)
+
+
+def test_oneline_log_and_as_dict(manager, history):
+    assert manager.log(3) == git(history, 'log', '-3', '--oneline')
+    record = next(manager.iter_commits('HEAD', 1))
+    assert record.as_dict() == {'hash': record.short_hash, 'message': 'rename and logo', 'oid': record.hash}
+
+
+def test_log_detailed_matches_git_stat(manager, history):
+    assert manager.log_detailed(3) == git(history, 'log', '-3', '--stat')
+    assert ''.join(manager.log_detailed(3, stream=True)) == git(history, 'log', '-3', '--stat')
+
+
+def test_records_use_slots():
+    record = git_manager.CommitRecord('a' * 40, 'aaaaaaa', (), 'A', 'a@example.com', 0, 0, 's')
+    with pytest.raises(AttributeError):
+        record.extra = 1
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""导出提交：git 的输出原样写入文件，支持提交范围、补丁系列和结果缓存"""
+
+import subprocess
+
+import pytest
+
+from conftest import commit_file, git
+
+
+def git_bytes(repo, *args):
+    return subprocess.run(['git', *args], cwd=repo, capture_output=True, check=True).stdout
+
+
+@pytest.fixture
+def binary_history(work):
+    """包含二进制文件和非 UTF-8 内容的几次提交"""
+    with open(work / 'logo.png', 'wb') as f:
+        f.write(bytes(range(256)) * 16)
+    with open(work / 'legacy.txt', 'wb') as f:
+        f.write('旧编码\n'.encode('gbk'))
+    git(work, 'add', 'logo.png', 'legacy.txt')
+    git(work, 'commit', '-q', '-m', 'binary assets')
+    commit_file(str(work), 'web/index.html', '<p>one</p>\n')
+    commit_file(str(work), 'web/index.html', '<p>two</p>\n')
+    return work
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_export_single_commit_is_byte_identical(manager, binary_history, tmp_path):
+    filename = tmp_path / 'show.patch'
+    result = manager.export_commit_to_file('HEAD~2', str(filename))
+    assert result.ok
+    assert read(filename) == git_bytes(binary_history, 'show', '--binary', 'HEAD~2')
+
+
+def test_exported_binary_patch_applies(manager, binary_history, tmp_path, remote_url):
+    filename = tmp_path / 'series.mbox'
+    assert manager.export_commit_to_file('origin/main..HEAD', str(filename), patch_series=True).ok
+    assert read(filename) == git_bytes(binary_history, 'format-patch', '--stdout', '--binary', 'origin/main..HEAD')
+
+    other = tmp_path / 'other'
+    git(tmp_path, 'clone', '-q', remote_url, str(other))
+    git(other, 'am', '-q', str(filename))
+    assert read(other / 'logo.png') == read(binary_history / 'logo.png')
+    assert read(other / 'legacy.txt') == read(binary_history / 'legacy.txt')
+    assert git(other, 'log', '--format=%s', '-3') == git(binary_history, 'log', '--format=%s', '-3')
+
+
+def test_repeated_export_is_served_from_the_cache(manager, binary_history, tmp_path):
+    first, second = tmp_path / 'first.patch', tmp_path / 'second.patch'
+    assert '来自缓存' not in manager.export_commit_to_file('HEAD~2', str(first))
+    result = manager.export_commit_to_file('HEAD~2', str(second))
+    assert result.ok and '来自缓存' in result
+    assert read(first) == read(second)
+
+
+def test_failed_export(manager, binary_history, tmp_path):
+    result = manager.export_commit_to_file('no-such-commit', str(tmp_path / 'out.patch'))
+    assert not result.ok and result.startswith('导出失败')
+    result = manager.export_commit_to_file('HEAD', str(tmp_path / 'missing' / 'out.patch'))
+    assert not result.ok and result.startswith('导出时发生错误')
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""提交前的图片优化：PNG 重新压缩、去掉元数据，结果按 blob ID 缓存"""
+
+import struct
+import zlib
+
+import pytest
+
+from conftest import git
+import git_manager
+
+Optimizer = git_manager.ImageOptimizer
+
+
+def png_chunk(chunk_type, body):
+    return struct.pack('>I4s', len(body), chunk_type) + body + struct.pack('>I', zlib.crc32(chunk_type + body))
+
+
+def make_png(width=64, height=64, level=0, extra=()):
+    """灰度 PNG；level=0 时图像数据不压缩，extra 为插在 IDAT 前的附加块"""
+    rows = b''.join(b'\0' + bytes((x * y) % 256 for x in range(width)) for y in range(height))
+    return (Optimizer.PNG_SIGNATURE
+            + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + b''.join(png_chunk(chunk_type, body) for chunk_type, body in extra)
+            + png_chunk(b'IDAT', zlib.compress(rows, level))
+            + png_chunk(b'IEND', b''))
+
+
+def png_chunks(data):
+    chunks, pos = [], 8
+    while pos < len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        body = data[pos + 8:pos + 8 + length]
+        assert struct.unpack_from('>I', data, pos + 8 + length)[0] == zlib.crc32(chunk_type + body)
+        chunks.append((chunk_type, body))
+        pos += 12 + length
+    return chunks
+
+
+def exif(orientation):
+    """只有一个方向标记的小端 EXIF 段内容"""
+    return b'Exif\0\0II*\0' + struct.pack('<IHHHI4sI', 8, 1, 0x0112, 3, 1, struct.pack('<H', orientation), 0)
+
+
+def jpeg_segment(marker, payload):
+    return bytes((0xff, marker)) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def make_jpeg(orientation=1):
+    scan = b'\xff\xda\x00\x08\x01\x01\x00\x00\x3f\x00' + b'\x12\x34' * 50 + b'\xff\xd9'
+    return (b'\xff\xd8'
+            + jpeg_segment(0xe0, b'JFIF\0\x01\x01\0\0\x01\0\x01\0\0')
+            + jpeg_segment(0xe1, exif(orientation))
+            + jpeg_segment(0xe2, b'ICC_PROFILE\0\x01\x01' + b'icc' * 10)
+            + jpeg_segment(0xed, b'Photoshop 3.0\0' + b'x' * 100)
+            + jpeg_segment(0xfe, b'made by a camera')
+            + scan)
+
+
+def test_png_is_recompressed_without_metadata():
+    original = make_png(extra=[(b'tEXt', b'Comment\0' + b'x' * 200), (b'tRNS', b'\0\0')])
+    optimized, note = Optimizer.optimize(original)
+    assert note == '无损压缩' and len(optimized) < len(original)
+    chunks = png_chunks(optimized)
+    assert [chunk_type for chunk_type, _ in chunks] == [b'IHDR', b'tRNS', b'IDAT', b'IEND']
+    original_idat = dict(png_chunks(original))[b'IDAT']
+    assert zlib.decompress(chunks[2][1]) == zlib.decompress(original_idat)
+
+
+def test_optimal_png_is_left_alone():
+    optimized = Optimizer.optimize(make_png())[0]
+    assert Optimizer.optimize(optimized) == (None, '已是最优')
+
+
+@pytest.mark.parametrize('orientation, keeps_exif', [(1, False), (6, True)])
+def test_jpeg_metadata_is_stripped(orientation, keeps_exif):
+    original = make_jpeg(orientation)
+    optimized, _ = Optimizer.optimize(original)
+    assert optimized.startswith(b'\xff\xd8\xff\xe0') and b'JFIF' in optimized
+    assert b'ICC_PROFILE' in optimized and optimized.endswith(original[original.index(b'\xff\xda'):])
+    assert b'made by a camera' not in optimized and b'Photoshop' not in optimized
+    assert (b'Exif' in optimized) is keeps_exif
+    assert Optimizer.jpeg_orientation(exif(orientation)) == orientation
+
+
+def test_unsupported_and_broken_files():
+    assert Optimizer.optimize(b'GIF89a') == (None, '不支持的格式')
+    assert Optimizer.optimize(make_png()[:40])[1].startswith('无法解析')
+    assert Optimizer.is_candidate('a/B.JPEG') and not Optimizer.is_candidate('a/b.gif')
+
+
+def stage(work, path, data):
+    with open(work / path, 'wb') as f:
+        f.write(data)
+    git(work, 'add', path)
+
+
+def staged_blob(work, path):
+    return git(work, 'rev-parse', f':{path}').strip()
+
+
+def test_staged_images_are_optimized_and_cached(manager, work):
+    stage(work, 'logo.png', make_png(extra=[(b'tEXt', b'Comment\0hello')]))
+    stage(work, 'photo.jpg', make_jpeg())
+    stage(work, 'notes.txt', b'text\n')
+    report = manager.optimize_staged_images(jobs=2)
+    assert report.startswith('图片优化: 处理 2 张，重新压缩 2 张，更新 2 张')
+    # 工作区和暂存区都换成了优化后的内容
+    assert git(work, 'status', '--porcelain') == 'A  logo.png\nA  notes.txt\nA  photo.jpg\n'
+    assert git(work, 'hash-object', 'logo.png').strip() == staged_blob(work, 'logo.png')
+
+    report = manager.optimize_staged_images()
+    assert '重新压缩 0 张' in report and report.count('已是最优，命中缓存') == 2
+
+
+def test_cached_result_is_reused_for_the_same_input(manager, work):
+    original = make_png()
+    stage(work, 'a.png', original)
+    manager.optimize_staged_images()
+    optimized = staged_blob(work, 'a.png')
+    stage(work, 'b.png', original)
+    report = manager.optimize_staged_images()
+    assert 'b.png: 节省' in report and '使用缓存结果' in report
+    assert staged_blob(work, 'b.png') == optimized
+
+
+def test_unstaged_changes_are_not_overwritten(manager, work):
+    stage(work, 'logo.png', make_png())
+    (work / 'logo.png').write_bytes(b'edited')
+    assert '工作区有未暂存的修改，已跳过' in manager.optimize_staged_images()
+    assert (work / 'logo.png').read_bytes() == b'edited'
+
+
+def test_commit_optimizes_when_configured(manager, work, capsys):
+    git(work, 'config', 'gitmanager.optimizeImages', 'true')
+    git(work, 'config', 'gitmanager.imageMaxSize', '32')
+    stage(work, 'logo.png', make_png())
+    assert manager.commit('add logo') is not None
+    assert git(work, 'hash-object', 'logo.png').strip() == git(work, 'rev-parse', 'HEAD:logo.png').strip()
+    assert int(git(work, 'cat-file', '-s', 'HEAD:logo.png')) < len(make_png())
+    if not manager.pillow_available():
+        assert '未安装 Pillow' in capsys.readouterr().out
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""git 探测结果按可执行文件缓存，子进程环境只构造一次"""
+
+import json
+import re
+import subprocess
+
+import pytest
+
+import git_manager
+
+Installation = git_manager.GitInstallation
+
+
+def installed_version():
+    output = subprocess.run(['git', 'version'], capture_output=True, text=True).stdout
+    return tuple(int(part) for part in re.search(r'(\d+)\.(\d+)\.(\d+)', output).groups())
+
+
+def test_detect_probes_once_and_shares_the_result():
+    first = Installation.detect()
+    assert first.version == installed_version()
+    assert first.at_least(2, 0) and not first.at_least(99)
+    assert Installation.detect() is first
+
+
+def test_detection_is_read_from_the_disk_cache(monkeypatch):
+    probed = Installation.detect()
+    with open(Installation.cache_path(), encoding='utf-8') as f:
+        assert json.load(f)['version'] == list(probed.version)
+
+    # 新进程（类属性为空）直接读取磁盘缓存，不再运行 git
+    Installation._detected = None
+    monkeypatch.setattr(Installation, 'probe', classmethod(lambda cls, path: pytest.fail('不应再次探测')))
+    cached = Installation.detect()
+    assert cached.version == probed.version and cached.features == probed.features
+
+
+def test_changed_executable_invalidates_the_cache(monkeypatch):
+    Installation.detect()
+    with open(Installation.cache_path(), encoding='utf-8') as f:
+        cached = json.load(f)
+    cached['key'] = cached['key'].replace(':', ':0', 1)
+    cached['version'] = [0, 1, 0]
+    with open(Installation.cache_path(), 'w', encoding='utf-8') as f:
+        json.dump(cached, f)
+    Installation._detected = None
+    assert Installation.detect().version == installed_version()
+
+
+def test_missing_git(monkeypatch, capsys):
+    monkeypatch.setattr(git_manager.shutil, 'which', lambda name: None)
+    assert Installation.detect(use_cache=False) is None
+    with pytest.raises(SystemExit):
+        git_manager.GitManager()
+    assert '未安装Git' in capsys.readouterr().out
+
+
+def test_git_env_is_built_once_and_read_only(manager, monkeypatch):
+    env = manager.git_env()
+    assert env['LANG'] == 'en_US.UTF-8' and env['PYTHONIOENCODING'] == 'utf-8'
+    monkeypatch.setenv('GIT_MANAGER_TEST_LATE', '1')
+    assert manager.git_env() is env
+    assert 'GIT_MANAGER_TEST_LATE' not in env
+    with pytest.raises(TypeError):
+        env['LANG'] = 'C'
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""大文件检测：暂存区和未推送提交中超过阈值的文件，以及每个提交的推送大小"""
+
+import os
+
+import pytest
+
+from conftest import commit_file, git
+
+
+def write_bytes(work, path, size):
+    full_path = os.path.join(str(work), *path.split('/'))
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(os.urandom(size))
+
+
+@pytest.fixture
+def small_threshold(work):
+    git(work, 'config', 'gitmanager.largeFileThreshold', '4k')
+
+
+def test_threshold_from_config(manager, work, small_threshold):
+    assert manager.large_file_threshold() == 4096
+    git(work, 'config', '--unset', 'gitmanager.largeFileThreshold')
+    assert manager.large_file_threshold() == manager.DEFAULT_LARGE_FILE_THRESHOLD
+
+
+def test_scan_staged_objects(manager, work, small_threshold):
+    commit_file(str(work), 'web/gone.txt', 'x' * 10000)
+    write_bytes(work, 'web/video.mp4', 20000)
+    write_bytes(work, 'web/icon.png', 100)
+    git(work, 'add', 'web')
+    git(work, 'rm', '-q', 'web/gone.txt')
+    found = manager.scan_staged_objects()
+    assert [(item['path'], item['size']) for item in found] == [('web/video.mp4', 20000)]
+
+
+def test_scan_unpushed_objects(manager, work, small_threshold):
+    write_bytes(work, 'web/pushed.bin', 8000)
+    git(work, 'add', 'web')
+    git(work, 'commit', '-q', '-m', 'pushed')
+    git(work, 'push', '-q', 'origin', 'main')
+    write_bytes(work, 'web/new.bin', 8000)
+    git(work, 'add', 'web')
+    git(work, 'commit', '-q', '-m', 'unpushed')
+    assert [item['path'] for item in manager.scan_unpushed_objects()] == ['web/new.bin']
+
+
+def test_report_and_commit_impact(manager, work, small_threshold):
+    commit_file(str(work), 'web/small.html', 'small\n', 'small change')
+    write_bytes(work, 'web/big.bin', 50000)
+    git(work, 'add', 'web')
+    git(work, 'commit', '-q', '-m', 'big change')
+    impact = manager.pending_commit_impact()
+    assert [commit['message'] for commit in impact] == ['small change', 'big change']
+    assert impact[1]['pack_bytes'] > 40000 > impact[0]['pack_bytes']
+
+    flagged, report = manager.large_asset_report()
+    assert [(item['path'], item['staged']) for item in flagged] == [('web/big.bin', False)]
+    assert '未推送提交中的大文件: 1 个' in report and 'big.bin' in report
+
+
+@pytest.mark.parametrize('answer, proceed', [('c', True), ('', False)])
+def test_confirm_before_commit(manager, work, small_threshold, monkeypatch, answer, proceed):
+    write_bytes(work, 'web/video.mp4', 20000)
+    git(work, 'add', 'web')
+    prompts = []
+    monkeypatch.setattr('builtins.input', lambda prompt: prompts.append(prompt) or answer)
+    assert manager.confirm_large_assets() is proceed
+    assert len(prompts) == 1
+
+
+def test_no_prompt_without_large_files(manager, work, small_threshold, monkeypatch):
+    write_bytes(work, 'web/icon.png', 100)
+    git(work, 'add', 'web')
+    monkeypatch.setattr('builtins.input', lambda prompt: pytest.fail('不应询问'))
+    assert manager.confirm_large_assets(unpushed=True)
+
+
+def test_pointer_conversion_needs_git_lfs(manager, monkeypatch, capsys):
+    monkeypatch.setattr(manager, 'lfs_available', lambda: False)
+    assert manager.convert_to_pointers(['web/video.mp4']) is None
+    assert 'git-lfs' in capsys.readouterr().out
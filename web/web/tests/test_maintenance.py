@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""后台维护：按对象库现状规划任务，遵守时间预算，默认不在后台运行"""
+
+import time
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+def add_loose_objects(repo, count):
+    """提交 count 个新文件，产生可达的松散对象"""
+    for i in range(count):
+        (repo / 'web' / 'gallery').mkdir(parents=True, exist_ok=True)
+        (repo / 'web' / 'gallery' / f'item{i}.txt').write_text(f'item {i}\n', encoding='utf-8')
+    git(repo, 'add', 'web/gallery')
+    git(repo, 'commit', '-q', '-m', 'add gallery')
+
+
+def task_names(scheduler):
+    return [name for name, _, _ in scheduler.plan()[0]]
+
+
+@pytest.fixture
+def scheduler(manager):
+    return git_manager.MaintenanceScheduler(manager, time_budget=60)
+
+
+def test_plan_packs_loose_objects_and_writes_the_commit_graph(scheduler, work):
+    add_loose_objects(work, 120)
+    assert task_names(scheduler) == ['commit-graph', 'loose-objects']
+
+    report = scheduler.run()
+    assert [task['name'] for task in report['tasks']] == ['commit-graph', 'loose-objects']
+    assert all(task['ok'] for task in report['tasks'])
+    assert report['objects_after']['count'] < 100
+    assert set(report['before']) == set(report['after'])
+    # 引用没有变化，也没有新的松散对象；只剩为新 pack 写入 multi-pack-index
+    assert task_names(scheduler) == ['multi-pack-index']
+    scheduler.run()
+    assert task_names(scheduler) == []
+    assert '对象库状态良好' in scheduler.format_report(scheduler.run())
+
+
+def test_plan_repacks_many_small_packs(scheduler, work):
+    for i in range(10):
+        commit_file(str(work), 'web/index.html', f'<p>{i}</p>\n')
+        git(work, 'repack', '-q')
+    names = task_names(scheduler)
+    assert names[-3:] == ['multi-pack-index', 'expire-packs', 'incremental-repack']
+
+
+def test_budget_lets_the_running_task_finish(scheduler, work, monkeypatch):
+    add_loose_objects(work, 120)
+    scheduler.time_budget = 0.2
+    original = scheduler.git_process
+    timeouts = []
+
+    def slow_git_process(command, timeout=None):
+        timeouts.append(timeout)
+        if 'commit-graph' in command:
+            time.sleep(0.3)
+        return original(command, timeout)
+
+    monkeypatch.setattr(scheduler, 'git_process', slow_git_process)
+    report = scheduler.run()
+    tasks = {task['name']: task for task in report['tasks']}
+    assert tasks['commit-graph']['ok'] and tasks['commit-graph']['status'] == '完成'
+    assert tasks['loose-objects']['status'] == '超出时间预算，跳过'
+    assert set(timeouts) == {None}
+    # 没有全部完成，下次仍会更新 commit-graph 之外的任务
+    assert 'loose-objects' in task_names(scheduler)
+
+
+def test_background_maintenance_is_opt_in(manager, work):
+    scheduler = git_manager.MaintenanceScheduler(manager, idle_seconds=0)
+    assert scheduler.is_due()
+    assert not scheduler.start()
+
+    git(work, 'config', 'gitmanager.autoMaintenance', 'true')
+    assert scheduler.start()
+    scheduler._thread.join(30)
+    assert not scheduler._thread.is_alive()
+    assert scheduler.report is not None
+    assert not scheduler.is_due()
+
+
+def test_dry_run_from_the_command_line(manager, work, capsys):
+    add_loose_objects(work, 120)
+    args = git_manager.build_arg_parser().parse_args(['maintenance', '--dry-run'])
+    assert git_manager.run_cli_command(manager, args)
+    assert 'git repack' in capsys.readouterr().out
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""常驻 cat-file 读取器和原生对象库的结果必须与 git cat-file 一致"""
+
+import glob
+import subprocess
+import threading
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+@pytest.fixture
+def history(work):
+    """一段既有松散对象、又有 delta 压缩 pack 的历史，包含一次合并"""
+    for i in range(6):
+        commit_file(str(work), 'web/page.html', ''.join(f'<p>line {n}</p>\n' for n in range(200 + i)))
+    git(work, 'repack', '-q', '-a', '-d')
+    git(work, 'switch', '-q', '-c', 'side', 'HEAD~2')
+    commit_file(str(work), 'web/side.html', 'side\n\tindented\n', '侧分支\t提交')
+    git(work, 'switch', '-q', 'main')
+    git(work, 'merge', '-q', '--no-edit', 'side')
+    commit_file(str(work), 'web/loose.txt', 'loose object\n')
+    return work
+
+
+def all_objects(repo):
+    output = git(repo, 'cat-file', '--batch-all-objects', '--batch-check=%(objectname) %(objecttype)')
+    return [line.split() for line in output.splitlines()]
+
+
+def cat_file(repo, obj_type, oid):
+    return subprocess.run(['git', 'cat-file', obj_type, oid], cwd=repo, capture_output=True, check=True).stdout
+
+
+def test_native_store_matches_cat_file(history):
+    store = git_manager.NativeObjectStore.discover(str(history))
+    assert store is not None
+    try:
+        for oid, obj_type in all_objects(history):
+            assert store.read(oid) == (obj_type, cat_file(history, obj_type, oid))
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize('offset_deltas', [True, False], ids=['ofs-delta', 'ref-delta'])
+def test_native_store_resolves_deltas(history, offset_deltas):
+    """useDeltaBaseOffset=false 时 pack 中的 delta 按对象ID引用基对象（REF_DELTA）"""
+    git(history, '-c', f'repack.useDeltaBaseOffset={str(offset_deltas).lower()}', 'repack', '-q', '-a', '-d', '-f')
+    pack_index = glob.glob(str(history / '.git' / 'objects' / 'pack' / '*.idx'))[0]
+    deltas = [line.split()[0] for line in git(history, 'verify-pack', '-v', pack_index).splitlines()
+              if len(line.split()) == 7]
+    assert deltas, "pack 中没有 delta 对象"
+
+    store = git_manager.NativeObjectStore.discover(str(history))
+    results = {}
+    # 读取在锁上死锁时不能让整个测试挂住
+    reader = threading.Thread(target=lambda: results.update((oid, store.read(oid)) for oid in deltas), daemon=True)
+    reader.start()
+    reader.join(20)
+    # 卡住的线程仍持有锁，此时不能调用 close()
+    assert not reader.is_alive(), "读取 delta 对象时卡住"
+    try:
+        for oid in deltas:
+            obj_type, data = results[oid]
+            assert data == cat_file(history, obj_type, oid)
+    finally:
+        store.close()
+
+
+def test_batch_reader_matches_cat_file(manager, history):
+    reader = manager.object_reader()
+    objects = all_objects(history)
+    results = reader.read_many(oid for oid, _ in objects)
+    for (oid, obj_type), result in zip(objects, results):
+        assert result == (oid, obj_type, cat_file(history, obj_type, oid))
+    info = reader.check('HEAD:web/page.html')
+    assert info[1] == 'blob'
+    assert info[2] == len(cat_file(history, 'blob', 'HEAD:web/page.html'))
+    assert reader.read('HEAD:no/such/file') is None
+    assert reader.check('0' * 40) is None
+
+
+def test_show_commit_matches_git_show(manager, history):
+    for oid in git(history, 'rev-list', '--all').split():
+        assert manager.native_show_header(oid) is not None
+        assert manager.show_commit(oid) == git(history, 'show', oid)
+        assert ''.join(manager.show_commit(oid, stream=True)) == git(history, 'show', oid)
+
+
+def test_show_commit_falls_back_when_config_changes_output(manager, history):
+    oid = git(history, 'rev-parse', 'HEAD').strip()
+    git(history, 'config', 'log.date', 'iso')
+    assert manager.native_show_header(oid) is None
+    assert manager.show_commit(oid) == git(history, 'show', oid)
+
+
+def test_preview_from_subdirectory(history):
+    manager = git_manager.GitManager(repo_path=str(history / 'web'))
+    try:
+        assert manager.preview_file('side.html') == 'side\n\tindented'
+        assert manager.preview_file(':(top)web/side.html') == 'side\n\tindented'
+        assert manager.preview_file('side.html', 'HEAD~3') is None
+    finally:
+        manager.close()
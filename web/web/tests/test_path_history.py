@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""路径索引：跟随重命名的文件历史、相对当前目录的路径和增量更新"""
+
+import subprocess
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+@pytest.fixture
+def renamed(work):
+    """about.html 改动两次后移动到 web/about.html，再改动一次"""
+    commit_file(str(work), 'about.html', 'v1\n')
+    commit_file(str(work), 'index.html', 'index\n')
+    commit_file(str(work), 'about.html', 'v2\n')
+    (work / 'web').mkdir()
+    git(work, 'mv', 'about.html', 'web/about.html')
+    git(work, 'commit', '-q', '-m', 'move about page')
+    commit_file(str(work), 'web/about.html', 'v3\n')
+    return work
+
+
+def follow(repo, path):
+    return git(repo, 'log', '--follow', '--format=%H', '--', path).split()
+
+
+def test_path_history_follows_renames(manager, renamed):
+    assert manager.path_history('web/about.html') == follow(renamed, 'web/about.html')
+    assert len(manager.path_history('web/about.html')) == 4
+    assert manager.last_commit_touching('web/about.html') == git(renamed, 'rev-parse', 'HEAD').strip()
+
+
+def test_path_history_from_subdirectory(renamed):
+    manager = git_manager.GitManager(repo_path=str(renamed / 'web'))
+    try:
+        expected = follow(renamed, 'web/about.html')
+        assert manager.path_history('about.html') == expected
+        assert manager.path_history(':(top)web/about.html') == expected
+        assert manager.path_history('../web/about.html') == expected
+        assert manager.path_history('../../outside') == []
+        assert manager.file_history('about.html') == git(renamed / 'web', 'log', '--follow', '--', 'about.html')
+    finally:
+        manager.close()
+
+
+def test_directory_history_merges_its_files(manager, renamed):
+    commit_file(str(renamed), 'web/contact.html', 'contact\n')
+    expected = git(renamed, 'log', '--format=%H', '--', 'web').split()
+    assert manager.path_history('web') == expected
+
+
+def test_unknown_path_falls_back_to_git_log(manager, renamed):
+    assert manager.path_history('nothing.html') == []
+    assert manager.file_history('nothing.html') == ''
+
+
+def test_index_is_updated_incrementally(manager, renamed):
+    assert len(manager.path_history('index.html')) == 1
+    tip = manager.load_path_index()['tip']
+    commit_file(str(renamed), 'index.html', 'index v2\n')
+    assert manager.path_history('index.html') == follow(renamed, 'index.html')
+    index = manager.load_path_index()
+    assert index['tip'] != tip
+    assert index['tip'] == git(renamed, 'rev-parse', 'HEAD').strip()
+
+
+def test_index_is_rebuilt_after_history_rewrite(manager, renamed):
+    manager.path_history('web/about.html')
+    git(renamed, 'reset', '-q', '--hard', 'HEAD~1')
+    commit_file(str(renamed), 'web/about.html', 'rewritten\n')
+    assert manager.path_history('web/about.html') == follow(renamed, 'web/about.html')
+
+
+def test_conflict_resolution_in_merge_is_indexed(manager, work):
+    commit_file(str(work), 'web/index.html', 'base\n')
+    git(work, 'switch', '-q', '-c', 'side')
+    commit_file(str(work), 'web/index.html', 'side\n')
+    git(work, 'switch', '-q', 'main')
+    commit_file(str(work), 'web/index.html', 'main\n')
+    git(work, 'merge', '-q', 'side', check=False)
+    commit_file(str(work), 'web/index.html', 'resolved\n', 'merge side')
+    merge = git(work, 'rev-parse', 'HEAD').strip()
+    history = manager.path_history('web/index.html')
+    assert history[0] == merge
+    assert set(history) == set(git(work, 'log', '--format=%H', '--', 'web/index.html').split())
+
+
+def test_history_works_when_the_index_cannot_be_saved(manager, work, monkeypatch):
+    # 一次 fast-import 生成 250 个改动同一文件的提交
+    parent = git(work, 'rev-parse', 'HEAD').strip()
+    commands = []
+    for i in range(250):
+        content = f'{i}\n'
+        commands.append(f'commit refs/heads/main\n'
+                        f'committer Tester <tester@example.com> {1700000000 + i} +0000\n'
+                        f'data 7\nversion\n'
+                        + (f'from {parent}\n' if i == 0 else '')
+                        + f'M 100644 inline web/page.html\ndata {len(content)}\n{content}\n')
+    subprocess.run(['git', 'fast-import', '--quiet', '--force'], cwd=work,
+                   input=''.join(commands).encode(), check=True)
+    git(work, 'reset', '-q', '--hard', 'main')
+
+    def fail(name, payload):
+        raise OSError('read-only file system')
+
+    monkeypatch.setattr(manager, 'write_state_bytes', fail)
+    assert len(manager.path_history('web/page.html')) == 250
+    assert manager.file_history('web/page.html') == git(work, 'log', '--', 'web/page.html')
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""批量路径操作：一次 git 调用处理大量路径，并给出逐路径的结果"""
+
+import pytest
+
+from conftest import commit_file, git
+
+
+def write(work, path, content='x\n'):
+    full_path = work.joinpath(*path.split('/'))
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    full_path.write_text(content, encoding='utf-8')
+
+
+def staged(work):
+    return set(git(work, 'diff', '--cached', '--name-only', '-z').split('\0')) - {''}
+
+
+@pytest.fixture(params=['stdin', 'arguments'])
+def bulk_manager(request, manager, monkeypatch):
+    """分别测试 --pathspec-from-file 和按命令行长度分块两种方式"""
+    if request.param == 'arguments':
+        monkeypatch.setattr(manager.git, 'at_least', lambda *version: False)
+    return manager
+
+
+def test_bulk_add_many_paths(bulk_manager, work):
+    paths = [f'web/gallery/img{i:04}.txt' for i in range(1500)]
+    for path in paths:
+        write(work, path)
+    report = bulk_manager.bulk_add(paths)
+    assert report['failed'] == {}
+    assert len(report['ok']) == len(paths)
+    assert staged(work) == set(paths)
+
+
+def test_bulk_add_reports_each_failed_path(bulk_manager, work):
+    write(work, '.gitignore', 'build/\n')
+    write(work, 'web/a.html')
+    write(work, 'web/b.html')
+    write(work, 'build/out.js')
+    report = bulk_manager.bulk_add(['web/a.html', 'missing.html', 'build/out.js', 'web/b.html'])
+    assert sorted(report['ok']) == ['web/a.html', 'web/b.html']
+    assert set(report['failed']) == {'missing.html', 'build/out.js'}
+    assert staged(work) == {'web/a.html', 'web/b.html'}
+
+
+def test_add_files_splits_like_a_shell(manager, work):
+    write(work, 'web/my page.html')
+    write(work, 'web/other.html')
+    text = manager.add_files('"web/my page.html" web/other.html', optimize_images=False)
+    assert '失败 0 个' in text
+    assert staged(work) == {'web/my page.html', 'web/other.html'}
+
+
+def test_add_files_accepts_a_path_list(manager, work):
+    write(work, 'web/a b.html')
+    manager.add_files(['web/a b.html'], optimize_images=False)
+    assert staged(work) == {'web/a b.html'}
+
+
+def test_unstage_and_remove(bulk_manager, work):
+    for name in ('a', 'b', 'c'):
+        commit_file(str(work), f'web/{name}.html', f'{name}\n')
+        write(work, f'web/{name}.html', 'changed\n')
+    git(work, 'add', 'web')
+    assert bulk_manager.bulk_unstage(['web/a.html', 'web/b.html'])['failed'] == {}
+    assert staged(work) == {'web/c.html'}
+
+    report = bulk_manager.bulk_remove(['web/c.html', 'web/none.html'], cached=True)
+    assert list(report['failed']) == ['web/none.html']
+    assert git(work, 'ls-files', 'web/c.html') == ''
+    assert (work / 'web' / 'c.html').exists()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""增量发布：目录目标只同步变化的文件，仓库目标推送发布提交"""
+
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from conftest import commit_file, git
+
+
+@pytest.fixture
+def site(work):
+    commit_file(str(work), 'web/index.html', '<h1>home</h1>\n')
+    commit_file(str(work), 'web/assets/js/main.js', 'main()\n')
+    commit_file(str(work), 'docs/notes.md', 'not published\n')
+    return work
+
+
+def published_files(root):
+    return sorted(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/')
+                  for dirpath, _, names in os.walk(root) for name in names)
+
+
+def test_publish_directory_incrementally(manager, site, tmp_path):
+    target = tmp_path / 'public'
+    manager.add_publish_target('www', str(target))
+    result = manager.publish('www')
+    assert result.ok and '完整' in result
+    assert published_files(target) == ['assets/js/main.js', 'index.html']
+
+    commit_file(str(site), 'web/index.html', '<h1>home v2</h1>\n')
+    git(site, 'rm', '-q', 'web/assets/js/main.js')
+    git(site, 'commit', '-q', '-m', 'remove script')
+    result = manager.publish('www')
+    assert result.ok and '增量' in result
+    assert '复制 1，删除 1' in result
+    assert published_files(target) == ['index.html']
+    # 因删除而变空的目录也被删除
+    assert not (target / 'assets').exists()
+    assert (target / 'index.html').read_text(encoding='utf-8') == '<h1>home v2</h1>\n'
+
+    assert '无需发布' in manager.publish('www')
+
+
+def test_published_files_are_independent_copies(manager, site, tmp_path):
+    script = site / 'web' / 'deploy.sh'
+    script.write_text('#!/bin/sh\n', encoding='utf-8')
+    git(site, 'add', '--chmod=+x', 'web/deploy.sh')
+    git(site, 'commit', '-q', '-m', 'add script')
+    target = tmp_path / 'public'
+    manager.add_publish_target('www', str(target))
+    assert manager.publish('www').ok
+
+    mode = os.stat(target / 'deploy.sh').st_mode
+    assert stat.S_IMODE(mode) == 0o755
+    assert stat.S_IMODE(os.stat(target / 'index.html').st_mode) == 0o644
+    # 修改发布出去的文件不会影响 blob 缓存，再次完整发布时内容恢复
+    (target / 'index.html').write_text('changed on server\n', encoding='utf-8')
+    assert manager.publish('www', full=True).ok
+    assert (target / 'index.html').read_text(encoding='utf-8') == '<h1>home</h1>\n'
+
+
+def test_failed_files_keep_the_deployed_commit(manager, site, tmp_path, monkeypatch):
+    target = tmp_path / 'public'
+    manager.add_publish_target('www', str(target))
+    original = manager._sync_file
+
+    def sync_file(root, blob_dir, status, mode, oid, path, data):
+        if path == 'index.html':
+            raise PermissionError('denied')
+        return original(root, blob_dir, status, mode, oid, path, data)
+
+    monkeypatch.setattr(manager, '_sync_file', sync_file)
+    result = manager.publish('www')
+    assert not result.ok and 'index.html: denied' in result
+    assert manager.publish_targets()['www']['deployed'] is None
+
+
+def test_blobs_in_memory_are_bounded(manager, work, tmp_path, monkeypatch):
+    for i in range(40):
+        (work / 'web').mkdir(exist_ok=True)
+        (work / 'web' / f'photo{i:02}.bin').write_bytes(os.urandom(1024))
+    git(work, 'add', 'web')
+    git(work, 'commit', '-q', '-m', 'add photos')
+    target = tmp_path / 'public'
+    manager.add_publish_target('www', str(target))
+
+    lock = threading.Lock()
+    outstanding = [0, 0]
+    reader = manager.object_reader()
+    read_many = reader.read_many
+
+    def counting_read_many(specs):
+        objects = read_many(specs)
+        with lock:
+            outstanding[0] += len(objects)
+            outstanding[1] = max(outstanding[1], outstanding[0])
+        return objects
+
+    original = manager._sync_file
+
+    def slow_sync_file(*args):
+        # 写入明显慢于读取
+        time.sleep(0.01)
+        try:
+            return original(*args)
+        finally:
+            if args[-1] is not None:
+                with lock:
+                    outstanding[0] -= 1
+
+    monkeypatch.setattr(reader, 'read_many', counting_read_many)
+    monkeypatch.setattr(manager, '_sync_file', slow_sync_file)
+    assert manager.publish('www', jobs=2).ok
+    assert len(published_files(target)) == 40
+    # 正在读取的一批加上等待写入的一批
+    assert outstanding[1] <= 2 * 2 * 2
+
+
+def test_publish_repository_pushes_the_source_tree(manager, site, tmp_path):
+    pages = tmp_path / 'pages.git'
+    git(tmp_path, 'init', '-q', '--bare', str(pages))
+    manager.add_publish_target('pages', str(pages), branch='gh-pages')
+    assert manager.publish_targets()['pages']['kind'] == 'repo'
+    assert manager.publish('pages').ok
+    assert git(pages, 'ls-tree', '-r', '--name-only', 'gh-pages').split() == ['assets/js/main.js', 'index.html']
+
+    first = git(pages, 'rev-parse', 'gh-pages').strip()
+    commit_file(str(site), 'web/index.html', '<h1>home v2</h1>\n')
+    assert manager.publish('pages').ok
+    # 发布提交以上一次发布为父提交，推送总是快进
+    assert git(pages, 'rev-parse', 'gh-pages^').strip() == first
+
+
+def test_trim_publish_cache(manager, site, tmp_path):
+    manager.add_publish_target('www', str(tmp_path / 'public'))
+    assert manager.publish('www').ok
+    blob_dir = manager.publish_blob_dir()
+    assert len(published_files(blob_dir)) == 2
+    assert manager.trim_publish_cache(limit=1) == 2
+    assert published_files(blob_dir) == []
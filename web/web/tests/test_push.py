@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""推送重试（临时性故障判断）和分批次推送"""
+
+import subprocess
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+def failed(stderr):
+    return subprocess.CompletedProcess([], 128, '', stderr)
+
+
+@pytest.mark.parametrize('stderr, transient', [
+    ("fatal: unable to access 'https://example.com/r.git/': Could not resolve host: example.com", True),
+    ("fatal: unable to access 'https://example.com/r.git/': Failed to connect to example.com port 443", True),
+    ("fatal: unable to access 'https://example.com/r.git/': The requested URL returned error: 503", True),
+    ("fatal: unable to access 'https://example.com/r.git/': The requested URL returned error: 403", False),
+    ("fatal: unable to access 'https://example.com/r.git/': The requested URL returned error: 401", False),
+    ("error: RPC failed; HTTP 504 curl 22 The requested URL returned error: 504", True),
+    ("fatal: the remote end hung up unexpectedly", True),
+    ("error: failed to push some refs to 'origin'\nhint: Updates were rejected", False),
+])
+def test_is_transient_error(manager, stderr, transient):
+    assert manager.is_transient_error(stderr) is transient
+
+
+def test_run_with_retry_retries_transient_failures(manager, monkeypatch):
+    responses = [failed('fatal: the remote end hung up unexpectedly'),
+                 failed('error: RPC failed; curl 56 Connection reset by peer'),
+                 subprocess.CompletedProcess([], 0, 'ok', '')]
+    monkeypatch.setattr(manager, 'run_git_process', lambda command, timeout=None: responses.pop(0))
+    result = manager.run_with_retry(['git', 'push'], retries=2, backoff=0)
+    assert result['ok'] and result['attempts'] == 3
+
+
+def test_run_with_retry_stops_on_permanent_failure(manager, tmp_path):
+    missing = 'file://' + str(tmp_path / 'missing.git')
+    result = manager.run_with_retry(['git', 'push', missing, 'main'], retries=3, backoff=0)
+    assert not result['ok']
+    assert result['attempts'] == 1
+
+
+@pytest.fixture
+def mirrors(work, remote, tmp_path):
+    """除 origin 外再加两个远程：一个可用的镜像和一个不存在的地址"""
+    mirror = tmp_path / 'mirror.git'
+    git(tmp_path, 'clone', '-q', '--bare', str(remote), str(mirror))
+    git(work, 'remote', 'add', 'mirror', 'file://' + str(mirror))
+    git(work, 'remote', 'add', 'broken', 'file://' + str(tmp_path / 'missing.git'))
+    return mirror
+
+
+def test_push_remotes_in_parallel(manager, work, remote, mirrors):
+    head = commit_file(str(work), 'web/index.html', '<p>mirror</p>\n')
+    manager.remember_remote_ref('origin', 'main', 'a' * 40)
+    results = manager.push_remotes(backoff=0)
+    assert {name: result['ok'] for name, result in results.items()} == {
+        'origin': True, 'mirror': True, 'broken': False}
+    assert git(remote, 'rev-parse', 'main').strip() == head
+    assert git(mirrors, 'rev-parse', 'main').strip() == head
+    # 推送后旧的远程引用快照作废
+    assert 'origin/main' not in manager.remote_ref_cache()
+    report = manager.format_remote_results(results, '并行推送')
+    assert report.endswith('成功: 2，失败: 1') and '❌ broken' in report
+
+
+def test_fetch_selected_remotes(manager, work, mirrors, tmp_path):
+    other = tmp_path / 'other'
+    git(tmp_path, 'clone', '-q', str(mirrors), str(other))
+    head = commit_file(str(other), 'web/other.html', 'other\n')
+    git(other, 'push', '-q', 'origin', 'main')
+    results = manager.fetch_remotes(['mirror'])
+    assert list(results) == ['mirror'] and results['mirror']['ok']
+    assert git(work, 'rev-parse', 'mirror/main').strip() == head
+    assert not (work / '.git' / 'FETCH_HEAD').exists()
+
+
+def add_commits(work, count):
+    return [commit_file(str(work), f'web/page{i}.html', f'<p>{i}</p>\n' * (i + 1)) for i in range(count)]
+
+
+def remote_head(remote):
+    return git(remote, 'rev-parse', 'refs/heads/main').strip()
+
+
+def test_batch_push_pushes_in_batches(manager, work, remote, monkeypatch):
+    oids = add_commits(work, 5)
+    pushed = []
+    original = manager.push_batch
+
+    def push_batch(batch, remote_name='origin', branch=''):
+        pushed.append(len(batch))
+        return original(batch, remote_name, branch)
+
+    monkeypatch.setattr(manager, 'push_batch', push_batch)
+    result = manager.batch_push('origin', 'main', batch_size=2, interactive=False)
+    assert result.ok
+    assert pushed == [2, 2, 1]
+    assert remote_head(remote) == oids[-1]
+    # 全部推送完成后不留断点记录
+    assert manager.load_batch_journal('origin', 'main') is None
+
+
+def test_batch_push_resumes_from_journal(manager, work, remote, monkeypatch):
+    oids = add_commits(work, 4)
+    original = manager.push_batch
+    calls = []
+    failing = {oids[1]}
+
+    def push_batch(batch, remote_name='origin', branch=''):
+        calls.append(batch[-1]['oid'])
+        if batch[-1]['oid'] in failing:
+            return None
+        return original(batch, remote_name, branch)
+
+    monkeypatch.setattr(manager, 'push_batch', push_batch)
+    result = manager.batch_push('origin', 'main', batch_size=1, interactive=False)
+    assert not result.ok
+    assert remote_head(remote) == oids[0]
+
+    # 再次执行时从断点继续，不重新推送已确认的提交
+    failing.clear()
+    calls.clear()
+    result = manager.batch_push('origin', 'main', batch_size=1, interactive=False)
+    assert result.ok
+    assert calls == oids[1:]
+    assert remote_head(remote) == oids[-1]
+
+
+def fail_after_first_commit(manager, oids, monkeypatch):
+    """让第二个提交的推送失败，留下已确认第一个提交的断点记录"""
+    original = manager.push_batch
+
+    def push_batch(batch, remote_name='origin', branch=''):
+        if batch[-1]['oid'] == oids[1]:
+            return None
+        return original(batch, remote_name, branch)
+
+    monkeypatch.setattr(manager, 'push_batch', push_batch)
+    assert not manager.batch_push('origin', 'main', batch_size=1, interactive=False).ok
+    monkeypatch.setattr(manager, 'push_batch', original)
+
+
+def test_journal_survives_a_new_session(manager, work, remote, monkeypatch):
+    oids = add_commits(work, 3)
+    fail_after_first_commit(manager, oids, monkeypatch)
+    manager.close()
+
+    later = git_manager.GitManager(repo_path=str(work))
+    try:
+        entry = later.load_batch_journal('origin', 'main')
+        assert entry['acked'] == oids[0] and entry['acked_index'] == 0
+        assert [commit['oid'] for commit in entry['plan']] == oids
+        assert later.batch_push('origin', 'main', interactive=False).ok
+        assert remote_head(remote) == oids[-1]
+    finally:
+        later.close()
+
+
+def test_journal_is_replanned_when_head_moves(manager, work, remote, monkeypatch):
+    oids = add_commits(work, 3)
+    fail_after_first_commit(manager, oids, monkeypatch)
+    newest = commit_file(str(work), 'web/late.html', 'late\n')
+    calls = []
+    original = manager.push_batch
+
+    def push_batch(batch, remote_name='origin', branch=''):
+        calls.append([commit['oid'] for commit in batch])
+        return original(batch, remote_name, branch)
+
+    monkeypatch.setattr(manager, 'push_batch', push_batch)
+    assert manager.batch_push('origin', 'main', batch_size=10, interactive=False).ok
+    # HEAD 已变化，重新列出未推送的提交，已推送的第一个提交不在其中
+    assert calls == [oids[1:] + [newest]]
+    assert manager.load_batch_journal('origin', 'main') is None
+
+
+def test_clear_batch_journal(manager):
+    for remote_name, branch in (('origin', 'main'), ('origin', 'dev'), ('backup', 'main')):
+        manager.save_batch_journal(remote_name, branch, {'plan': [], 'acked_index': -1})
+    assert manager.clear_batch_journal('origin', 'dev') == '已清除 1 条分批次推送断点记录'
+    assert manager.load_batch_journal('origin', 'main') is not None
+    assert manager.clear_batch_journal(branch='main') == '已清除 2 条分批次推送断点记录'
+    assert manager.clear_batch_journal() == '已清除 0 条分批次推送断点记录'
+
+
+def test_adaptive_batch_push_falls_back_to_single_commits(manager, work, remote, monkeypatch):
+    oids = add_commits(work, 4)
+    original = manager.push_batch
+    sizes = []
+
+    def push_batch(batch, remote_name='origin', branch=''):
+        sizes.append(len(batch))
+        assert len(sizes) < 100, "自适应批次在重复失败时没有结束"
+        # 模拟大批次总是超时的远程：只接受单个提交
+        if len(batch) > 1:
+            return git_manager.OperationResult('fatal: the remote end hung up unexpectedly', ok=False)
+        return original(batch, remote_name, branch)
+
+    monkeypatch.setattr(manager, 'push_batch', push_batch)
+    result = manager.batch_push('origin', 'main', adaptive=True, interactive=False)
+    assert result.ok
+    assert remote_head(remote) == oids[-1]
+    assert sizes[-1] == 1
+
+
+def test_adaptive_batch_push_gives_up_when_every_push_fails(manager, work, remote, monkeypatch):
+    add_commits(work, 3)
+    before = remote_head(remote)
+    calls = []
+
+    def push_batch(batch, remote_name='origin', branch=''):
+        calls.append(len(batch))
+        assert len(calls) < 100, "自适应批次在重复失败时没有结束"
+        return None
+
+    monkeypatch.setattr(manager, 'push_batch', push_batch)
+    result = manager.batch_push('origin', 'main', adaptive=True, interactive=False)
+    assert not result.ok
+    assert remote_head(remote) == before
+
+
+def test_adaptive_batch_push_does_not_shrink_on_permanent_failure(manager, work, remote, tmp_path, monkeypatch):
+    add_commits(work, 4)
+    # 远程已有本地没有的提交，推送会因非快进被拒绝
+    other = tmp_path / 'other'
+    git(tmp_path, 'clone', '-q', str(remote), str(other))
+    commit_file(str(other), 'web/other.html', 'other\n')
+    git(other, 'push', '-q', 'origin', 'main')
+    before = remote_head(remote)
+    sizes = []
+    original = manager.push_batch
+
+    def push_batch(batch, remote_name='origin', branch=''):
+        sizes.append(len(batch))
+        return original(batch, remote_name, branch)
+
+    monkeypatch.setattr(manager, 'push_batch', push_batch)
+    result = manager.batch_push('origin', 'main', adaptive=True, interactive=False)
+    assert not result.ok
+    assert sizes == [4]
+    assert remote_head(remote) == before
+
+
+def test_scheduler_keeps_budget_on_permanent_failure():
+    scheduler = git_manager.AdaptiveBatchScheduler([1024 * 1024] * 8, target_seconds=1.0)
+    budget = scheduler.budget
+    scheduler.record(scheduler.batch_bytes(0, scheduler.next_end(0)), 1.0, False, transient=False)
+    assert scheduler.budget == budget
+    assert not scheduler.single
+
+
+def test_scheduler_drops_to_single_commit_batches():
+    scheduler = git_manager.AdaptiveBatchScheduler([1024 * 1024] * 8, target_seconds=1.0)
+    for _ in range(20):
+        end = scheduler.next_end(0)
+        scheduler.record(scheduler.batch_bytes(0, end), 1.0, False)
+        if scheduler.next_end(0) == 1:
+            break
+    assert scheduler.next_end(0) == 1
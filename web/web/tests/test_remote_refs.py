@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""远程引用快照：有效期内不访问远程，远程分支没有变化时跳过 fetch"""
+
+from conftest import commit_file, git
+import git_manager
+
+
+def git_calls(manager, subcommand):
+    return sum(1 for record in manager.tracer.records if record['command'].startswith(f'git {subcommand}'))
+
+
+def push_from_elsewhere(tmp_path, remote, name='other'):
+    """在另一个克隆中推送新提交，返回它的ID"""
+    other = tmp_path / name
+    git(tmp_path, 'clone', '-q', str(remote), str(other))
+    oid = commit_file(str(other), f'web/{name}.html', f'{name}\n')
+    git(other, 'push', '-q', 'origin', 'main')
+    return oid
+
+
+def test_advertised_ref_is_cached_within_the_ttl(manager, remote, tmp_path):
+    head = git(remote, 'rev-parse', 'main').strip()
+    assert manager.advertised_ref('origin', 'main') == head
+    newer = push_from_elsewhere(tmp_path, remote)
+    assert manager.advertised_ref('origin', 'main') == head
+    assert git_calls(manager, 'ls-remote') == 1
+    # 有效期为 0 时总是重新询问远程
+    assert manager.advertised_ref('origin', 'main', max_age=0) == newer
+
+
+def test_missing_branch_and_unreachable_remote(manager, work, tmp_path):
+    assert manager.advertised_ref('origin', 'no-such-branch') == ''
+    git(work, 'remote', 'add', 'broken', 'file://' + str(tmp_path / 'missing.git'))
+    assert manager.advertised_ref('broken', 'main') is None
+    assert 'broken/main' not in manager.remote_ref_cache()
+
+
+def test_ensure_remote_fresh_skips_fetch_when_nothing_changed(manager, work, remote, tmp_path):
+    assert manager.ensure_remote_fresh('origin', 'main') is False
+    assert git_calls(manager, 'fetch') == 0
+
+    newer = push_from_elsewhere(tmp_path, remote)
+    git(work, 'config', 'gitmanager.remoteRefTTL', '0')
+    manager._remote_ref_ttl = None
+    assert manager.ensure_remote_fresh('origin', 'main') is True
+    assert git(work, 'rev-parse', 'origin/main').strip() == newer
+    assert manager.ensure_remote_fresh('origin', 'main') is False
+
+
+def test_snapshot_is_shared_across_sessions(manager, work, remote):
+    head = manager.advertised_ref('origin', 'main')
+    manager.close()
+    later = git_manager.GitManager(repo_path=str(work))
+    try:
+        assert later.advertised_ref('origin', 'main') == head
+        assert git_calls(later, 'ls-remote') == 0
+    finally:
+        later.close()
+
+
+def test_ttl_comes_from_git_config(manager, work):
+    assert manager.remote_ref_ttl() == manager.DEFAULT_REMOTE_REF_TTL
+    git(work, 'config', 'gitmanager.remoteRefTTL', '5')
+    manager._remote_ref_ttl = None
+    assert manager.remote_ref_ttl() == 5
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""按对象ID缓存的查询结果：内存 LRU、磁盘目录、引用失效和配置命名空间"""
+
+import os
+
+from conftest import commit_file, git
+import git_manager
+
+
+def disk_total(cache):
+    return sum(size for _, size, _ in cache._disk_entries())
+
+
+def test_memory_lru_is_bounded():
+    cache = git_manager.ResultCache(memory_bytes=10)
+    cache.put(('a',), b'12345')
+    cache.put(('b',), b'12345')
+    cache.get(('a',))
+    cache.put(('c',), b'12345')
+    # b 最久未使用，被淘汰
+    assert cache.get(('b',)) is None
+    assert cache.get(('a',)) == b'12345'
+    assert cache.get(('c',)) == b'12345'
+    cache.put(('big',), b'x' * 100)
+    assert cache._memory_size <= 10
+
+
+def test_disk_results_survive_a_new_instance(tmp_path):
+    directory = str(tmp_path / 'results')
+    git_manager.ResultCache(directory).put(('show', 'abc'), b'output')
+    cache = git_manager.ResultCache(directory)
+    assert cache.get(('show', 'abc')) == b'output'
+    assert cache.hits == 1
+    # 命名空间不同（git 版本或输出配置变化）时不命中
+    assert git_manager.ResultCache(directory, namespace='other').get(('show', 'abc')) is None
+
+
+def test_overwriting_keeps_disk_size_accurate(tmp_path):
+    cache = git_manager.ResultCache(str(tmp_path / 'results'))
+    cache.put(('first',), b'a')
+    for i in range(20):
+        cache.put(('same',), os.urandom(1000 + i))
+    assert cache._disk_size == disk_total(cache)
+
+
+def test_disk_is_trimmed_to_the_limit(tmp_path):
+    cache = git_manager.ResultCache(str(tmp_path / 'results'), disk_bytes=20000)
+    for i in range(50):
+        cache.put((i,), os.urandom(1000))
+    assert disk_total(cache) <= 20000
+    assert cache._disk_size == disk_total(cache)
+
+
+def test_ref_dependent_results_are_dropped_when_the_ref_moves(tmp_path):
+    cache = git_manager.ResultCache(str(tmp_path / 'results'))
+    cache.put(('log', 'HEAD', 5), b'old log', ref=('HEAD', '1' * 40))
+    cache.put(('show', '1' * 40), b'immutable')
+    cache.observe_ref('HEAD', '1' * 40)
+    assert cache.get(('log', 'HEAD', 5)) == b'old log'
+    cache.observe_ref('HEAD', '2' * 40)
+    assert cache.get(('log', 'HEAD', 5)) is None
+    assert cache.get(('show', '1' * 40)) == b'immutable'
+
+
+def test_oversized_results_are_not_cached(tmp_path):
+    cache = git_manager.ResultCache(str(tmp_path / 'results'), max_entry_bytes=10)
+    cache.put(('big',), b'x' * 11)
+    assert cache.get(('big',)) is None
+    assert disk_total(cache) == 0
+
+
+def test_log_is_served_from_the_cache_until_head_moves(manager, work):
+    commit_file(str(work), 'web/index.html', 'one\n')
+    first = manager.log(5)
+    assert first == manager.log(5)
+    assert manager.result_cache().hits >= 1
+    commit_file(str(work), 'web/index.html', 'two\n', 'second change')
+    assert manager.log(5).startswith(git(work, 'rev-parse', '--short', 'HEAD').strip())
+
+
+def test_output_config_changes_the_namespace(manager, work):
+    before = manager.result_cache().namespace
+    git(work, 'config', 'log.date', 'iso')
+    assert manager.result_cache().namespace != before
+    git(work, 'config', '--unset', 'log.date')
+    assert manager.result_cache().namespace == before
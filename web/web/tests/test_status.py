@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""结构化状态：解析 porcelain v2 输出，状态加速需要明确开启"""
+
+from conftest import commit_file, git
+
+
+def make_changes(work):
+    """暂存、未暂存、重命名、未跟踪和忽略的文件各一个"""
+    commit_file(str(work), 'web/a.html', 'a\n')
+    commit_file(str(work), 'web/old name.html', 'old\n' * 20)
+    commit_file(str(work), '.gitignore', 'build/\n')
+    (work / 'web' / 'a.html').write_text('a changed\n', encoding='utf-8')
+    (work / 'README.md').write_text('staged\n', encoding='utf-8')
+    git(work, 'add', 'README.md')
+    git(work, 'mv', 'web/old name.html', 'web/新名字.html')
+    (work / 'notes.txt').write_text('untracked\n', encoding='utf-8')
+    (work / 'build').mkdir()
+    (work / 'build' / 'out.js').write_text('ignored\n', encoding='utf-8')
+
+
+def test_entries(manager, work):
+    make_changes(work)
+    branch, entries = manager.status_entries(ignored=True)
+    assert branch['branch.head'] == 'main'
+    assert branch['branch.upstream'] == 'origin/main'
+    assert branch['branch.ab'] == '+3 -0'
+    assert sorted(entry.short() for entry in entries) == sorted([
+        'M  README.md',
+        ' M web/a.html',
+        'R  web/old name.html -> web/新名字.html',
+        '?? notes.txt',
+        '!! build/',
+    ])
+
+
+def test_counts(manager, work):
+    make_changes(work)
+    assert manager.status_counts() == {'staged': 2, 'unstaged': 1, 'untracked': 1, 'unmerged': 0,
+                                       'renamed': 1, 'ignored': 0}
+
+
+def test_unmerged_entries(manager, work):
+    commit_file(str(work), 'web/a.html', 'base\n')
+    git(work, 'switch', '-q', '-c', 'side')
+    commit_file(str(work), 'web/a.html', 'side\n')
+    git(work, 'switch', '-q', 'main')
+    commit_file(str(work), 'web/a.html', 'main\n')
+    git(work, 'merge', '-q', 'side', check=False)
+    _, entries = manager.status_entries()
+    assert [(entry.kind, entry.path, entry.short()) for entry in entries] == [
+        ('unmerged', 'web/a.html', 'UU web/a.html')]
+    assert manager.status_counts(entries)['unmerged'] == 1
+
+
+def test_format_status(manager, work):
+    assert manager.format_status().splitlines() == [
+        '分支: main  上游: origin/main +0 -0',
+        '已暂存: 0  未暂存: 0  未跟踪: 0  冲突: 0',
+        '工作区是干净的',
+    ]
+    (work / 'notes.txt').write_text('untracked\n', encoding='utf-8')
+    assert manager.format_status().endswith('?? notes.txt')
+
+
+def test_acceleration_is_opt_in(manager, work):
+    manager.status()
+    assert git(work, 'config', '--get', 'core.untrackedCache', check=False) == ''
+    assert git(work, 'config', '--get', 'core.fsmonitor', check=False) == ''
+    assert manager.read_state(manager.STATUS_ACCEL_STATE) is None
+
+
+def test_enabled_acceleration_is_validated_once(manager, work, monkeypatch):
+    git(work, 'config', manager.STATUS_ACCEL_CONFIG, 'true')
+    calls = []
+    monkeypatch.setattr(manager, 'enable_status_acceleration',
+                        lambda: calls.append(1) or {'untracked_cache': True, 'fsmonitor': False})
+    manager.status()
+    manager.status()
+    assert calls == [1]
+    assert manager.read_state(manager.STATUS_ACCEL_STATE) == {'untracked_cache': True, 'fsmonitor': False}
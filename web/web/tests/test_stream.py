@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""流式输出：按行或按块产出与 git 相同的文本，生成器的返回值表示是否成功"""
+
+from conftest import commit_file, git
+
+
+def drain(stream):
+    """取完生成器，返回 (产出的片段, 返回值)"""
+    chunks = []
+    while True:
+        try:
+            chunks.append(next(stream))
+        except StopIteration as stop:
+            return chunks, stop.value
+
+
+def test_lines_match_git_output(manager, work):
+    for i in range(5):
+        commit_file(str(work), 'web/index.html', f'<p>{i}</p>\n', f'第 {i} 次修改')
+    lines, ok = drain(manager.stream_git_command(['git', 'log', '--oneline']))
+    assert ok is True
+    assert ''.join(lines) == git(work, 'log', '--oneline')
+    assert all(line.endswith('\n') for line in lines)
+
+
+def test_chunks_decode_characters_split_across_reads(manager, work):
+    commit_file(str(work), 'web/中文.txt', '汉字' * 100 + '\n', '汉字提交')
+    chunks, ok = drain(manager.stream_git_command(['git', 'show', 'HEAD:web/中文.txt'],
+                                                  chunk_size=1, lines=False))
+    assert ok is True
+    assert ''.join(chunks) == '汉字' * 100 + '\n'
+    assert '�' not in ''.join(chunks)
+
+
+def test_last_line_without_newline(manager, work):
+    commit_file(str(work), 'web/tail.txt', 'first\nno newline')
+    lines, _ = drain(manager.stream_git_command(['git', 'show', 'HEAD:web/tail.txt']))
+    assert lines == ['first\n', 'no newline']
+
+
+def test_failure_returns_false_and_prints_the_error(manager, capsys):
+    lines, ok = drain(manager.stream_git_command(['git', 'show', 'no-such-commit']))
+    assert lines == [] and ok is False
+    assert '错误:' in capsys.readouterr().out
+
+
+def test_stopping_early_ends_the_process(manager, work):
+    # 差异远大于管道缓冲区，git 会一直等待读取
+    commit_file(str(work), 'web/big.html', ''.join(f'<p>{i}</p>\n' for i in range(50000)))
+    stream = manager.stream_git_command(['git', 'log', '-p'], chunk_size=64)
+    assert next(stream).startswith('commit ')
+    stream.close()
+    record = manager.tracer.records[-1]
+    assert record['command'] == 'git log -p'
+    assert record['returncode'] not in (0, None)
+
+
+def test_print_stream(manager, capsys):
+    assert manager.print_stream(iter(['a\n', 'b\n']))
+    assert capsys.readouterr().out == 'a\nb\n'
+    assert not manager.print_stream(manager.stream_git_command(['git', 'show', 'no-such-commit']))
+    assert manager.print_listing(iter([])) is False
+
+
+def test_menu_listings_stream_the_same_text(manager, work, capsys):
+    commit_file(str(work), 'web/index.html', '<p>menu</p>\n', 'menu change')
+    assert manager.print_listing(manager.log(5, stream=True))
+    assert manager.print_listing(manager.list_files(stream=True))
+    assert capsys.readouterr().out == git(work, 'log', '-5', '--oneline') + git(work, 'ls-files')
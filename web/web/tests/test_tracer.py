@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""GitTracer：每次 git 调用的耗时记录、操作名称、trace2 区域和汇总"""
+
+import glob
+import json
+import tempfile
+import threading
+
+import git_manager
+
+
+def test_every_git_call_is_recorded(manager):
+    manager.tracer.action = 'menu:1'
+    manager.run_git_process(['git', 'status'])
+    manager.run_git_process(['git', 'show', 'no-such-commit'])
+    status, show = list(manager.tracer.records)[-2:]
+    assert status['command'] == 'git status' and status['returncode'] == 0
+    assert status['action'] == 'menu:1' and status['spawned']
+    assert status['bytes_out'] > 0 and status['wall_ms'] > 0
+    assert show['returncode'] == 128
+
+
+def test_thread_action_does_not_leak(manager):
+    manager.tracer.action = 'menu:2'
+    seen = []
+
+    def background():
+        manager.tracer.set_thread_action('maintenance')
+        seen.append(manager.run_git_process(['git', 'status']) and manager.tracer.records[-1]['action'])
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    thread.join()
+    manager.run_git_process(['git', 'status'])
+    assert seen == ['maintenance']
+    assert manager.tracer.records[-1]['action'] == 'menu:2'
+
+
+def test_jsonl_file_hooks_and_export(work, tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    tracer = git_manager.GitTracer(str(path))
+    hooked = []
+    tracer.add_hook(hooked.append)
+    manager = git_manager.GitManager(repo_path=str(work), tracer=tracer)
+    try:
+        manager.run_git_process(['git', 'status'])
+        manager.run_git_process(['git', 'log', '-1'])
+    finally:
+        manager.close()
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [line['command'] for line in lines][-2:] == ['git status', 'git log -1']
+    assert hooked == list(tracer.records)
+    assert tracer.export(str(tmp_path / 'export.jsonl')) == len(tracer.records)
+
+
+def test_unwritable_trace_file_is_disabled(manager, tmp_path, capsys):
+    manager.tracer.jsonl_path = str(tmp_path / 'missing' / 'trace.jsonl')
+    manager.run_git_process(['git', 'status'])
+    manager.run_git_process(['git', 'status'])
+    assert manager.tracer.jsonl_path is None
+    assert capsys.readouterr().out.count('错误: 无法写入跟踪文件') == 1
+
+
+def test_trace2_regions_are_merged_and_files_removed(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    manager.tracer.trace2 = True
+    manager.run_git_process(['git', 'status'])
+    record = manager.tracer.records[-1]
+    assert record['trace2']['git_ms'] is not None
+    assert any(region['category'] == 'status' for region in record['trace2']['regions'])
+    assert not glob.glob(str(tmp_path / 'git_trace2_*.json'))
+
+
+def test_summary(manager):
+    assert git_manager.GitTracer().summary() == '还没有记录到 git 调用'
+    manager.tracer.action = 'cli:log'
+    manager.run_git_process(['git', 'log', '-1'])
+    summary = manager.tracer.summary(limit=1)
+    assert summary.startswith(f'共 {len(manager.tracer.records)} 次 git 调用')
+    assert '[cli:log] git log -1' in summary
+    assert '按操作汇总:' in summary and 'cli:log' in summary.split('按操作汇总:')[1]
+
+
+def test_cli_trace_option(work, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(work)
+    path = tmp_path / 'cli.jsonl'
+    assert git_manager.main(['--trace', str(path), '--trace-summary', 'status']) == 0
+    actions = {json.loads(line)['action'] for line in path.read_text(encoding='utf-8').splitlines()}
+    assert 'cli:status' in actions
+    assert '最慢的调用:' in capsys.readouterr().err
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""多仓库工作区：发现仓库并并行执行操作，单个仓库出错不影响其他仓库"""
+
+import pytest
+
+from conftest import commit_file, git
+import git_manager
+
+
+@pytest.fixture
+def workspace_root(tmp_path, remote_url):
+    root = tmp_path / 'sites'
+    root.mkdir()
+    for name in ('alpha', 'beta'):
+        git(root, 'clone', '-q', remote_url, name)
+    # 嵌套的仓库也会被发现
+    git(root / 'alpha', 'init', '-q', '-b', 'main', 'vendor/lib')
+    commit_file(str(root / 'alpha' / 'vendor' / 'lib'), 'lib.js', 'lib\n')
+    (root / 'alpha' / 'vendor' / 'lib' / 'new.js').write_text('new\n', encoding='utf-8')
+    return root
+
+
+def test_discover_finds_nested_repositories(workspace_root):
+    workspace = git_manager.GitWorkspace(str(workspace_root))
+    repos = [path[len(str(workspace_root)) + 1:].replace('\\', '/') for path in workspace.discover()]
+    assert repos == ['alpha', 'alpha/vendor/lib', 'beta']
+
+
+def test_status_rows(workspace_root):
+    rows = git_manager.GitWorkspace(str(workspace_root)).run('status')
+    by_repo = {row['repo'].replace('\\', '/'): row for row in rows}
+    assert all(row['ok'] for row in rows)
+    assert by_repo['beta']['branch'] == 'main'
+    assert '未跟踪 1' in by_repo['alpha/vendor/lib']['summary']
+    table = git_manager.GitWorkspace.format_table(rows, 'status')
+    assert table.endswith('共 3 个仓库，失败 0 个')
+
+
+def test_push_reports_each_repository(workspace_root, remote):
+    commit_file(str(workspace_root / 'beta'), 'web/beta.html', 'beta\n')
+    rows = git_manager.GitWorkspace(str(workspace_root)).run('push', [str(workspace_root / 'beta')])
+    assert rows[0]['ok']
+    assert git(remote, 'rev-parse', 'main') == git(workspace_root / 'beta', 'rev-parse', 'HEAD')
+
+
+def test_broken_repository_becomes_a_failed_row(workspace_root, monkeypatch):
+    original = git_manager.GitManager.current_branch
+    broken = str(workspace_root / 'beta')
+
+    def current_branch(self):
+        if self.repo_path == broken:
+            raise OSError('bad object HEAD')
+        return original(self)
+
+    monkeypatch.setattr(git_manager.GitManager, 'current_branch', current_branch)
+    rows = git_manager.GitWorkspace(str(workspace_root)).run('status')
+    assert [row['ok'] for row in rows] == [True, True, False]
+    assert rows[2]['branch'] == '-' and 'bad object HEAD' in rows[2]['summary']
+
+
+def test_unknown_operation(workspace_root):
+    with pytest.raises(ValueError):
+        git_manager.GitWorkspace(str(workspace_root)).run('gc')
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""工作树池：切换分支改为切换目录，推送工作树检出的分支"""
+
+import os
+
+import pytest
+
+from conftest import commit_file, git
+
+
+def remote_branch(remote, branch):
+    return git(remote, 'rev-parse', '-q', '--verify', f'refs/heads/{branch}', check=False).strip()
+
+
+@pytest.fixture
+def pool_manager(manager, work, tmp_path):
+    git(work, 'config', 'gitmanager.worktreeDir', str(tmp_path / 'pool'))
+    return manager
+
+
+def test_switching_reuses_the_branch_worktree(pool_manager, work, tmp_path):
+    main_root = pool_manager.worktree_root()
+    result = pool_manager.create_branch('feature', use_worktree=True)
+    assert result.ok and '新建工作树' in result
+    feature_path = str(tmp_path / 'pool' / 'feature')
+    assert pool_manager.worktree_root() == feature_path
+    assert pool_manager.current_branch() == 'feature'
+    # 主工作树的分支和文件都没有变化
+    assert git(work, 'branch', '--show-current').strip() == 'main'
+
+    assert '已有的工作树' in pool_manager.switch_branch('main', use_worktree=True)
+    assert pool_manager.worktree_root() == main_root
+    assert '已有的工作树' in pool_manager.switch_branch('feature', use_worktree=True)
+    assert pool_manager.worktree_root() == feature_path
+
+
+def test_full_pool_recycles_the_least_recently_used_clean_worktree(pool_manager, work):
+    git(work, 'config', 'gitmanager.worktreeMax', '1')
+    git(work, 'branch', 'a')
+    git(work, 'branch', 'b')
+    first = pool_manager.worktree_pool().acquire('a')
+    assert first[1] == 'created'
+    second = pool_manager.worktree_pool().acquire('b')
+    assert second == (first[0], 'recycled')
+    assert git(first[0], 'branch', '--show-current').strip() == 'b'
+
+
+def test_push_from_worktree_pushes_its_branch(pool_manager, work, remote):
+    pool_manager.create_branch('feature', use_worktree=True)
+    feature_head = commit_file(pool_manager.worktree_root(), 'web/feature.html', 'feature\n')
+    pool_manager.enter_worktree(str(work))
+    main_head = remote_branch(remote, 'main')
+
+    assert pool_manager.push(worktree='feature') is not None
+    assert remote_branch(remote, 'feature') == feature_head
+    assert remote_branch(remote, 'main') == main_head
+
+
+def test_push_defaults_to_the_current_branch(manager, work, remote):
+    git(work, 'switch', '-q', '-c', 'topic')
+    head = commit_file(str(work), 'web/topic.html', 'topic\n')
+    assert manager.push() is not None
+    assert remote_branch(remote, 'topic') == head
+    assert remote_branch(remote, 'master') == ''
+
+
+def test_failed_push_keeps_the_remote_ref_snapshot(manager, work, tmp_path):
+    git(work, 'remote', 'add', 'broken', 'file://' + str(tmp_path / 'missing.git'))
+    manager.remember_remote_ref('broken', 'main', 'a' * 40)
+    assert manager.push('broken', 'main') is None
+    assert manager.remote_ref_cache()['broken/main']['oid'] == 'a' * 40
+
+
+def test_trim_removes_clean_worktrees_over_the_size_limit(pool_manager, work):
+    git(work, 'branch', 'a')
+    git(work, 'branch', 'b')
+    pool = pool_manager.worktree_pool()
+    path_a, _ = pool.acquire('a')
+    path_b, _ = pool.acquire('b')
+    # 工作树在使用中变大，trim 时重新统计
+    with open(os.path.join(path_b, 'big.bin'), 'wb') as f:
+        f.write(b'\0' * 200000)
+    git(path_b, 'add', 'big.bin')
+    git(path_b, 'commit', '-q', '-m', 'big file')
+    pool.max_bytes = 100000
+    entries = pool.trim(pool.load(), keep=(path_b,))
+    assert list(entries) == [path_b]
+    assert not os.path.exists(path_a)